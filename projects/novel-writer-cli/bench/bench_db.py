@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""Microbenchmark: chapter storage size and read time.
+
+"before" is the previous layout (chapter text stored in chapter_text and
+again inside chapter_json with the full scene plan; every read parses that
+JSON). "after" is the current schema (scene cards and texts in the scenes
+table, chapter_json without text), plain and with NOVEL_DB_COMPRESS-style
+zlib blobs. Chapters are mock-sized: 12 scenes of ~900 chars. Mock prose
+repeats a few sentences, so it compresses far better than real chapters.
+
+    python3 bench/bench_db.py [--projects 100]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from novel_writer import db, mock_server  # noqa: E402
+from novel_writer.orchestrator import last_paragraph  # noqa: E402
+from novel_writer.utils import join_scene_texts  # noqa: E402
+
+
+def _chapter(rng: random.Random, idx: int) -> dict[str, Any]:
+    plan = mock_server._scene_plan(rng, idx)
+    texts = [mock_server._scene_text(rng, rng.randint(700, 1100)) for _ in plan["scenes"]]
+    return {
+        "chapter": idx,
+        "title": plan["title"],
+        "scene_plan": plan,
+        "chapter_text": join_scene_texts(texts),
+        "chapter_summary": "本章摘要：" + mock_server._scene_text(rng, 300),
+        "continuity_notes": ["注意时间线"],
+        "next_chapter_hook": "下一章钩子",
+        "scene_texts": texts,
+    }
+
+
+def _put_before(con: sqlite3.Connection, pid: str, ch: dict[str, Any]) -> None:
+    obj = {k: v for k, v in ch.items() if k != "scene_texts"}
+    con.execute(
+        "INSERT OR REPLACE INTO chapters VALUES(?,?,?,?,?,?,?)",
+        (pid, ch["chapter"], ch["title"], json.dumps(obj, ensure_ascii=False), ch["chapter_text"], ch["chapter_summary"], "t"),
+    )
+    con.commit()
+
+
+def _prev_context_before(con: sqlite3.Connection, pid: str, idx: int) -> tuple[str, str]:
+    row = con.execute("SELECT * FROM chapters WHERE project_id=? AND chapter_idx=?", (pid, idx)).fetchone()
+    d = dict(row)
+    d["chapter_json"] = json.loads(d["chapter_json"])
+    return d["chapter_summary"], last_paragraph(d["chapter_text"])
+
+
+def _prev_context_after(con: sqlite3.Connection, pid: str, idx: int) -> tuple[str, str]:
+    summary = db.get_chapter_summary(con, project_id=pid, chapter_idx=idx) or ""
+    return summary, last_paragraph(db.get_chapter_text(con, project_id=pid, chapter_idx=idx, last_scene=True) or "")
+
+
+def _summary_before(con: sqlite3.Connection, pid: str, idx: int) -> str:
+    row = con.execute("SELECT * FROM chapters WHERE project_id=? AND chapter_idx=?", (pid, idx)).fetchone()
+    return json.loads(row["chapter_json"])["chapter_summary"]
+
+
+def _summary_after(con: sqlite3.Connection, pid: str, idx: int) -> str:
+    return db.get_chapter_summary(con, project_id=pid, chapter_idx=idx) or ""
+
+
+def _time(fn: Callable[[sqlite3.Connection, str, int], Any], con: sqlite3.Connection, keys: list[tuple[str, int]]) -> float:
+    t0 = time.perf_counter()
+    for pid, idx in keys:
+        fn(con, pid, idx)
+    return (time.perf_counter() - t0) / len(keys)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--projects", type=int, default=100)
+    ap.add_argument("--reads", type=int, default=2000)
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    chapters = [_chapter(rng, idx) for idx in range(1, 9)]
+    work = Path(tempfile.mkdtemp(prefix="novel-bench-db-"))
+    pids = [f"p{i:04d}" for i in range(args.projects)]
+    keys = [(rng.choice(pids), rng.randint(1, 8)) for _ in range(args.reads)]
+
+    print("layout\tdb_bytes\twrite_ms_per_chapter\tprev_context_us\tsummary_us")
+    for layout in ("before", "after", "after+zlib"):
+        path = work / f"{layout}.db"
+        con = db.connect(path)
+        if layout == "before":
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(db._BASE_SCHEMA[1])
+        else:
+            db.init_db(con)
+        t0 = time.perf_counter()
+        for pid in pids:
+            for ch in chapters:
+                if layout == "before":
+                    _put_before(con, pid, ch)
+                else:
+                    db.put_chapter(
+                        con,
+                        project_id=pid,
+                        chapter_idx=ch["chapter"],
+                        chapter_title=ch["title"],
+                        chapter_obj=ch,
+                        chapter_text=ch["chapter_text"],
+                        chapter_summary=ch["chapter_summary"],
+                        updated_at_utc="t",
+                        compress=layout == "after+zlib",
+                    )
+        con.commit()
+        write_ms = (time.perf_counter() - t0) * 1000.0 / (len(pids) * len(chapters))
+        con.execute("VACUUM")
+        size = path.stat().st_size
+        prev = _time(_prev_context_before if layout == "before" else _prev_context_after, con, keys)
+        summ = _time(_summary_before if layout == "before" else _summary_after, con, keys)
+        print(f"{layout}\t{size}\t{write_ms:.3f}\t{prev * 1e6:.1f}\t{summ * 1e6:.1f}")
+        con.close()
+    print(f"workdir\t{work}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""Microbenchmark: DB write throughput with several concurrent writer processes.
+
+Each process saves `--chapters` chapters, each with `--calls` llm_calls ledger
+rows and a publish row, into one shared WAL database.
+
+Both modes write through the same db.put_* functions. "before" is the
+previous access pattern: sqlite3's default connection settings
+(synchronous=FULL, 5s timeout) and one commit per row. "after" is
+db.connect's settings (synchronous=NORMAL, busy_timeout, mmap) with the
+ledger rows, chapter and publish row in one transaction, as write-chapter
+does now.
+
+    python3 bench/bench_db_writers.py --procs 1,4,8
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing as mp
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from novel_writer import db, mock_server  # noqa: E402
+from novel_writer.utils import join_scene_texts  # noqa: E402
+
+
+def _chapter(idx: int) -> dict[str, Any]:
+    rng = random.Random(idx)
+    plan = mock_server._scene_plan(rng, idx)
+    texts = [mock_server._scene_text(rng, rng.randint(700, 1100)) for _ in plan["scenes"]]
+    return {
+        "chapter": idx,
+        "title": plan["title"],
+        "scene_plan": plan,
+        "chapter_text": join_scene_texts(texts),
+        "chapter_summary": "摘要",
+        "scene_texts": texts,
+    }
+
+
+def _call_row(pid: str, idx: int, k: int) -> dict[str, Any]:
+    return dict(
+        project_id=pid,
+        chapter_idx=idx,
+        stage="pair",
+        model="mock",
+        attempt=1,
+        http_status=200,
+        latency_ms=50.0 + k,
+        ttft_ms=None,
+        prompt_tokens=2000,
+        completion_tokens=900,
+        cached_tokens=0,
+        cache_hit=False,
+        error=None,
+        created_at_utc="t",
+    )
+
+
+def _save(con: db.Connection, pid: str, idx: int, calls: int) -> None:
+    ch = _chapter(idx)
+    for k in range(calls):
+        db.put_llm_call(con, **_call_row(pid, idx, k))
+    db.put_chapter(
+        con,
+        project_id=pid,
+        chapter_idx=idx,
+        chapter_title=ch["title"],
+        chapter_obj=ch,
+        chapter_text=ch["chapter_text"],
+        chapter_summary=ch["chapter_summary"],
+        updated_at_utc="t",
+    )
+    db.put_publish(con, project_id=pid, chapter_idx=idx, telegraph_path="p", telegraph_url="u", published_at_utc="t")
+
+
+def _writer(mode: str, path: str, pid: str, chapters: int, calls: int, out: Any) -> None:
+    if mode == "before":
+        # sqlite3 defaults: synchronous=FULL, 5s busy timeout, no mmap.
+        con = sqlite3.connect(path, factory=db.Connection)
+    else:
+        con = db.connect(Path(path))
+    errors = 0
+    for idx in range(1, chapters + 1):
+        try:
+            if mode == "before":
+                _save(con, pid, idx, calls)  # every put_* commits on its own
+            else:
+                with db.transaction(con):
+                    _save(con, pid, idx, calls)
+        except sqlite3.OperationalError:
+            errors += 1
+    out.put(errors)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--procs", default="1,4,8", help="comma list of writer process counts")
+    ap.add_argument("--chapters", type=int, default=40, help="chapters saved per process")
+    ap.add_argument("--calls", type=int, default=10, help="ledger rows per chapter")
+    args = ap.parse_args()
+
+    work = Path(tempfile.mkdtemp(prefix="novel-bench-writers-"))
+    print("mode\tprocs\twall_s\tchapters_per_s\trows_per_s\tlock_errors")
+    for n in [int(x) for x in args.procs.split(",") if x.strip()]:
+        for mode in ("before", "after"):
+            path = work / f"{mode}_{n}.db"
+            con = db.connect(path)
+            db.init_db(con)
+            con.close()
+            out: Any = mp.Queue()
+            procs = [mp.Process(target=_writer, args=(mode, str(path), f"p{i}", args.chapters, args.calls, out)) for i in range(n)]
+            t0 = time.perf_counter()
+            for p in procs:
+                p.start()
+            for p in procs:
+                p.join()
+            wall = time.perf_counter() - t0
+            errors = sum(out.get() for _ in procs)
+            chapters = n * args.chapters
+            rows = chapters * (args.calls + 2)
+            print(f"{mode}\t{n}\t{wall:.3f}\t{chapters / wall:.1f}\t{rows / wall:.0f}\t{errors}")
+    print(f"workdir\t{work}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""End-to-end benchmark: `init` + 8 chapters against the local mock LLM.
+
+Runs the real CLI commands in-process against novel_writer.mock_server and
+reports wall time, LLM calls per chapter and orchestrator overhead (wall time
+not spent waiting on LLM responses). No tokens are spent.
+
+    python3 bench/bench_e2e.py --latency lognormal:400,0.6 --fail-malformed-tags 0.1
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from novel_writer.__main__ import main as cli_main  # noqa: E402
+from novel_writer.db import connect, init_db, list_llm_calls  # noqa: E402
+from novel_writer.mock_server import MockConfig, MockLLMServer  # noqa: E402
+
+
+def _run(argv: list[str]) -> float:
+    t0 = time.perf_counter()
+    rc = cli_main(argv)
+    if rc != 0:
+        raise SystemExit(f"command failed ({rc}): {argv}")
+    return time.perf_counter() - t0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chapters", type=int, default=8)
+    ap.add_argument("--latency", default="fixed:50", help="mock latency spec, see mock-server --help")
+    ap.add_argument("--fail-429", type=float, default=0.0)
+    ap.add_argument("--fail-malformed-tags", type=float, default=0.0)
+    ap.add_argument("--fail-truncated-json", type=float, default=0.0)
+    ap.add_argument("--fail-malformed-json", type=float, default=0.0)
+    ap.add_argument("--fail-short-scene", type=float, default=0.0)
+    ap.add_argument("--stream", action="store_true", help="set NOVEL_STREAM=1")
+    ap.add_argument("--structured", action="store_true", help="set NOVEL_STRUCTURED_OUTPUT=1")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--write-chapter-arg", action="append", default=[], help="extra arg passed to write-chapter (repeatable)")
+    ap.add_argument("--book", action="store_true", help="write all chapters with one write-book run")
+    ap.add_argument("--book-arg", action="append", default=[], help="extra arg passed to write-book (repeatable)")
+    args = ap.parse_args()
+
+    srv = MockLLMServer(
+        MockConfig(
+            latency=args.latency,
+            fail_429=args.fail_429,
+            fail_malformed_tags=args.fail_malformed_tags,
+            fail_truncated_json=args.fail_truncated_json,
+            fail_malformed_json=args.fail_malformed_json,
+            fail_short_scene=args.fail_short_scene,
+            seed=args.seed,
+        )
+    ).start()
+
+    work = Path(tempfile.mkdtemp(prefix="novel-bench-"))
+    os.environ.update(
+        {
+            "OPENAI_BASE_URL": srv.base_url,
+            "OPENAI_API_KEY": "mock",
+            "NOVEL_DB_PATH": str(work / "data" / "novels.db"),
+            "NOVEL_OUTPUTS_DIR": str(work / "outputs"),
+            "NOVEL_STREAM": "1" if args.stream else "0",
+            "NOVEL_STRUCTURED_OUTPUT": "1" if args.structured else "0",
+            # Measure real pipeline work, not cache replays.
+            "NOVEL_CACHE": "0",
+        }
+    )
+
+    pid = "bench"
+    walls: dict[str, float] = {}
+    walls["init"] = _run(["init", "--title", "Bench", "--blurb", "基准测试", "--project-id", pid])
+    if args.book:
+        walls["book"] = _run(["write-book", "--project", pid, "--to-chapter", str(args.chapters)] + args.book_arg)
+    else:
+        for ch in range(1, args.chapters + 1):
+            walls[f"ch{ch}"] = _run(["write-chapter", "--project", pid, "--chapter", str(ch)] + args.write_chapter_arg)
+
+    with urllib.request.urlopen(srv.base_url + "/stats") as resp:
+        server_stats = json.loads(resp.read())
+    srv.stop()
+
+    con = connect(work / "data" / "novels.db")
+    init_db(con)
+    calls = list_llm_calls(con, project_id=pid)
+
+    print("step\twall_s\tcalls\tllm_s\toverhead_s")
+    total_wall = 0.0
+    total_llm = 0.0
+    for step, wall in walls.items():
+        if step == "book":
+            rows = [r for r in calls if int(r["chapter_idx"] or 0) > 0]
+        else:
+            ch = 0 if step == "init" else int(step[2:])
+            rows = [r for r in calls if int(r["chapter_idx"] or 0) == ch]
+        llm_s = sum(float(r["latency_ms"]) for r in rows) / 1000.0
+        total_wall += wall
+        total_llm += llm_s
+        # With concurrent calls llm_s can exceed wall time; overhead is then reported as 0.
+        print(f"{step}\t{wall:.3f}\t{len(rows)}\t{llm_s:.3f}\t{max(0.0, wall - llm_s):.3f}")
+    n_ch = max(1, args.chapters)
+    ch_calls = [r for r in calls if int(r["chapter_idx"] or 0) > 0]
+    print()
+    print(f"total_wall_s\t{total_wall:.3f}")
+    print(f"calls_per_chapter\t{len(ch_calls) / n_ch:.2f}")
+    # Planner/summarizer outputs rejected by the parser (each one costs a retry call).
+    print(f"parse_errors_per_chapter\t{sum(1 for r in ch_calls if r['parse_error']) / n_ch:.2f}")
+    print(f"orchestrator_overhead_s\t{max(0.0, total_wall - total_llm):.3f}")
+    print(f"server\t{json.dumps(server_stats, ensure_ascii=False)}")
+    print(f"workdir\t{work}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Check: a write-chapter-sized run of pair calls hedges at least once.
+
+Sends `--calls` pair calls (6 per chapter) through OpenAICompatClient with
+hedging enabled against the local mock LLM. The latency tracker is seeded
+below the mock's latency, so every call is slow enough to hedge and only
+the hedge budget (NOVEL_HEDGE_MAX_RATIO) limits them. Exits 1 if no call
+was hedged.
+
+    python3 bench/bench_hedge.py --calls 6 --max-ratio 0.1
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from novel_writer.llm import HedgePolicy, OpenAICompatClient  # noqa: E402
+from novel_writer.mock_server import MockConfig, MockLLMServer  # noqa: E402
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=6, help="pair calls (6 per chapter)")
+    ap.add_argument("--max-ratio", type=float, default=0.1, help="HedgePolicy.max_hedge_ratio")
+    ap.add_argument("--latency-ms", type=int, default=200, help="mock latency per call")
+    args = ap.parse_args()
+
+    srv = MockLLMServer(MockConfig(latency=f"fixed:{args.latency_ms}")).start()
+    client = OpenAICompatClient(base_url=srv.base_url, api_key="mock")
+    # As _hedge_policy seeds from the ledger: recent pair calls were much faster.
+    client.latency.seed("pair", "mock", [args.latency_ms / 4000.0] * 20)
+    hedge = HedgePolicy(min_delay_s=0.0, max_hedge_ratio=args.max_ratio)
+
+    t0 = time.perf_counter()
+    try:
+        for _ in range(args.calls):
+            client.chat_completions(model="mock", system="写作", user="场景", stage="pair", hedge=hedge)
+    finally:
+        client.close()
+        srv.stop()
+    budget = client.hedge_budget
+
+    print("calls\teligible\thedged\thedge_wins\twall_s")
+    print(f"{args.calls}\t{budget.eligible}\t{budget.hedged}\t{budget.hedge_wins}\t{time.perf_counter() - t0:.3f}")
+    return 0 if budget.hedged >= 1 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Microbenchmark: JSON extraction from LLM responses.
+
+"before" is the previous extract_first_json_object (non-greedy fenced regex,
+then a per-character brace matcher in Python); "after" is the raw_decode
+scanner in novel_writer.utils. Inputs are real-sized architect plans (tens of
+KB) in the shapes models return them (bare, fenced, leading prose, BOM), plus
+a malformed corpus: every *_raw.txt under --raw-dir (planner/summary attempts
+that failed to parse) and synthetic truncated/prose samples.
+
+    python3 bench/bench_json.py [--raw-dir outputs]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from novel_writer import mock_server  # noqa: E402
+from novel_writer.utils import extract_first_json_object  # noqa: E402
+
+
+def _extract_before(text: str) -> Any:
+    fenced = re.search(r"```(?:json)?\s*(\{[\s\S]*?\})\s*```", text)
+    if fenced:
+        return json.loads(fenced.group(1))
+
+    start = text.find("{")
+    if start == -1:
+        raise ValueError("No '{' found in response")
+
+    depth = 0
+    in_str = False
+    esc = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_str:
+            if esc:
+                esc = False
+                continue
+            if ch == "\\":
+                esc = True
+                continue
+            if ch == '"':
+                in_str = False
+            continue
+        if ch == '"':
+            in_str = True
+            continue
+        if ch == "{":
+            depth += 1
+            continue
+        if ch == "}":
+            depth -= 1
+            if depth == 0:
+                return json.loads(text[start : i + 1])
+            continue
+    raise ValueError("Failed to find a complete JSON object in response")
+
+
+def _big_architect(seed: int) -> str:
+    # Roughly the size of a real architect plan.
+    proj = mock_server._architect(random.Random(seed))
+    blurb = "细节" * 60
+    for c in proj["characters"]:
+        c.update({k: (v + blurb if isinstance(v, str) else v) for k, v in c.items() if k != "id"})
+    proj["relations"]["edges"] = proj["relations"]["edges"] * 8
+    return json.dumps(proj, ensure_ascii=False, indent=2)
+
+
+def _valid_corpus() -> dict[str, str]:
+    body = _big_architect(0)
+    return {
+        "bare": body,
+        "fenced": "```json\n" + body + "\n```",
+        "prose+fenced": "好的，以下是策划（注意 {角色} 的设定）：\n```json\n" + body + "\n```\n如需修改请告诉我。",
+        "prose": "以下是结果：\n" + body + "\n\n以上。",
+        "bom": "﻿" + body,
+        # A string value holding its own fence: the old non-greedy regex stopped at the inner one.
+        "fenced+inner-fence": "```json\n" + body[:-1] + ',\n  "note": "示例：```json {} ```"\n}\n```',
+    }
+
+
+def _malformed_corpus(raw_dir: Path | None) -> dict[str, str]:
+    body = _big_architect(1)
+    out = {
+        "truncated": body[: len(body) * 2 // 3],
+        "prose-braces+truncated": "说明 {草稿} 如下：" + body[: len(body) // 2],
+        "no-json": "抱歉，我无法完成这个请求。" * 50,
+    }
+    if raw_dir is not None:
+        for p in sorted(raw_dir.rglob("*_raw.txt")):
+            if "scene" in p.name and "plan" not in p.name:
+                continue  # scene text, not JSON
+            out[f"raw:{p.parent.name}/{p.name}"] = p.read_text(encoding="utf-8")
+    return out
+
+
+def _outcome(fn, text: str) -> str:
+    try:
+        obj = fn(text)
+    except Exception:
+        return "error"
+    return "ok" if isinstance(obj, dict) and len(obj) > 1 else "ok(partial)"
+
+
+def _time(fn, text: str, *, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(3):
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            try:
+                fn(text)
+            except Exception:
+                pass
+        best = min(best, (time.perf_counter() - t0) / rounds)
+    return best
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--raw-dir", type=Path, help="directory searched for *_raw.txt samples (e.g. outputs)")
+    ap.add_argument("--rounds", type=int, default=20)
+    args = ap.parse_args()
+
+    cases = {**_valid_corpus(), **_malformed_corpus(args.raw_dir)}
+    print("case\tbytes\tbefore_ms\tafter_ms\tbefore\tafter")
+    tot_before = tot_after = 0.0
+    for name, text in cases.items():
+        t_before = _time(_extract_before, text, rounds=args.rounds)
+        t_after = _time(extract_first_json_object, text, rounds=args.rounds)
+        tot_before += t_before
+        tot_after += t_after
+        size = len(text.encode("utf-8"))
+        print(
+            f"{name}\t{size}\t{t_before * 1000:.3f}\t{t_after * 1000:.3f}"
+            f"\t{_outcome(_extract_before, text)}\t{_outcome(extract_first_json_object, text)}"
+        )
+    print(f"total_ms\t-\t{tot_before * 1000:.3f}\t{tot_after * 1000:.3f}")
+    print(f"speedup\t{tot_before / tot_after:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Microbenchmark: prompt-build cost per chapter.
+
+"before" rebuilds every prompt from the full project plan (re-running
+_project_min + json serialization per call, as the per-call user_prompt_for_*
+helpers do); "after" uses one ChapterPromptContext per chapter. A chapter
+builds 1 plan prompt, 6 pair prompts and 12 single-scene prompts.
+
+    python3 bench/bench_prompts.py [--plan outputs/<pid>/project_plan.json]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from novel_writer import mock_server  # noqa: E402
+from novel_writer.prompts import (  # noqa: E402
+    ChapterPromptContext,
+    user_prompt_for_scene_plan,
+    user_prompt_for_scene_write,
+    user_prompt_for_scene_write_pair,
+)
+
+
+def _big_project() -> dict:
+    # Roughly the size of a real architect plan (tens of KB of JSON).
+    proj = mock_server._architect(random.Random(0))
+    blurb = "细节" * 60
+    for c in proj["characters"]:
+        c.update({k: (v + blurb if isinstance(v, str) else v) for k, v in c.items() if k != "id"})
+    proj["characters"] = proj["characters"] * 3
+    for e in proj["contrast_catalog"]:
+        e["scene_payoff"] += blurb
+    proj["relations"]["edges"] = proj["relations"]["edges"] * 12
+    return proj
+
+
+def _chapter_prompts_before(project: dict, chapter: dict, outline_short: list, scenes: list) -> list[str]:
+    out = [user_prompt_for_scene_plan(project=project, chapter=chapter, outline_short=outline_short, prev_chapter_summary="摘要")]
+    for i in range(0, len(scenes), 2):
+        out.append(
+            user_prompt_for_scene_write_pair(project=project, chapter=chapter, scene_a=scenes[i], scene_b=scenes[i + 1], prev_tail="尾巴")
+        )
+        out.append(user_prompt_for_scene_write(project=project, chapter=chapter, scene=scenes[i], prev_tail="尾巴"))
+        out.append(user_prompt_for_scene_write(project=project, chapter=chapter, scene=scenes[i + 1], prev_tail="尾巴"))
+    return out
+
+
+def _chapter_prompts_after(project: dict, chapter: dict, outline_short: list, scenes: list) -> list[str]:
+    ctx = ChapterPromptContext(project=project, chapter=chapter, outline_short=outline_short)
+    out = [ctx.scene_plan(prev_chapter_summary="摘要")]
+    for i in range(0, len(scenes), 2):
+        out.append(ctx.scene_write_pair(scene_a=scenes[i], scene_b=scenes[i + 1], prev_tail="尾巴"))
+        out.append(ctx.scene_write(scene=scenes[i], prev_tail="尾巴"))
+        out.append(ctx.scene_write(scene=scenes[i + 1], prev_tail="尾巴"))
+    return out
+
+
+def _time(fn, *args, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(5):
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            fn(*args)
+        best = min(best, (time.perf_counter() - t0) / rounds)
+    return best
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--plan", help="path to a real project_plan.json (default: synthetic)")
+    ap.add_argument("--rounds", type=int, default=50)
+    args = ap.parse_args()
+
+    project = json.loads(Path(args.plan).read_text(encoding="utf-8")) if args.plan else _big_project()
+    chapter = project["outline"][0]
+    outline_short = [{"chapter": o.get("chapter"), "title": o.get("title"), "logline": o.get("logline")} for o in project["outline"]]
+    scenes = mock_server._scene_plan(random.Random(0), 1)["scenes"]
+
+    before = _chapter_prompts_before(project, chapter, outline_short, scenes)
+    after = _chapter_prompts_after(project, chapter, outline_short, scenes)
+    assert before == after, "prompt bytes changed"
+
+    t_before = _time(_chapter_prompts_before, project, chapter, outline_short, scenes, rounds=args.rounds)
+    t_after = _time(_chapter_prompts_after, project, chapter, outline_short, scenes, rounds=args.rounds)
+    size = len(json.dumps(project, ensure_ascii=False).encode("utf-8"))
+    print(f"project_json_bytes\t{size}")
+    print(f"prompts_per_chapter\t{len(after)}")
+    print(f"before_ms_per_chapter\t{t_before * 1000:.3f}")
+    print(f"after_ms_per_chapter\t{t_after * 1000:.3f}")
+    print(f"speedup\t{t_before / t_after:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
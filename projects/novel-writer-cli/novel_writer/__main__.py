@@ -1,35 +1,65 @@
 from __future__ import annotations
 
 import argparse
+import contextlib
+import io
+import json
 import os
+import signal
 import sys
+import threading
 from pathlib import Path
 
 from . import utils
 from .db import (
-    connect,
-    get_chapter,
+    JOB_STATUSES,
+    CallLedger,
+    enqueue_job,
+    flush_ledger,
+    get_chapter_columns,
+    get_chapter_text,
     get_project,
     get_publish,
-    init_db,
     list_chapters,
+    list_jobs,
+    list_llm_calls,
     list_projects,
     list_publishes,
+    open_db,
+    recent_call_latencies,
     put_chapter,
     put_project,
     put_publish,
+    transaction,
+    writer_batch_stats,
+)
+from .book import write_book
+from .events import EventLog, open_events
+from .cache import ResponseCache
+from .llm import HedgePolicy, OpenAICompatClient
+from .mock_server import MockConfig, MockLLMServer
+from .ratelimit import ConcurrencyGate, RateLimiter
+from .scheduler import DagFailed, NodeEvent
+from .server import CommandServer, capturing, forward, probe
+from .orchestrator import (
+    BATCH_SIZES,
+    DIGEST_MODES,
+    JSON_STAGES,
+    choose_batch_size,
+    generate_chapter,
+    generate_project_plan,
+    get_prev_context_from_db,
+    scene_length_targets,
 )
-from .llm import OpenAICompatClient
-from .orchestrator import generate_chapter, generate_project_plan, get_prev_context_from_db
 from .telegraph import TelegraphClient, create_account, index_nodes, md_to_nodes
 from .envfile import get_env_var, set_env_var
-from .utils import now_utc_iso, project_id_from_title, read_text, write_json, write_text
+from .utils import load_json, now_utc_iso, project_id_from_title, read_text, write_json, write_text
+from .worker import run_worker
 
 
 def cmd_init(args: argparse.Namespace) -> int:
     env = utils.load_env()
-    con = connect(env.db_path)
-    init_db(con)
+    con = open_db(env.db_path)
 
     title = args.title.strip()
     if args.topic_file:
@@ -39,10 +69,16 @@ def cmd_init(args: argparse.Namespace) -> int:
 
     project_id = args.project_id or project_id_from_title(title)
 
-    client = OpenAICompatClient(base_url=env.openai_base_url, api_key=env.openai_api_key)
-    plan = generate_project_plan(env=env, client=client, project_id=project_id, title=title, blurb=blurb)
-
-    put_project(con, project_id=project_id, title=title, blurb=blurb, created_at_utc=now_utc_iso(), project_obj=plan)
+    client = _llm_client(env, use_cache=not args.no_cache, project_id=project_id)
+    try:
+        plan = generate_project_plan(env=env, client=client, project_id=project_id, title=title, blurb=blurb)
+        # The project and the calls that produced it, in one commit.
+        with transaction(con):
+            flush_ledger(client.on_call, con)
+            put_project(con, project_id=project_id, title=title, blurb=blurb, created_at_utc=now_utc_iso(), project_obj=plan)
+    finally:
+        _print_llm_stats(client)
+        client.close()
 
     # Write a small manifest for convenience.
     out_dir = env.outputs_dir / project_id
@@ -52,6 +88,119 @@ def cmd_init(args: argparse.Namespace) -> int:
     return 0
 
 
+def _new_client(env: utils.Env, *, use_cache: bool) -> OpenAICompatClient:
+    cache = None
+    if env.cache and use_cache:
+        cache = ResponseCache(env.cache_path, max_bytes=env.cache_max_mb * 1024 * 1024)
+    return OpenAICompatClient(
+        base_url=env.openai_base_url,
+        api_key=env.openai_api_key,
+        cache=cache,
+        cache_stages=env.cache_stages,
+        gate=ConcurrencyGate(max_in_flight=env.max_in_flight, limiter=RateLimiter(rpm=env.rpm, tpm=env.tpm)),
+        fallback_models=dict(env.fallback_models),
+        prompt_cache_hints=env.prompt_cache_hints,
+    )
+
+
+# Set by `serve`: one client per Env kept open across commands (connection pool,
+# response cache, and max-in-flight/RPM/TPM limits shared by concurrent requests).
+_warm_clients: dict[utils.Env, OpenAICompatClient] | None = None
+_warm_lock = threading.Lock()
+
+
+def _llm_client(
+    env: utils.Env, *, use_cache: bool = True, events: EventLog | None = None, **labels: object
+) -> OpenAICompatClient:
+    if _warm_clients is None:
+        client = _new_client(env, use_cache=use_cache)
+    else:
+        with _warm_lock:
+            base = _warm_clients.get(env)
+            if base is None:
+                base = _warm_clients[env] = _new_client(env, use_cache=True)
+        client = base.bind()
+        client.keep_open = True
+        if not use_cache:
+            client.cache = None
+    # Every call attempt lands in the llm_calls ledger (see `stats`); rejected outputs are flagged there.
+    # Rows are buffered until the step's result is saved (flush_ledger) or the client is closed.
+    ledger = CallLedger(open_db(env.db_path))
+    if events is not None and events.enabled:
+        ledger.on_record = events.on_call
+    client.on_call = ledger
+    client.on_reject = ledger.mark_parse_error
+    client.on_close = ledger.close
+    return client.bind(**labels)
+
+
+def _hedge_policy(env: utils.Env, client: OpenAICompatClient, con) -> HedgePolicy | None:
+    if not env.hedge:
+        return None
+    # Warm the latency tracker from the ledger so a single write-chapter can hedge from its first call.
+    for model in {env.novel_writer_model, env.hedge_model or env.novel_writer_model}:
+        client.latency.seed("pair", model, reversed(recent_call_latencies(con, stage="pair", model=model)))
+    secondary = None
+    if env.hedge_base_url:
+        secondary = OpenAICompatClient(
+            base_url=env.hedge_base_url,
+            api_key=os.environ.get("NOVEL_HEDGE_API_KEY") or env.openai_api_key,
+            gate=client.gate,
+        )
+        secondary.on_call = client.on_call
+        secondary.on_reject = client.on_reject
+        secondary = secondary.bind(**client.labels)
+    return HedgePolicy(
+        percentile=env.hedge_percentile,
+        max_hedge_ratio=env.hedge_max_ratio,
+        secondary_model=env.hedge_model or None,
+        secondary=secondary,
+    )
+
+
+def _close_hedge(hedge: HedgePolicy | None) -> None:
+    # The secondary endpoint's client is per command, unlike the (possibly warm) primary.
+    if hedge is not None and hedge.secondary is not None:
+        hedge.secondary.close()
+
+
+def _scenes_per_call(env: utils.Env, con, value: str, project_obj: dict) -> int:
+    if value != "auto":
+        return int(value)
+    stats = writer_batch_stats(con, model=env.novel_writer_model)
+    _, target = scene_length_targets(project_obj)
+    n = choose_batch_size(scene_chars=target, max_output_tokens=env.writer_max_output_tokens, stats=stats)
+    seen = " ".join(f"{k}:{int(st['tag_failures'])}/{int(st['calls'] + st['tag_failures'])}" for k, st in sorted(stats.items()))
+    print(f"scenes_per_call\t{n}\ttag_retries={seen or '-'}", file=sys.stderr)
+    return n
+
+
+def _open_events(args: argparse.Namespace, **fields: object) -> EventLog:
+    target = getattr(args, "events", None)
+    if target == "-" and capturing():
+        # A served command's stdout only reaches the caller when the command ends.
+        raise SystemExit("--events - is not live through `serve`; use --events PATH and tail the file")
+    return open_events(target, **fields)
+
+
+def _print_llm_stats(client: OpenAICompatClient) -> None:
+    # stderr keeps stdout machine-readable (project id / ok lines).
+    st = client.pool.stats
+    print(
+        f"llm_transport\tconnects={st.connects}\treuses={st.reuses}\treconnects={st.reconnects}\tconnect_s={st.connect_s_total:.3f}",
+        file=sys.stderr,
+    )
+    if client.cache is not None:
+        cs = client.cache.stats
+        print(
+            f"llm_cache\thits={cs.hits}\tmisses={cs.misses}\tstores={cs.stores}\tevictions={cs.evictions}",
+            file=sys.stderr,
+        )
+    hb = client.hedge_budget
+    if hb.hedged:
+        print(f"llm_hedge\teligible={hb.eligible}\thedged={hb.hedged}\thedge_wins={hb.hedge_wins}", file=sys.stderr)
+
+
 def _current_project_path(env: utils.Env) -> Path:
     # Persist "current project" next to the DB for convenience.
     return env.db_path.parent / "current_project.txt"
@@ -74,8 +223,7 @@ def _require_project_id(env: utils.Env, arg_project: str | None) -> str:
 
 def cmd_set_current(args: argparse.Namespace) -> int:
     env = utils.load_env()
-    con = connect(env.db_path)
-    init_db(con)
+    con = open_db(env.db_path)
 
     # Validate the project exists.
     _ = get_project(con, project_id=args.project)
@@ -92,8 +240,7 @@ def cmd_current(args: argparse.Namespace) -> int:
         print("(none)")
         return 1
 
-    con = connect(env.db_path)
-    init_db(con)
+    con = open_db(env.db_path)
     proj = get_project(con, project_id=pid)
     title = proj.get("topic", {}).get("title") or proj.get("topic", {}).get("title") or ""
     print(f"{pid}\t{title}")
@@ -102,8 +249,7 @@ def cmd_current(args: argparse.Namespace) -> int:
 
 def cmd_list_projects(args: argparse.Namespace) -> int:
     env = utils.load_env()
-    con = connect(env.db_path)
-    init_db(con)
+    con = open_db(env.db_path)
     rows = list_projects(con)
     for r in rows:
         print(f"{r['project_id']}\t{r['created_at_utc']}\t{r['title']}")
@@ -112,8 +258,7 @@ def cmd_list_projects(args: argparse.Namespace) -> int:
 
 def cmd_status(args: argparse.Namespace) -> int:
     env = utils.load_env()
-    con = connect(env.db_path)
-    init_db(con)
+    con = open_db(env.db_path)
 
     pid = _require_project_id(env, getattr(args, "project", None))
     proj = get_project(con, project_id=pid)
@@ -138,8 +283,7 @@ def cmd_status(args: argparse.Namespace) -> int:
 
 def cmd_write_chapter(args: argparse.Namespace) -> int:
     env = utils.load_env()
-    con = connect(env.db_path)
-    init_db(con)
+    con = open_db(env.db_path)
 
     pid = _require_project_id(env, getattr(args, "project", None))
 
@@ -148,35 +292,212 @@ def cmd_write_chapter(args: argparse.Namespace) -> int:
     chapter_idx = int(args.chapter)
     if not (1 <= chapter_idx <= 8):
         raise SystemExit("--chapter must be in 1..8")
+    if args.smooth_seams and not args.parallel_scenes:
+        raise SystemExit("--smooth-seams requires --parallel-scenes")
 
     prev_summary, prev_last_para = get_prev_context_from_db(con, project_id=pid, chapter_idx=chapter_idx)
 
-    client = OpenAICompatClient(base_url=env.openai_base_url, api_key=env.openai_api_key)
-    ch_obj = generate_chapter(
-        env=env,
-        client=client,
-        project_id=pid,
-        project_obj=project_obj,
-        chapter_idx=chapter_idx,
-        prev_chapter_summary=prev_summary,
-        prev_last_paragraph=prev_last_para,
-    )
-
-    put_chapter(
-        con,
-        project_id=pid,
-        chapter_idx=chapter_idx,
-        chapter_title=str(ch_obj.get("title") or ""),
-        chapter_obj=ch_obj,
-        chapter_text=str(ch_obj.get("chapter_text") or ""),
-        chapter_summary=str(ch_obj.get("chapter_summary") or ""),
-        updated_at_utc=now_utc_iso(),
-    )
+    events = _open_events(args, project_id=pid)
+    client = _llm_client(env, use_cache=not args.no_cache, events=events, project_id=pid, chapter_idx=chapter_idx)
+    hedge = None
+    try:
+        hedge = _hedge_policy(env, client, con)
+        ch_obj = generate_chapter(
+            env=env,
+            client=client,
+            project_id=pid,
+            project_obj=project_obj,
+            chapter_idx=chapter_idx,
+            prev_chapter_summary=prev_summary,
+            prev_last_paragraph=prev_last_para,
+            hedge=hedge,
+            parallel_scenes=args.parallel_scenes,
+            smooth_seams=args.smooth_seams,
+            pipeline=args.pipeline,
+            resume=args.resume,
+            digests=args.digests or "",
+            scenes_per_call=_scenes_per_call(env, con, args.scenes_per_call, project_obj),
+            events=events,
+        )
+        # Chapter, scenes and the chapter's call ledger in one commit.
+        with events.bind(chapter=chapter_idx).stage("save"), transaction(con):
+            flush_ledger(client.on_call, con)
+            put_chapter(
+                con,
+                project_id=pid,
+                chapter_idx=chapter_idx,
+                chapter_title=str(ch_obj.get("title") or ""),
+                chapter_obj=ch_obj,
+                chapter_text=str(ch_obj.get("chapter_text") or ""),
+                chapter_summary=str(ch_obj.get("chapter_summary") or ""),
+                updated_at_utc=now_utc_iso(),
+                compress=env.db_compress,
+            )
+    finally:
+        _print_llm_stats(client)
+        client.close()
+        _close_hedge(hedge)
+        events.close()
 
     print(f"ok\t{pid}\tch{chapter_idx}")
     return 0
 
 
+def _print_node_event(ev: NodeEvent) -> None:
+    # Live progress on stderr; stdout keeps the final ok/url lines.
+    if ev.kind == "start":
+        return
+    line = f"[{ev.done}/{ev.total}] {ev.kind}\t{ev.node}"
+    if ev.kind in ("done", "failed"):
+        line += f"\t{ev.seconds:.1f}s"
+    if ev.error:
+        line += f"\t{ev.error}"
+    print(line, file=sys.stderr, flush=True)
+
+
+def cmd_write_book(args: argparse.Namespace) -> int:
+    env = utils.load_env()
+    if args.smooth_seams and not args.parallel_scenes:
+        raise SystemExit("--smooth-seams requires --parallel-scenes")
+    if args.publish:
+        utils.require_telegraph_token(env)
+    con = open_db(env.db_path)
+
+    pid = _require_project_id(env, getattr(args, "project", None))
+    project_obj = get_project(con, project_id=pid)
+
+    start = args.from_chapter
+    if start is None:
+        # Continue after the last chapter already in the DB.
+        done = {int(r["chapter_idx"]) for r in list_chapters(con, project_id=pid)}
+        start = next((i for i in range(1, 9) if i not in done), 9)
+    end = args.to_chapter
+    if not (1 <= start <= 9 and 1 <= end <= 8):
+        raise SystemExit("--from-chapter/--to-chapter must be in 1..8")
+    chapters = list(range(start, end + 1))
+    if not chapters:
+        print(f"ok\t{pid}\t(nothing to write)")
+        return 0
+
+    prev_summary, prev_last_para = get_prev_context_from_db(con, project_id=pid, chapter_idx=start)
+
+    events = _open_events(args, project_id=pid)
+
+    # Run on scheduler threads; the shared connection serializes their writes.
+    def publish(idx: int) -> str:
+        return _publish_chapter(env, con, pid, idx, events=events)
+
+    def publish_index() -> str:
+        return _publish_index(env, con, pid, events=events)
+
+    client = _llm_client(env, use_cache=not args.no_cache, events=events, project_id=pid)
+    hedge = None
+    try:
+        hedge = _hedge_policy(env, client, con)
+        results = write_book(
+            env=env,
+            client=client,
+            project_id=pid,
+            project_obj=project_obj,
+            chapters=chapters,
+            prev_chapter_summary=prev_summary,
+            prev_last_paragraph=prev_last_para,
+            hedge=hedge,
+            parallel_scenes=args.parallel_scenes,
+            smooth_seams=args.smooth_seams,
+            publish=publish if args.publish else None,
+            publish_index=publish_index if args.publish else None,
+            max_workers=args.workers,
+            resume=args.resume,
+            digests=args.digests or "",
+            scenes_per_call=_scenes_per_call(env, con, args.scenes_per_call, project_obj),
+            on_event=_print_node_event,
+            events=events,
+        )
+    except DagFailed as e:
+        print(f"failed\t{e.node}\t{e.error}", file=sys.stderr)
+        if e.skipped:
+            print(f"not_started\t{len(e.skipped)} nodes", file=sys.stderr)
+        return 1
+    finally:
+        _print_llm_stats(client)
+        client.close()
+        _close_hedge(hedge)
+        events.close()
+
+    for idx in chapters:
+        url = results.get(f"ch{idx}:publish")
+        print(f"ok\t{pid}\tch{idx}" + (f"\t{url}" if url else ""))
+    if results.get("index:publish"):
+        print(f"index\t{results['index:publish']}")
+    return 0
+
+
+def _percentile(sorted_vals: list[float], q: float) -> float:
+    # Nearest-rank percentile; input must be sorted and non-empty.
+    k = max(0, min(len(sorted_vals) - 1, int(round(q * len(sorted_vals) + 0.5)) - 1))
+    return sorted_vals[k]
+
+
+def cmd_stats(args: argparse.Namespace) -> int:
+    env = utils.load_env()
+    con = open_db(env.db_path)
+
+    pid = (getattr(args, "project", None) or "").strip() or None
+    rows = list_llm_calls(con, project_id=pid, chapter_idx=args.chapter)
+    if not rows:
+        print("(no llm calls recorded)")
+        return 1
+
+    groups = [("stage", "stage"), ("model", "model"), ("chapter", "chapter_idx"), ("response_format", "response_format")]
+    for title, col in groups:
+        print(
+            f"by_{title}\tcalls\terrors\tparse_errors\tcache_hits\tp50_ms\tp95_ms\tttft_p50_ms"
+            "\tprompt_tokens\tcompletion_tokens\tcached_tokens\tcached_pct"
+        )
+        buckets: dict[str, list[dict]] = {}
+        for r in rows:
+            buckets.setdefault(str(r[col] if r[col] is not None else "-"), []).append(r)
+        for key in sorted(buckets):
+            rs = buckets[key]
+            lat = sorted(float(r["latency_ms"]) for r in rs if not r["cache_hit"]) or [0.0]
+            errors = sum(1 for r in rs if r["error"])
+            parse_errors = sum(1 for r in rs if r["parse_error"])
+            hits = sum(1 for r in rs if r["cache_hit"])
+            # Cache hits did not cost tokens this time; count only real calls.
+            live = [r for r in rs if not r["cache_hit"]]
+            pt = sum(int(r["prompt_tokens"] or 0) for r in live)
+            ct = sum(int(r["completion_tokens"] or 0) for r in live)
+            cached = sum(int(r["cached_tokens"] or 0) for r in live)
+            # TTFT is only known for streamed calls.
+            ttft = sorted(float(r["ttft_ms"]) for r in live if r["ttft_ms"] is not None)
+            ttft_p50 = f"{_percentile(ttft, 0.50):.0f}" if ttft else "-"
+            cached_pct = f"{100.0 * cached / pt:.1f}" if pt else "-"
+            print(
+                f"{key}\t{len(rs)}\t{errors}\t{parse_errors}\t{hits}\t{_percentile(lat, 0.50):.0f}\t{_percentile(lat, 0.95):.0f}\t{ttft_p50}"
+                f"\t{pt}\t{ct}\t{cached}\t{cached_pct}"
+            )
+        print()
+
+    # JSON stages with and without response_format: calls that produced nothing usable
+    # (transport errors, transport retries, rejected output) per chapter.
+    print("json_stages\tcalls\tparse_errors\tparse_fail_pct\tretries\twasted\tchapters\twasted_per_chapter")
+    modes: dict[str, list[dict]] = {}
+    for r in rows:
+        if r["stage"] in JSON_STAGES and not r["cache_hit"]:
+            modes.setdefault(r["response_format"] or "prompt_only", []).append(r)
+    for mode in sorted(modes):
+        rs = modes[mode]
+        ok = [r for r in rs if not r["error"]]
+        parse_errors = sum(1 for r in ok if r["parse_error"])
+        retries = sum(1 for r in rs if int(r["attempt"]) > 1)
+        wasted = (len(rs) - len(ok)) + parse_errors
+        chapters = len({(r["project_id"], r["chapter_idx"]) for r in rs})
+        fail_pct = f"{100.0 * parse_errors / len(ok):.1f}" if ok else "-"
+        print(f"{mode}\t{len(rs)}\t{parse_errors}\t{fail_pct}\t{retries}\t{wasted}\t{chapters}\t{wasted / chapters:.2f}")
+    return 0
+
+
 def _telegraph_author() -> tuple[str | None, str | None]:
     name = os.environ.get("TELEGRAPH_AUTHOR_NAME")
     url = os.environ.get("TELEGRAPH_AUTHOR_URL")
@@ -231,18 +552,34 @@ def cmd_publish_chapter(args: argparse.Namespace) -> int:
     env = utils.load_env()
     utils.require_telegraph_token(env)
 
-    con = connect(env.db_path)
-    init_db(con)
+    con = open_db(env.db_path)
 
     pid = _require_project_id(env, getattr(args, "project", None))
 
-    chapter_idx = int(args.chapter)
-    row = get_chapter(con, project_id=pid, chapter_idx=chapter_idx)
+    events = _open_events(args, project_id=pid)
+    try:
+        print(_publish_chapter(env, con, pid, int(args.chapter), events=events))
+    except LookupError as e:
+        raise SystemExit(str(e)) from None
+    finally:
+        events.close()
+    return 0
+
+
+def _publish_chapter(env: utils.Env, con, pid: str, chapter_idx: int, *, events: EventLog | None = None) -> str:
+    log = (events or EventLog()).bind(chapter=chapter_idx)
+    with log.stage("publish"):
+        return _publish_chapter_page(env, con, pid, chapter_idx, log)
+
+
+def _publish_chapter_page(env: utils.Env, con, pid: str, chapter_idx: int, log: EventLog) -> str:
+    row = get_chapter_columns(con, project_id=pid, chapter_idx=chapter_idx, columns=("chapter_title",))
     if not row:
-        raise SystemExit("Chapter not found in DB. Run write-chapter first.")
+        # Also runs as a write-book node: a plain error fails the node, SystemExit would not.
+        raise LookupError("Chapter not found in DB. Run write-chapter first.")
 
     title = row.get("chapter_title") or f"第{chapter_idx}章"
-    md = row.get("chapter_text") or ""
+    md = get_chapter_text(con, project_id=pid, chapter_idx=chapter_idx) or ""
 
     nodes = md_to_nodes(md)
     tg = TelegraphClient(access_token=env.telegraph_access_token)
@@ -265,21 +602,35 @@ def cmd_publish_chapter(args: argparse.Namespace) -> int:
         path = resp["result"]["path"]
         url = resp["result"]["url"]
 
+    if log.enabled:
+        log.emit("bytes_written", target="telegraph", path=path, url=url, bytes=len(json.dumps(nodes, ensure_ascii=False).encode("utf-8")))
     put_publish(con, project_id=pid, chapter_idx=chapter_idx, telegraph_path=path, telegraph_url=url, published_at_utc=now_utc_iso())
-
-    print(url)
-    return 0
+    return url
 
 
 def cmd_publish_index(args: argparse.Namespace) -> int:
     env = utils.load_env()
     utils.require_telegraph_token(env)
 
-    con = connect(env.db_path)
-    init_db(con)
+    con = open_db(env.db_path)
 
     pid = _require_project_id(env, getattr(args, "project", None))
 
+    events = _open_events(args, project_id=pid)
+    try:
+        print(_publish_index(env, con, pid, events=events))
+    finally:
+        events.close()
+    return 0
+
+
+def _publish_index(env: utils.Env, con, pid: str, *, events: EventLog | None = None) -> str:
+    log = (events or EventLog()).bind(chapter=0)
+    with log.stage("publish_index"):
+        return _publish_index_page(env, con, pid, log)
+
+
+def _publish_index_page(env: utils.Env, con, pid: str, log: EventLog) -> str:
     proj = get_project(con, project_id=pid)
     book_title = proj.get("topic", {}).get("title") or pid
 
@@ -319,11 +670,271 @@ def cmd_publish_index(args: argparse.Namespace) -> int:
         path = resp["result"]["path"]
         url = resp["result"]["url"]
 
+    if log.enabled:
+        log.emit("bytes_written", target="telegraph", path=path, url=url, bytes=len(json.dumps(nodes, ensure_ascii=False).encode("utf-8")))
     put_publish(con, project_id=pid, chapter_idx=0, telegraph_path=path, telegraph_url=url, published_at_utc=now_utc_iso())
-    print(url)
+    return url
+
+
+# Subcommands a worker can run from the jobs table.
+JOB_KINDS = ("init", "write-chapter", "publish-chapter", "publish-index")
+
+
+def cmd_enqueue(args: argparse.Namespace) -> int:
+    env = utils.load_env()
+    con = open_db(env.db_path)
+
+    argv = [a for a in args.argv if a != "--"]
+    # Validate now (argparse exits on bad input) and pin the project id, so the job
+    # does not depend on the current project or the clock when it runs.
+    parsed = build_parser().parse_args([args.kind, *argv])
+    if args.kind == "init":
+        pid = parsed.project_id or project_id_from_title(parsed.title)
+        if not parsed.project_id:
+            argv += ["--project-id", pid]
+    else:
+        pid = _require_project_id(env, parsed.project)
+        if not parsed.project:
+            argv += ["--project", pid]
+    if args.chapters and args.kind != "init":
+        raise SystemExit("--chapters requires init")
+    if args.publish and not args.chapters:
+        raise SystemExit("--publish requires --chapters")
+    if not (0 <= args.chapters <= 8):
+        raise SystemExit("--chapters must be in 0..8")
+    if args.publish:
+        utils.require_telegraph_token(env)
+
+    def add(kind: str, job_argv: list[str], after: list[int]) -> int:
+        job_id = enqueue_job(
+            con, kind=kind, argv=job_argv, depends_on=after, priority=args.priority, max_attempts=args.max_attempts
+        )
+        print(f"{job_id}\t{kind}\t{' '.join(job_argv)}")
+        return job_id
+
+    prev = add(args.kind, argv, [] if args.after is None else [args.after])
+    # Each chapter needs the previous one's summary, so chapters run in order;
+    # publishing a chapter only waits for that chapter, the index waits for all of them.
+    published: list[int] = []
+    for idx in range(1, args.chapters + 1):
+        prev = add("write-chapter", ["--project", pid, "--chapter", str(idx), *args.chapter_arg], [prev])
+        if args.publish:
+            published.append(add("publish-chapter", ["--project", pid, "--chapter", str(idx)], [prev]))
+    if published:
+        add("publish-index", ["--project", pid], published)
+    return 0
+
+
+def cmd_jobs(args: argparse.Namespace) -> int:
+    env = utils.load_env()
+    con = open_db(env.db_path)
+    for j in list_jobs(con, status=args.status):
+        print(
+            f"{j['id']}\t{j['status']}\t{j['kind']}\t{j['attempts']}/{j['max_attempts']}\t{','.join(map(str, j['depends_on'])) or '-'}"
+            f"\t{j['lease_owner'] or '-'}\t{' '.join(j['argv'])}\t{j['error'] or j['result'] or ''}"
+        )
     return 0
 
 
+def _run_job(job: dict) -> str:
+    # Same process, same code path as the CLI: the shared DB connection stays open across jobs.
+    args = build_parser().parse_args([job["kind"], *job["argv"]])
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        rc = int(args.func(args))
+    if rc != 0:
+        raise RuntimeError(f"exit status {rc}: {out.getvalue().strip()}")
+    return out.getvalue().strip()
+
+
+def _print_job(job: dict, error: str | None, seconds: float) -> None:
+    status = "failed" if error else "done"
+    print(f"job\t{job['id']}\t{job['kind']}\t{status}\t{seconds:.1f}s" + (f"\t{error}" if error else ""), file=sys.stderr, flush=True)
+
+
+def cmd_worker(args: argparse.Namespace) -> int:
+    env = utils.load_env()
+    con = open_db(env.db_path)
+    kinds = [k.strip() for k in (args.kinds or "").split(",") if k.strip()]
+    unknown = [k for k in kinds if k not in JOB_KINDS]
+    if unknown:
+        raise SystemExit(f"--kinds: unknown job kinds {unknown}")
+    try:
+        stats = run_worker(
+            con,
+            _run_job,
+            kinds=kinds,
+            lease_s=args.lease,
+            poll_s=args.poll,
+            retry_s=args.retry_delay,
+            max_jobs=args.max_jobs,
+            exit_when_empty=args.exit_when_empty,
+            on_job=_print_job,
+        )
+    except KeyboardInterrupt:
+        return 130
+    print(f"ok\tdone={stats.done}\tfailed={stats.failed}\tlost_leases={stats.lost_leases}")
+    return 0
+
+
+# Commands a running `serve` can take over from the CLI; the others always run locally
+# (long-running loops, interactive prompts, local files).
+SERVED_COMMANDS = (
+    "init",
+    "list-projects",
+    "set-current",
+    "current",
+    "status",
+    "write-chapter",
+    "write-book",
+    "stats",
+    "publish-chapter",
+    "publish-index",
+    "enqueue",
+    "jobs",
+)
+# Options whose value is a path, made absolute before forwarding (the server has its own cwd).
+_PATH_OPTIONS = ("--topic-file", "--events")
+
+
+def _server_state_path(db_path: Path) -> Path:
+    # Written by `serve` next to the DB it serves.
+    return db_path.parent / "server.json"
+
+
+def _command_specs(parser: argparse.ArgumentParser) -> dict[str, dict]:
+    sub = next(a for a in parser._actions if isinstance(a, argparse._SubParsersAction))
+    helps = {a.dest: a.help for a in sub._choices_actions}
+    specs = {}
+    for name, sp in sub.choices.items():
+        if name in SERVED_COMMANDS:
+            options = [
+                {"name": a.dest, "flags": a.option_strings, "required": a.required, "help": a.help}
+                for a in sp._actions
+                if a.dest not in ("help", "func")
+            ]
+            specs[name] = {"help": helps.get(name), "options": options}
+    return specs
+
+
+def _run_argv(argv: list[str]) -> int:
+    args = build_parser().parse_args(argv)
+    return int(args.func(args))
+
+
+def cmd_serve(args: argparse.Namespace) -> int:
+    global _warm_clients
+    env = utils.load_env()
+    open_db(env.db_path)
+    _warm_clients = {}
+
+    srv = CommandServer(
+        _run_argv,
+        commands=_command_specs(build_parser()),
+        info={"db_path": str(env.db_path.resolve())},
+        host=args.host,
+        port=args.port,
+    )
+    state = _server_state_path(env.db_path)
+    write_json(state, {"url": srv.base_url, "pid": os.getpid()})
+    print(srv.base_url, flush=True)
+
+    def stop(signum: int, frame: object) -> None:
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.stop()
+        if state.exists() and load_json(state).get("pid") == os.getpid():
+            state.unlink()
+        with _warm_lock:
+            for client in _warm_clients.values():
+                client.close()
+            _warm_clients = None
+    return 0
+
+
+def _server_url() -> str | None:
+    """URL of a running `serve` for this DB: NOVEL_SERVER, else the DB's server.json; None if none answers."""
+    url = (os.environ.get("NOVEL_SERVER") or "").strip()
+    if url.lower() in ("0", "off", "no", "false"):
+        return None
+    if not url:
+        state = _server_state_path(utils.db_path_from_env())
+        if not state.exists():
+            return None
+        try:
+            url = str(load_json(state)["url"])
+        except (ValueError, KeyError):
+            return None
+    if probe(url) is None:
+        # Stale server.json (server killed) or server down: run locally.
+        return None
+    return url
+
+
+def _events_to_stdout(argv: list[str]) -> bool:
+    return "--events=-" in argv or any(a == "--events" and b == "-" for a, b in zip(argv, argv[1:]))
+
+
+def _absolute_paths(argv: list[str]) -> list[str]:
+    out = list(argv)
+    for i, a in enumerate(out):
+        for opt in _PATH_OPTIONS:
+            if a.startswith(opt + "=") and a != opt + "=-":
+                out[i] = opt + "=" + os.path.abspath(a[len(opt) + 1 :])
+            elif a == opt and i + 1 < len(out) and out[i + 1] != "-":
+                out[i + 1] = os.path.abspath(out[i + 1])
+    return out
+
+
+def cmd_mock_server(args: argparse.Namespace) -> int:
+    cfg = MockConfig(
+        latency=args.latency,
+        fail_429=args.fail_429,
+        fail_malformed_tags=args.fail_malformed_tags,
+        fail_truncated_json=args.fail_truncated_json,
+        fail_malformed_json=args.fail_malformed_json,
+        fail_short_scene=args.fail_short_scene,
+        seed=args.seed,
+        prefix_cache=not args.no_prefix_cache,
+    )
+    srv = MockLLMServer(cfg, host=args.host, port=args.port)
+    print(srv.base_url, flush=True)
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def _parallel_scenes(value: str) -> int:
+    try:
+        n = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}") from None
+    if n < 1:
+        raise argparse.ArgumentTypeError("must be >= 1 (leave the flag out to write batches one by one)")
+    return n
+
+
+def _add_parallel_scenes(sp: argparse.ArgumentParser) -> None:
+    # Shared by write-chapter and write-book; 0 (flag absent) means sequential batches.
+    sp.add_argument(
+        "--parallel-scenes",
+        type=_parallel_scenes,
+        nargs="?",
+        const=6,
+        default=0,
+        metavar="N",
+        help="write a chapter's scene pairs concurrently, N at a time (default 6); continuity comes from scene cards",
+    )
+
+
 def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(prog="novel-writer")
     sub = p.add_subparsers(dest="cmd", required=True)
@@ -334,6 +945,7 @@ def build_parser() -> argparse.ArgumentParser:
     g.add_argument("--topic-file", help="path to a UTF-8 text file containing the TOPIC paragraph")
     g.add_argument("--blurb", help="TOPIC paragraph")
     sp.add_argument("--project-id", help="optional custom project id")
+    sp.add_argument("--no-cache", action="store_true", help="bypass the LLM response cache")
     sp.set_defaults(func=cmd_init)
 
     sp = sub.add_parser("list-projects", help="list projects")
@@ -353,15 +965,69 @@ def build_parser() -> argparse.ArgumentParser:
     sp = sub.add_parser("write-chapter", help="generate a chapter draft and save to DB")
     sp.add_argument("--project", help="project id (optional if current project is set)")
     sp.add_argument("--chapter", type=int, required=True)
+    sp.add_argument("--no-cache", action="store_true", help="bypass the LLM response cache")
+    _add_parallel_scenes(sp)
+    sp.add_argument("--smooth-seams", action="store_true", help="with --parallel-scenes: smooth each pair boundary")
+    sp.add_argument(
+        "--pipeline", action="store_true", help="stream the scene plan and start writing pairs as their scene cards arrive"
+    )
+    sp.add_argument("--resume", action="store_true", help="reuse steps of an earlier run whose inputs are unchanged (manifest.json)")
+    sp.add_argument(
+        "--digests",
+        nargs="?",
+        const="call",
+        choices=DIGEST_MODES,
+        help="writer calls also write a short digest; summarize from the digests with one small call (default) or none (local)",
+    )
+    sp.add_argument(
+        "--scenes-per-call",
+        choices=[str(n) for n in BATCH_SIZES] + ["auto"],
+        default="2",
+        help="scenes per writer call; auto picks from the writer's output limit and tag-failure history",
+    )
+    sp.add_argument("--events", metavar="PATH", help="append JSONL progress events to PATH ('-' = stdout)")
     sp.set_defaults(func=cmd_write_chapter)
 
+    sp = sub.add_parser("write-book", help="write (and optionally publish) the remaining chapters as one concurrent job graph")
+    sp.add_argument("--project", help="project id (optional if current project is set)")
+    sp.add_argument("--from-chapter", type=int, help="first chapter (default: first chapter not yet in the DB)")
+    sp.add_argument("--to-chapter", type=int, default=8)
+    sp.add_argument("--no-cache", action="store_true", help="bypass the LLM response cache")
+    _add_parallel_scenes(sp)
+    sp.add_argument("--smooth-seams", action="store_true", help="with --parallel-scenes: smooth each pair boundary")
+    sp.add_argument("--publish", action="store_true", help="publish each chapter to Telegraph when done, then the index")
+    sp.add_argument("--workers", type=int, default=8, help="scheduler threads (LLM calls are still capped by NOVEL_MAX_IN_FLIGHT)")
+    sp.add_argument("--resume", action="store_true", help="reuse steps of an earlier run whose inputs are unchanged (manifest.json)")
+    sp.add_argument(
+        "--digests",
+        nargs="?",
+        const="call",
+        choices=DIGEST_MODES,
+        help="writer calls also write a short digest; summarize from the digests with one small call (default) or none (local)",
+    )
+    sp.add_argument(
+        "--scenes-per-call",
+        choices=[str(n) for n in BATCH_SIZES] + ["auto"],
+        default="2",
+        help="scenes per writer call; auto picks from the writer's output limit and tag-failure history",
+    )
+    sp.add_argument("--events", metavar="PATH", help="append JSONL progress events to PATH ('-' = stdout)")
+    sp.set_defaults(func=cmd_write_book)
+
+    sp = sub.add_parser("stats", help="aggregate LLM call latency and token usage (p50/p95 per stage/model/chapter)")
+    sp.add_argument("--project", help="limit to one project (default: all projects)")
+    sp.add_argument("--chapter", type=int, help="limit to one chapter")
+    sp.set_defaults(func=cmd_stats)
+
     sp = sub.add_parser("publish-chapter", help="publish (create/edit) a chapter to Telegraph")
     sp.add_argument("--project", help="project id (optional if current project is set)")
     sp.add_argument("--chapter", type=int, required=True)
+    sp.add_argument("--events", metavar="PATH", help="append JSONL progress events to PATH ('-' = stdout)")
     sp.set_defaults(func=cmd_publish_chapter)
 
     sp = sub.add_parser("publish-index", help="publish/update a book index page linking to chapters")
     sp.add_argument("--project", help="project id (optional if current project is set)")
+    sp.add_argument("--events", metavar="PATH", help="append JSONL progress events to PATH ('-' = stdout)")
     sp.set_defaults(func=cmd_publish_index)
 
     sp = sub.add_parser("telegraph-init", help="create a Telegraph account and write TELEGRAPH_ACCESS_TOKEN into a .env file")
@@ -372,10 +1038,65 @@ def build_parser() -> argparse.ArgumentParser:
     sp.add_argument("--force", action="store_true", help="overwrite existing TELEGRAPH_ACCESS_TOKEN without prompting")
     sp.set_defaults(func=cmd_telegraph_init)
 
+    # allow_abbrev=False: the queued command's own options (--chapter) must not match ours (--chapters).
+    sp = sub.add_parser("enqueue", help="queue a command for worker processes: " + ", ".join(JOB_KINDS), allow_abbrev=False)
+    sp.add_argument("--priority", type=int, default=0, help="higher runs first")
+    sp.add_argument("--after", type=int, help="job id that must be done first")
+    sp.add_argument("--max-attempts", type=int, default=3)
+    sp.add_argument("--chapters", type=int, default=0, help="with init: also queue write-chapter 1..N, in order")
+    sp.add_argument("--chapter-arg", action="append", default=[], help="extra arg for the queued write-chapter jobs (repeatable)")
+    sp.add_argument("--publish", action="store_true", help="with --chapters: also queue publish-chapter for each chapter, then publish-index")
+    sp.add_argument("kind", choices=JOB_KINDS)
+    sp.add_argument("argv", nargs=argparse.REMAINDER, help="arguments of the queued command")
+    sp.set_defaults(func=cmd_enqueue)
+
+    sp = sub.add_parser("jobs", help="list queued/running/finished jobs")
+    sp.add_argument("--status", choices=JOB_STATUSES)
+    sp.set_defaults(func=cmd_jobs)
+
+    sp = sub.add_parser("worker", help="run queued jobs; several worker processes can drain one queue")
+    sp.add_argument("--kinds", help="comma list of job kinds to take (default: all)")
+    sp.add_argument("--lease", type=float, default=300.0, help="lease seconds, renewed every lease/3 while a job runs")
+    sp.add_argument("--poll", type=float, default=2.0, help="seconds between polls of an empty queue")
+    sp.add_argument("--retry-delay", type=float, default=30.0, help="a failed job is retried after this many seconds x its attempts")
+    sp.add_argument("--max-jobs", type=int, default=0, help="exit after N jobs (default: no limit)")
+    sp.add_argument("--exit-when-empty", action="store_true", help="exit once no job is runnable")
+    sp.set_defaults(func=cmd_worker)
+
+    sp = sub.add_parser("serve", help="keep a warm process (DB, HTTP pools) and run commands over a local HTTP JSON API")
+    sp.add_argument("--host", default="127.0.0.1")
+    sp.add_argument("--port", type=int, default=8398)
+    sp.set_defaults(func=cmd_serve)
+
+    sp = sub.add_parser("mock-server", help="run a local OpenAI-compatible mock LLM (for benchmarks/tests)")
+    sp.add_argument("--host", default="127.0.0.1")
+    sp.add_argument("--port", type=int, default=8399)
+    sp.add_argument("--latency", default="fixed:0", help="fixed:MS | uniform:LO,HI | lognormal:MEDIAN,SIGMA (ms)")
+    sp.add_argument("--fail-429", type=float, default=0.0, help="rate of 429 responses")
+    sp.add_argument("--fail-malformed-tags", type=float, default=0.0, help="rate of pair outputs without scene tags")
+    sp.add_argument("--fail-truncated-json", type=float, default=0.0, help="rate of JSON outputs cut off (finish_reason=length)")
+    sp.add_argument(
+        "--fail-malformed-json", type=float, default=0.0, help="rate of invalid JSON outputs (not with response_format json_schema)"
+    )
+    sp.add_argument("--fail-short-scene", type=float, default=0.0, help="rate of too-short scenes (triggers expansion)")
+    sp.add_argument("--seed", type=int, default=0)
+    sp.add_argument("--no-prefix-cache", action="store_true", help="do not emulate provider prefix caching")
+    sp.set_defaults(func=cmd_mock_server)
+
     return p
 
 
 def main(argv: list[str] | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] in SERVED_COMMANDS:
+        # Live --events on stdout need a local run (see _open_events).
+        url = None if _events_to_stdout(argv) else _server_url()
+        if url is not None:
+            # Thin client: the server runs the command with its own environment.
+            resp = forward(url, _absolute_paths(argv))
+            sys.stdout.write(resp["stdout"])
+            sys.stderr.write(resp["stderr"])
+            return int(resp["rc"])
     parser = build_parser()
     args = parser.parse_args(argv)
     return int(args.func(args))
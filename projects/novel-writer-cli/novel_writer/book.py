@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Optional
+
+from .db import flush_ledger, open_db, put_chapter, transaction
+from .events import EventLog
+from .llm import HedgePolicy, OpenAICompatClient
+from .orchestrator import SCENES_PER_CHAPTER, ChapterJob, last_paragraph, provisional_summary, scene_tail
+from .scheduler import DagScheduler, NodeEvent
+from .utils import Env, now_utc_iso
+
+def write_book(
+    *,
+    env: Env,
+    client: OpenAICompatClient,
+    project_id: str,
+    project_obj: dict[str, Any],
+    chapters: list[int],
+    prev_chapter_summary: str,
+    prev_last_paragraph: str,
+    hedge: Optional[HedgePolicy] = None,
+    parallel_scenes: int = 0,
+    smooth_seams: bool = False,
+    publish: Optional[Callable[[int], str]] = None,
+    publish_index: Optional[Callable[[], str]] = None,
+    max_workers: int = 8,
+    resume: bool = False,
+    digests: str = "",
+    scenes_per_call: int = 2,
+    on_event: Optional[Callable[[NodeEvent], None]] = None,
+    events: Optional[EventLog] = None,
+) -> dict[str, Any]:
+    """Write (and optionally publish) several chapters as one dependency graph.
+
+    Nodes per chapter N:
+      chN:plan      after ch(N-1):plan (uses provisional_summary of that plan)
+      chN:batchK    scenes_per_call scenes; after chN:plan and chN:batch(K-1),
+                    batch 1 after ch(N-1):expand (parallel_scenes=P: only the
+                    plan, and chN:batch(K-P) so at most P run at once)
+      chN:expand    after all chN:batchK; expands short scenes concurrently
+      chN:seamK     parallel_scenes + smooth_seams, after chN:expand
+      chN:summary   after chN:expand, the seams and ch(N-1):summary; saves the
+                    chapter to the DB, so chapters are saved in order
+      chN:publish   after chN:summary (when `publish` is given)
+      index:publish after every chN:publish (when `publish_index` is given)
+
+    So chapter N is summarized and published while chapter N+1 is planned
+    and written. The first failure stops the run (DagFailed); chapters already
+    saved stay saved, and resume=True reuses every step of a failed run whose
+    inputs did not change.
+
+    events gets stage_start/stage_end per node (stage = node name) and the
+    chapter steps' retry/expand/bytes_written events. A node's tokens are
+    those of its chapter's calls recorded while it ran, so nodes of one
+    chapter running at the same time (parallel batches) share theirs.
+    """
+    log = events or EventLog()
+    # Node -> its chapter's token counters when it started.
+    token_marks: dict[str, tuple[int, int]] = {}
+
+    def node_event(ev: NodeEvent) -> None:
+        node_log = log.bind(chapter=ev.group if isinstance(ev.group, int) else None)
+        if ev.kind == "start":
+            token_marks[ev.node] = node_log.tokens()
+            node_log.emit("stage_start", stage=ev.node)
+        elif ev.kind in ("done", "failed"):
+            before = token_marks.pop(ev.node, (0, 0))
+            after = node_log.tokens()
+            node_log.emit(
+                "stage_end",
+                stage=ev.node,
+                seconds=round(ev.seconds, 3),
+                prompt_tokens=after[0] - before[0],
+                completion_tokens=after[1] - before[1],
+                ok=ev.kind == "done",
+                error=ev.error,
+            )
+        if on_event is not None:
+            on_event(ev)
+
+    dag = DagScheduler(max_workers=max_workers, on_event=node_event)
+    batches = SCENES_PER_CHAPTER // scenes_per_call
+    jobs: dict[int, ChapterJob] = {}
+
+    for pos, n in enumerate(chapters):
+        prev = chapters[pos - 1] if pos > 0 else None
+        job = jobs[n] = ChapterJob(
+            env=env,
+            client=client.bind(chapter_idx=n),
+            project_id=project_id,
+            project_obj=project_obj,
+            chapter_idx=n,
+            hedge=hedge,
+            resume=resume,
+            digests=digests,
+            scenes_per_call=scenes_per_call,
+            events=events,
+        )
+
+        def plan(results: dict[str, Any], job: ChapterJob = job, prev: Optional[int] = prev) -> dict[str, Any]:
+            summary = prev_chapter_summary if prev is None else provisional_summary(jobs[prev].plan_obj or {})
+            return job.plan(prev_chapter_summary=summary)
+
+        dag.add(f"ch{n}:plan", plan, deps=(f"ch{prev}:plan",) if prev is not None else (), group=n)
+
+        for k in range(1, batches + 1):
+            deps = [f"ch{n}:plan"]
+            if k == 1 and prev is not None:
+                deps.append(f"ch{prev}:expand")
+            elif k > 1 and not parallel_scenes:
+                deps.append(f"ch{n}:batch{k - 1}")
+            elif k > parallel_scenes > 0:
+                # Only ordering, not continuity: P lanes of batches per chapter.
+                deps.append(f"ch{n}:batch{k - parallel_scenes}")
+
+            def batch(
+                results: dict[str, Any], job: ChapterJob = job, n: int = n, k: int = k, prev: Optional[int] = prev
+            ) -> tuple[tuple[str, ...], str]:
+                i = (k - 1) * scenes_per_call + 1
+                if k == 1 and prev is None:
+                    prev_tail = prev_last_paragraph
+                elif k == 1:
+                    # The previous chapter ends with its last (expanded) scene.
+                    prev_tail = last_paragraph(results[f"ch{prev}:expand"][-1][-1])
+                elif parallel_scenes:
+                    prev_tail = job.batch_anchor(i, prev_last_paragraph)
+                else:
+                    prev_tail = scene_tail(results[f"ch{n}:batch{k - 1}"][0][-1])
+                return job.write_batch(i, prev_tail), prev_tail
+
+            dag.add(f"ch{n}:batch{k}", batch, deps=tuple(deps), group=n)
+
+        def expand(results: dict[str, Any], job: ChapterJob = job, n: int = n) -> list[tuple[str, ...]]:
+            drafts = [results[f"ch{n}:batch{k}"] for k in range(1, batches + 1)]
+            return job.expand_short([texts for texts, _ in drafts], first_tail=drafts[0][1])
+
+        dag.add(f"ch{n}:expand", expand, deps=tuple(f"ch{n}:batch{k}" for k in range(1, batches + 1)), group=n)
+
+        seams = parallel_scenes and smooth_seams
+        if seams:
+            for k in range(2, batches + 1):
+
+                def seam(results: dict[str, Any], job: ChapterJob = job, n: int = n, k: int = k) -> str:
+                    texts = results[f"ch{n}:expand"]
+                    return job.smooth_seam((k - 1) * scenes_per_call + 1, texts[k - 2][-1], texts[k - 1][0])
+
+                dag.add(f"ch{n}:seam{k}", seam, deps=(f"ch{n}:expand",), group=n)
+
+        def summary(results: dict[str, Any], job: ChapterJob = job, n: int = n, seams: bool = seams) -> dict[str, Any]:
+            texts = list(results[f"ch{n}:expand"])
+            if seams:
+                for k in range(2, batches + 1):
+                    texts[k - 1] = (results[f"ch{n}:seam{k}"], *texts[k - 1][1:])
+            chapter_text = job.assemble(texts)
+            ch_obj = job.result(chapter_text, job.summarize(chapter_text))
+            # Chapter and the calls buffered so far in one commit; the process-wide
+            # connection serializes this with other scheduler threads.
+            con = open_db(env.db_path)
+            with transaction(con):
+                flush_ledger(client.on_call, con)
+                put_chapter(
+                    con,
+                    project_id=project_id,
+                    chapter_idx=n,
+                    chapter_title=str(ch_obj.get("title") or ""),
+                    chapter_obj=ch_obj,
+                    chapter_text=str(ch_obj.get("chapter_text") or ""),
+                    chapter_summary=str(ch_obj.get("chapter_summary") or ""),
+                    updated_at_utc=now_utc_iso(),
+                    compress=env.db_compress,
+                )
+            return ch_obj
+
+        sum_deps = [f"ch{n}:expand"]
+        if prev is not None:
+            # Never save chapter N while N-1 is unsaved (or failed): the DB must have no gaps.
+            sum_deps.append(f"ch{prev}:summary")
+        if seams:
+            sum_deps += [f"ch{n}:seam{k}" for k in range(2, batches + 1)]
+        dag.add(f"ch{n}:summary", summary, deps=tuple(sum_deps), group=n)
+
+        if publish is not None:
+            dag.add(f"ch{n}:publish", lambda r, n=n: publish(n), deps=(f"ch{n}:summary",), group=n)
+
+    if publish_index is not None:
+        deps = tuple(f"ch{n}:publish" for n in chapters if f"ch{n}:publish" in dag)
+        dag.add("index:publish", lambda r: publish_index(), deps=deps, group="index")
+
+    return dag.run()
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+
+# Stages cached unless NOVEL_CACHE_STAGES says otherwise. Low-temperature planner and
+# summarizer calls are worth replaying; creative writer calls (pair/retry/expand) are opt-in.
+DEFAULT_CACHE_STAGES = frozenset({"architect", "plan", "summary"})
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+
+class ResponseCache:
+    """Content-addressed on-disk cache of chat completion responses.
+
+    Entries live in a small SQLite file next to novels.db, keyed by a hash of the
+    request. Total payload size is capped; the least recently used entries are
+    evicted first.
+    """
+
+    def __init__(self, path: Path, *, max_bytes: int = 256 * 1024 * 1024) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._con = sqlite3.connect(str(path), check_same_thread=False)
+        self._con.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+
+            CREATE TABLE IF NOT EXISTS responses (
+              key TEXT PRIMARY KEY,
+              body BLOB NOT NULL,
+              size INTEGER NOT NULL,
+              created_at REAL NOT NULL,
+              last_used_at REAL NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used_at);
+            """
+        )
+        self._con.commit()
+        self._lock = threading.Lock()
+        self._max_bytes = max_bytes
+        self.stats = CacheStats()
+
+    @staticmethod
+    def make_key(
+        *,
+        base_url: str,
+        model: str,
+        system: str,
+        user: str,
+        temperature: float,
+        max_tokens: Optional[int],
+        extra: Optional[dict[str, Any]],
+    ) -> str:
+        material = json.dumps(
+            [base_url, model, system, user, float(temperature), max_tokens, extra or {}],
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        with self._lock:
+            row = self._con.execute("SELECT body FROM responses WHERE key=?", (key,)).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                return None
+            self._con.execute("UPDATE responses SET last_used_at=? WHERE key=?", (time.time(), key))
+            self._con.commit()
+            self.stats.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, obj: dict[str, Any]) -> None:
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        now = time.time()
+        with self._lock:
+            self._con.execute(
+                "INSERT OR REPLACE INTO responses(key, body, size, created_at, last_used_at) VALUES(?,?,?,?,?)",
+                (key, body, len(body), now, now),
+            )
+            self.stats.stores += 1
+            self._evict_locked()
+            self._con.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._con.execute("DELETE FROM responses WHERE key=?", (key,))
+            self._con.commit()
+
+    def _evict_locked(self) -> None:
+        total = int(self._con.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0])
+        if total <= self._max_bytes:
+            return
+        rows = self._con.execute("SELECT key, size FROM responses ORDER BY last_used_at ASC").fetchall()
+        for key, size in rows:
+            if total <= self._max_bytes:
+                break
+            self._con.execute("DELETE FROM responses WHERE key=?", (key,))
+            total -= int(size)
+            self.stats.evictions += 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._con.close()
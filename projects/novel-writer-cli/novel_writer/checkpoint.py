@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Optional
+
+from .utils import ensure_dir, now_utc_iso
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def inputs_hash(*parts: Any) -> str:
+    """sha256 over everything that determines a step's output (prompts, models, settings)."""
+    h = hashlib.sha256()
+    for p in parts:
+        data = p if isinstance(p, str) else json.dumps(p, ensure_ascii=False, sort_keys=True)
+        h.update(data.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class StepManifest:
+    """Per-chapter manifest of finished steps: outputs/<pid>/chapters/<NNN>/manifest.json.
+
+    Each step records the hash of its inputs and the sha256 of the artifact it
+    wrote. load() returns the artifact only when reuse is on, the inputs hash
+    matches and the file is unchanged; anything else means "run the step".
+    Steps are recorded whether or not reuse is on, so any run can be resumed.
+    """
+
+    def __init__(self, out_dir: Path, *, reuse: bool = False) -> None:
+        self.out_dir = out_dir
+        self.path = out_dir / MANIFEST_NAME
+        self.reuse = reuse
+        self.reused: list[str] = []
+        self._lock = threading.Lock()
+        self._steps: dict[str, dict[str, Any]] = {}
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+            if raw.get("version") == MANIFEST_VERSION:
+                self._steps = dict(raw.get("steps") or {})
+        except (OSError, ValueError):
+            pass
+
+    def load(self, step: str, inputs: str) -> Optional[Any]:
+        if not self.reuse:
+            return None
+        with self._lock:
+            entry = self._steps.get(step)
+        if not entry or entry.get("inputs") != inputs:
+            return None
+        try:
+            data = (self.out_dir / entry["artifact"]).read_bytes()
+        except OSError:
+            return None
+        if hashlib.sha256(data).hexdigest() != entry.get("sha256"):
+            return None
+        try:
+            obj = json.loads(data)
+        except ValueError:
+            return None
+        with self._lock:
+            self.reused.append(step)
+        return obj
+
+    def record(self, step: str, inputs: str, artifact: str, obj: Any) -> None:
+        data = (json.dumps(obj, ensure_ascii=False, indent=2) + "\n").encode("utf-8")
+        ensure_dir(self.out_dir)
+        (self.out_dir / artifact).write_bytes(data)
+        with self._lock:
+            self._steps[step] = {
+                "inputs": inputs,
+                "artifact": artifact,
+                "sha256": hashlib.sha256(data).hexdigest(),
+                "recorded_at_utc": now_utc_iso(),
+            }
+            body = json.dumps({"version": MANIFEST_VERSION, "steps": self._steps}, ensure_ascii=False, indent=2) + "\n"
+            # Parallel pair workers record concurrently; replace atomically.
+            tmp = self.path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_text(body, encoding="utf-8")
+            os.replace(tmp, self.path)
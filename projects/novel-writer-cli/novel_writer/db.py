@@ -2,63 +2,307 @@ from __future__ import annotations
 
 import json
 import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Callable, Iterable, Iterator, Optional
 
+from .utils import join_scene_texts, now_utc_iso
 
-def connect(db_path: Path) -> sqlite3.Connection:
+
+# Per-connection settings. WAL (set once, persistent in the file) lets readers run
+# alongside the single writer; synchronous=NORMAL is durable in WAL except on power
+# loss; writers wait up to BUSY_TIMEOUT_MS for the write lock instead of failing.
+BUSY_TIMEOUT_MS = 10_000
+MMAP_SIZE = 256 * 1024 * 1024
+
+
+class Connection(sqlite3.Connection):
+    """sqlite3 connection whose writes go through transaction(), one thread at a time."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.write_lock = threading.RLock()
+        self.tx_depth = 0
+
+
+def connect(db_path: Path, *, check_same_thread: bool = True) -> Connection:
     db_path.parent.mkdir(parents=True, exist_ok=True)
-    con = sqlite3.connect(str(db_path))
+    con = sqlite3.connect(str(db_path), check_same_thread=check_same_thread, factory=Connection)
     con.row_factory = sqlite3.Row
+    con.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
     return con
 
 
-def init_db(con: sqlite3.Connection) -> None:
-    cur = con.cursor()
-    cur.executescript(
-        """
-        PRAGMA journal_mode=WAL;
+_shared: dict[Path, Connection] = {}
+_shared_lock = threading.Lock()
 
-        CREATE TABLE IF NOT EXISTS projects (
-          project_id TEXT PRIMARY KEY,
-          title TEXT NOT NULL,
-          blurb TEXT NOT NULL,
-          created_at_utc TEXT NOT NULL,
-          project_json TEXT NOT NULL
-        );
 
-        CREATE TABLE IF NOT EXISTS chapters (
-          project_id TEXT NOT NULL,
-          chapter_idx INTEGER NOT NULL,
-          chapter_title TEXT,
-          chapter_json TEXT,
-          chapter_text TEXT,
-          chapter_summary TEXT,
-          updated_at_utc TEXT NOT NULL,
-          PRIMARY KEY (project_id, chapter_idx)
-        );
-
-        CREATE TABLE IF NOT EXISTS publishes (
+def open_db(db_path: Path) -> Connection:
+    """The process-wide connection to db_path, opened (and migrated) on first use.
+
+    Shared by every thread: writes serialize on transaction(), reads run as is.
+    """
+    key = db_path.resolve()
+    with _shared_lock:
+        con = _shared.get(key)
+        if con is None:
+            con = connect(db_path, check_same_thread=False)
+            init_db(con)
+            _shared[key] = con
+        return con
+
+
+def close_shared() -> None:
+    with _shared_lock:
+        for con in _shared.values():
+            con.close()
+        _shared.clear()
+
+
+@contextmanager
+def transaction(con: Connection) -> Iterator[Connection]:
+    """One commit for every write inside; nested transaction() calls join the outer one.
+
+    BEGIN IMMEDIATE takes the write lock up front, so a busy DB is waited on
+    (busy_timeout) rather than failing halfway with "database is locked".
+    """
+    with con.write_lock:
+        if con.tx_depth:
+            con.tx_depth += 1
+            try:
+                yield con
+            finally:
+                con.tx_depth -= 1
+            return
+        con.execute("BEGIN IMMEDIATE")
+        con.tx_depth = 1
+        try:
+            yield con
+        except BaseException:
+            con.tx_depth = 0
+            con.rollback()
+            raise
+        con.tx_depth = 0
+        con.commit()
+
+
+_BASE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS projects (
+      project_id TEXT PRIMARY KEY,
+      title TEXT NOT NULL,
+      blurb TEXT NOT NULL,
+      created_at_utc TEXT NOT NULL,
+      project_json TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chapters (
+      project_id TEXT NOT NULL,
+      chapter_idx INTEGER NOT NULL,
+      chapter_title TEXT,
+      chapter_json TEXT,
+      chapter_text TEXT,
+      chapter_summary TEXT,
+      updated_at_utc TEXT NOT NULL,
+      PRIMARY KEY (project_id, chapter_idx)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS publishes (
+      project_id TEXT NOT NULL,
+      chapter_idx INTEGER NOT NULL,
+      telegraph_path TEXT NOT NULL,
+      telegraph_url TEXT NOT NULL,
+      published_at_utc TEXT NOT NULL,
+      PRIMARY KEY (project_id, chapter_idx)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS llm_calls (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      project_id TEXT,
+      chapter_idx INTEGER,
+      stage TEXT,
+      model TEXT NOT NULL,
+      attempt INTEGER NOT NULL,
+      http_status INTEGER,
+      latency_ms REAL NOT NULL,
+      ttft_ms REAL,
+      prompt_tokens INTEGER,
+      completion_tokens INTEGER,
+      cached_tokens INTEGER,
+      cache_hit INTEGER NOT NULL DEFAULT 0,
+      error TEXT,
+      created_at_utc TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS llm_calls_project ON llm_calls(project_id, chapter_idx)",
+]
+
+
+def _migrate_base(con: sqlite3.Connection) -> None:
+    # IF NOT EXISTS: databases created before versioning already have these tables.
+    for stmt in _BASE_SCHEMA:
+        con.execute(stmt)
+
+
+def _migrate_llm_call_parse_errors(con: sqlite3.Connection) -> None:
+    _ensure_columns(con, "llm_calls", {"response_format": "TEXT", "parse_error": "TEXT"})
+
+
+def _migrate_scenes(con: sqlite3.Connection) -> None:
+    """One row per scene (card + text); chapter_json keeps only the chapter's own fields.
+
+    Existing chapters keep their text in chapters.chapter_text (their scene
+    texts are not in the DB); their cards move to the scenes table.
+    """
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS scenes (
           project_id TEXT NOT NULL,
           chapter_idx INTEGER NOT NULL,
-          telegraph_path TEXT NOT NULL,
-          telegraph_url TEXT NOT NULL,
-          published_at_utc TEXT NOT NULL,
-          PRIMARY KEY (project_id, chapter_idx)
-        );
+          scene_idx INTEGER NOT NULL,
+          card_json TEXT NOT NULL,
+          scene_text BLOB,
+          text_codec TEXT,
+          PRIMARY KEY (project_id, chapter_idx, scene_idx)
+        )
         """
     )
-    con.commit()
+    _ensure_columns(con, "chapters", {"text_codec": "TEXT"})
+    rows = con.execute("SELECT project_id, chapter_idx, chapter_json FROM chapters").fetchall()
+    for r in rows:
+        try:
+            obj = json.loads(r["chapter_json"] or "{}")
+        except ValueError:
+            continue
+        meta, cards = _split_chapter_obj(obj)
+        _put_scenes(con, r["project_id"], r["chapter_idx"], cards, None, compress=False)
+        con.execute(
+            "UPDATE chapters SET chapter_json=? WHERE project_id=? AND chapter_idx=?",
+            (json.dumps(meta, ensure_ascii=False), r["project_id"], r["chapter_idx"]),
+        )
 
 
-def put_project(con: sqlite3.Connection, *, project_id: str, title: str, blurb: str, created_at_utc: str, project_obj: dict) -> None:
-    cur = con.cursor()
-    cur.execute(
-        "INSERT OR REPLACE INTO projects(project_id, title, blurb, created_at_utc, project_json) VALUES(?,?,?,?,?)",
-        (project_id, title, blurb, created_at_utc, json.dumps(project_obj, ensure_ascii=False)),
+def _migrate_jobs(con: sqlite3.Connection) -> None:
+    """Job queue drained by `worker` processes (see lease_job)."""
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          kind TEXT NOT NULL,
+          argv_json TEXT NOT NULL,
+          status TEXT NOT NULL,
+          priority INTEGER NOT NULL DEFAULT 0,
+          depends_on INTEGER,
+          attempts INTEGER NOT NULL DEFAULT 0,
+          max_attempts INTEGER NOT NULL DEFAULT 3,
+          lease_owner TEXT,
+          lease_expires_at REAL,
+          run_after REAL,
+          created_at_utc TEXT NOT NULL,
+          started_at_utc TEXT,
+          finished_at_utc TEXT,
+          result TEXT,
+          error TEXT
+        )
+        """
+    )
+    con.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, priority, id)")
+    con.execute("CREATE INDEX IF NOT EXISTS jobs_depends_on ON jobs(depends_on)")
+
+
+def _migrate_job_deps(con: sqlite3.Connection) -> None:
+    """A job may wait on several jobs; jobs.depends_on is superseded by job_deps."""
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS job_deps (
+          job_id INTEGER NOT NULL,
+          depends_on INTEGER NOT NULL,
+          PRIMARY KEY(job_id, depends_on)
+        )
+        """
     )
-    con.commit()
+    con.execute("CREATE INDEX IF NOT EXISTS job_deps_depends_on ON job_deps(depends_on)")
+    con.execute("INSERT OR IGNORE INTO job_deps(job_id, depends_on) SELECT id, depends_on FROM jobs WHERE depends_on IS NOT NULL")
+    con.execute("UPDATE jobs SET depends_on=NULL")
+
+
+# Schema migrations; the DB's PRAGMA user_version is the number applied so far.
+# Append only: never edit or reorder a migration that has shipped.
+MIGRATIONS: tuple[Callable[[sqlite3.Connection], None], ...] = (
+    _migrate_base,
+    _migrate_llm_call_parse_errors,
+    _migrate_scenes,
+    _migrate_jobs,
+    _migrate_job_deps,
+)
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(con: sqlite3.Connection) -> int:
+    return int(con.execute("PRAGMA user_version").fetchone()[0])
+
+
+def init_db(con: sqlite3.Connection) -> None:
+    """Bring the schema up to SCHEMA_VERSION, one migration per transaction.
+
+    An up-to-date DB costs one PRAGMA read; no DDL is re-run.
+    """
+    version = schema_version(con)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"database schema v{version} is newer than this novel_writer (v{SCHEMA_VERSION})")
+    if version == SCHEMA_VERSION:
+        return
+    con.execute("PRAGMA journal_mode=WAL")
+    while version < SCHEMA_VERSION:
+        # IMMEDIATE: a concurrent process migrating the same DB waits instead of racing.
+        with transaction(con):
+            version = schema_version(con)
+            if version < SCHEMA_VERSION:
+                MIGRATIONS[version](con)
+                version += 1
+                con.execute(f"PRAGMA user_version={version}")
+
+
+def _ensure_columns(con: sqlite3.Connection, table: str, columns: dict[str, str]) -> None:
+    have = {r["name"] for r in con.execute(f"PRAGMA table_info({table})").fetchall()}
+    for name, decl in columns.items():
+        if name not in have:
+            con.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
+def _pack_text(text: Optional[str], *, compress: bool) -> tuple[Any, Optional[str]]:
+    """(stored value, codec) for a text column: plain TEXT, or a zlib BLOB with codec "zlib"."""
+    if text is None or not compress:
+        return text, None
+    return zlib.compress(text.encode("utf-8"), 6), "zlib"
+
+
+def _unpack_text(value: Any, codec: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    if codec == "zlib":
+        return zlib.decompress(value).decode("utf-8")
+    if codec:
+        raise RuntimeError(f"unknown text codec: {codec}")
+    return str(value)
+
+
+def put_project(con: sqlite3.Connection, *, project_id: str, title: str, blurb: str, created_at_utc: str, project_obj: dict) -> None:
+    with transaction(con):
+        con.execute(
+            "INSERT OR REPLACE INTO projects(project_id, title, blurb, created_at_utc, project_json) VALUES(?,?,?,?,?)",
+            (project_id, title, blurb, created_at_utc, json.dumps(project_obj, ensure_ascii=False)),
+        )
 
 
 def get_project(con: sqlite3.Connection, *, project_id: str) -> dict[str, Any]:
@@ -75,6 +319,35 @@ def list_projects(con: sqlite3.Connection) -> list[dict[str, Any]]:
     return [dict(r) for r in rows]
 
 
+def _split_chapter_obj(obj: dict[str, Any]) -> tuple[dict[str, Any], list[Any]]:
+    """(chapter_json without text or scene cards, scene cards)."""
+    meta = {k: v for k, v in obj.items() if k not in ("chapter_text", "scene_texts")}
+    plan = meta.get("scene_plan")
+    cards: list[Any] = []
+    if isinstance(plan, dict):
+        cards = list(plan.get("scenes") or [])
+        meta["scene_plan"] = {k: v for k, v in plan.items() if k != "scenes"}
+    return meta, cards
+
+
+def _put_scenes(
+    con: sqlite3.Connection,
+    project_id: str,
+    chapter_idx: int,
+    cards: list[Any],
+    texts: Optional[list[str]],
+    *,
+    compress: bool,
+) -> None:
+    con.execute("DELETE FROM scenes WHERE project_id=? AND chapter_idx=?", (project_id, int(chapter_idx)))
+    for i, card in enumerate(cards, start=1):
+        value, codec = _pack_text(texts[i - 1] if texts else None, compress=compress)
+        con.execute(
+            "INSERT INTO scenes(project_id, chapter_idx, scene_idx, card_json, scene_text, text_codec) VALUES(?,?,?,?,?,?)",
+            (project_id, int(chapter_idx), i, json.dumps(card, ensure_ascii=False), value, codec),
+        )
+
+
 def put_chapter(
     con: sqlite3.Connection,
     *,
@@ -85,39 +358,133 @@ def put_chapter(
     chapter_text: str,
     chapter_summary: str,
     updated_at_utc: str,
+    compress: bool = False,
 ) -> None:
-    cur = con.cursor()
-    cur.execute(
-        """
-        INSERT OR REPLACE INTO chapters(
-          project_id, chapter_idx, chapter_title, chapter_json, chapter_text, chapter_summary, updated_at_utc
-        ) VALUES(?,?,?,?,?,?,?)
-        """,
-        (
-            project_id,
-            int(chapter_idx),
-            chapter_title,
-            json.dumps(chapter_obj, ensure_ascii=False),
-            chapter_text,
-            chapter_summary,
-            updated_at_utc,
-        ),
+    """Store a chapter: its own fields in chapters, one scenes row per scene card.
+
+    When chapter_obj carries "scene_texts" that reassemble to chapter_text
+    (ChapterJob.result does), the text is stored once, per scene; otherwise
+    it stays in chapters.chapter_text. compress stores text as zlib blobs.
+    """
+    meta, cards = _split_chapter_obj(chapter_obj)
+    scene_texts = chapter_obj.get("scene_texts")
+    per_scene = (
+        isinstance(scene_texts, list)
+        and len(scene_texts) == len(cards)
+        and join_scene_texts(scene_texts) == chapter_text
     )
-    con.commit()
+    text_value, text_codec = (None, None) if per_scene else _pack_text(chapter_text, compress=compress)
+    with transaction(con):
+        _put_scenes(con, project_id, chapter_idx, cards, scene_texts if per_scene else None, compress=compress)
+        con.execute(
+            """
+            INSERT OR REPLACE INTO chapters(
+              project_id, chapter_idx, chapter_title, chapter_json, chapter_text, text_codec, chapter_summary, updated_at_utc
+            ) VALUES(?,?,?,?,?,?,?,?)
+            """,
+            (
+                project_id,
+                int(chapter_idx),
+                chapter_title,
+                json.dumps(meta, ensure_ascii=False),
+                text_value,
+                text_codec,
+                chapter_summary,
+                updated_at_utc,
+            ),
+        )
 
 
-def get_chapter(con: sqlite3.Connection, *, project_id: str, chapter_idx: int) -> Optional[dict[str, Any]]:
-    cur = con.cursor()
-    row = cur.execute(
-        "SELECT chapter_idx, chapter_title, chapter_json, chapter_text, chapter_summary, updated_at_utc FROM chapters WHERE project_id=? AND chapter_idx=?",
+# Plain chapters columns readable with get_chapter_columns().
+CHAPTER_COLUMNS = ("chapter_idx", "chapter_title", "chapter_summary", "updated_at_utc")
+
+
+def get_chapter_columns(
+    con: sqlite3.Connection, *, project_id: str, chapter_idx: int, columns: tuple[str, ...]
+) -> Optional[dict[str, Any]]:
+    """Only the requested CHAPTER_COLUMNS of one chapter (no JSON parsing, no text)."""
+    unknown = set(columns) - set(CHAPTER_COLUMNS)
+    if unknown or not columns:
+        raise ValueError(f"columns must be a non-empty subset of {CHAPTER_COLUMNS}, got {columns!r}")
+    row = con.execute(
+        f"SELECT {', '.join(columns)} FROM chapters WHERE project_id=? AND chapter_idx=?",
+        (project_id, int(chapter_idx)),
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def get_chapter_summary(con: sqlite3.Connection, *, project_id: str, chapter_idx: int) -> Optional[str]:
+    row = get_chapter_columns(con, project_id=project_id, chapter_idx=chapter_idx, columns=("chapter_summary",))
+    return None if row is None else (row["chapter_summary"] or "")
+
+
+def get_scenes(
+    con: sqlite3.Connection, *, project_id: str, chapter_idx: int, with_cards: bool = True, with_text: bool = True
+) -> list[dict[str, Any]]:
+    """Scene rows of a chapter in order: scene_idx, plus card and/or text (None when not stored)."""
+    cols = ["scene_idx"] + (["card_json"] if with_cards else []) + (["scene_text", "text_codec"] if with_text else [])
+    rows = con.execute(
+        f"SELECT {', '.join(cols)} FROM scenes WHERE project_id=? AND chapter_idx=? ORDER BY scene_idx ASC",
+        (project_id, int(chapter_idx)),
+    ).fetchall()
+    out: list[dict[str, Any]] = []
+    for r in rows:
+        d: dict[str, Any] = {"scene_idx": int(r["scene_idx"])}
+        if with_cards:
+            d["card"] = json.loads(r["card_json"])
+        if with_text:
+            d["text"] = _unpack_text(r["scene_text"], r["text_codec"])
+        out.append(d)
+    return out
+
+
+def get_chapter_text(
+    con: sqlite3.Connection, *, project_id: str, chapter_idx: int, last_scene: bool = False
+) -> Optional[str]:
+    """Chapter text; with last_scene, only its last non-empty scene (enough for the ending paragraph).
+
+    Chapters stored as one text (written before the scenes table) always return the whole text.
+    """
+    row = con.execute(
+        "SELECT chapter_text, text_codec FROM chapters WHERE project_id=? AND chapter_idx=?",
         (project_id, int(chapter_idx)),
     ).fetchone()
     if not row:
         return None
-    d = dict(row)
-    if d.get("chapter_json"):
-        d["chapter_json"] = json.loads(d["chapter_json"])
-    return d
+    if row["chapter_text"] is not None:
+        return _unpack_text(row["chapter_text"], row["text_codec"])
+    if last_scene:
+        for r in con.execute(
+            "SELECT scene_text, text_codec FROM scenes WHERE project_id=? AND chapter_idx=? ORDER BY scene_idx DESC",
+            (project_id, int(chapter_idx)),
+        ):
+            text = _unpack_text(r["scene_text"], r["text_codec"])
+            if text:
+                return join_scene_texts([text])
+        return join_scene_texts([])
+    scenes = get_scenes(con, project_id=project_id, chapter_idx=chapter_idx, with_cards=False)
+    return join_scene_texts([s["text"] or "" for s in scenes])
+
+
+def get_chapter(con: sqlite3.Connection, *, project_id: str, chapter_idx: int) -> Optional[dict[str, Any]]:
+    """The whole chapter, chapter_json reassembled with its text and scene cards.
+
+    Prefer get_chapter_columns / get_chapter_summary / get_chapter_text when
+    only part of it is needed.
+    """
+    row = get_chapter_columns(con, project_id=project_id, chapter_idx=chapter_idx, columns=CHAPTER_COLUMNS)
+    if not row:
+        return None
+    meta_row = con.execute(
+        "SELECT chapter_json FROM chapters WHERE project_id=? AND chapter_idx=?", (project_id, int(chapter_idx))
+    ).fetchone()
+    scenes = get_scenes(con, project_id=project_id, chapter_idx=chapter_idx, with_text=False)
+    text = get_chapter_text(con, project_id=project_id, chapter_idx=chapter_idx) or ""
+    meta = json.loads(meta_row["chapter_json"]) if meta_row["chapter_json"] else {}
+    if isinstance(meta.get("scene_plan"), dict):
+        meta["scene_plan"] = {**meta["scene_plan"], "scenes": [s["card"] for s in scenes]}
+    meta["chapter_text"] = text
+    return {**row, "chapter_json": meta, "chapter_text": text}
 
 
 def list_chapters(con: sqlite3.Connection, *, project_id: str) -> list[dict[str, Any]]:
@@ -138,12 +505,11 @@ def put_publish(
     telegraph_url: str,
     published_at_utc: str,
 ) -> None:
-    cur = con.cursor()
-    cur.execute(
-        "INSERT OR REPLACE INTO publishes(project_id, chapter_idx, telegraph_path, telegraph_url, published_at_utc) VALUES(?,?,?,?,?)",
-        (project_id, int(chapter_idx), telegraph_path, telegraph_url, published_at_utc),
-    )
-    con.commit()
+    with transaction(con):
+        con.execute(
+            "INSERT OR REPLACE INTO publishes(project_id, chapter_idx, telegraph_path, telegraph_url, published_at_utc) VALUES(?,?,?,?,?)",
+            (project_id, int(chapter_idx), telegraph_path, telegraph_url, published_at_utc),
+        )
 
 
 def get_publish(con: sqlite3.Connection, *, project_id: str, chapter_idx: int) -> Optional[dict[str, Any]]:
@@ -162,3 +528,406 @@ def list_publishes(con: sqlite3.Connection, *, project_id: str) -> list[dict[str
         (project_id,),
     ).fetchall()
     return [dict(r) for r in rows]
+
+
+def put_llm_call(
+    con: sqlite3.Connection,
+    *,
+    project_id: Optional[str],
+    chapter_idx: Optional[int],
+    stage: Optional[str],
+    model: str,
+    attempt: int,
+    http_status: Optional[int],
+    latency_ms: float,
+    ttft_ms: Optional[float],
+    prompt_tokens: Optional[int],
+    completion_tokens: Optional[int],
+    cached_tokens: Optional[int],
+    cache_hit: bool,
+    error: Optional[str],
+    created_at_utc: str,
+    response_format: Optional[str] = None,
+    parse_error: Optional[str] = None,
+) -> int:
+    with transaction(con):
+        cur = con.execute(
+            """
+            INSERT INTO llm_calls(
+              project_id, chapter_idx, stage, model, attempt, http_status, latency_ms, ttft_ms,
+              prompt_tokens, completion_tokens, cached_tokens, cache_hit, error, created_at_utc, response_format,
+              parse_error
+            ) VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+            """,
+            (
+                project_id,
+                chapter_idx,
+                stage,
+                model,
+                int(attempt),
+                http_status,
+                float(latency_ms),
+                ttft_ms,
+                prompt_tokens,
+                completion_tokens,
+                cached_tokens,
+                1 if cache_hit else 0,
+                error,
+                created_at_utc,
+                response_format,
+                parse_error,
+            ),
+        )
+    return int(cur.lastrowid)
+
+
+def mark_llm_call_parse_error(con: sqlite3.Connection, *, call_id: int, parse_error: str) -> None:
+    """Flag a successful call whose output was rejected by the caller (unparseable/invalid JSON)."""
+    with transaction(con):
+        con.execute("UPDATE llm_calls SET parse_error=? WHERE id=?", (parse_error, int(call_id)))
+
+
+def list_llm_calls(
+    con: sqlite3.Connection, *, project_id: Optional[str] = None, chapter_idx: Optional[int] = None
+) -> list[dict[str, Any]]:
+    cur = con.cursor()
+    sql = "SELECT * FROM llm_calls WHERE 1=1"
+    params: list[Any] = []
+    if project_id is not None:
+        sql += " AND project_id=?"
+        params.append(project_id)
+    if chapter_idx is not None:
+        sql += " AND chapter_idx=?"
+        params.append(int(chapter_idx))
+    rows = cur.execute(sql + " ORDER BY id ASC", params).fetchall()
+    return [dict(r) for r in rows]
+
+
+def recent_call_latencies(con: sqlite3.Connection, *, stage: str, model: str, limit: int = 200) -> list[float]:
+    """Latency (seconds) of the most recent successful, non-cached calls for (stage, model)."""
+    cur = con.cursor()
+    rows = cur.execute(
+        """
+        SELECT latency_ms FROM llm_calls
+        WHERE stage=? AND model=? AND error IS NULL AND cache_hit=0
+        ORDER BY id DESC LIMIT ?
+        """,
+        (stage, model, int(limit)),
+    ).fetchall()
+    return [float(r["latency_ms"]) / 1000.0 for r in rows]
+
+
+def writer_batch_stats(con: sqlite3.Connection, *, model: str, limit: int = 500) -> dict[int, dict[str, float]]:
+    """Per scenes-per-call N: first-try writer calls, tag-format retries and completion tokens.
+
+    Reads the ledger stages written by ChapterJob: pair/retry (N=2) and
+    batchN/batchN_retry. Only recent successful, non-cached calls count.
+    """
+    cur = con.cursor()
+    rows = cur.execute(
+        """
+        SELECT stage, COUNT(*) AS n, SUM(COALESCE(completion_tokens, 0)) AS completion_tokens FROM (
+          SELECT stage, completion_tokens FROM llm_calls
+          WHERE model=? AND error IS NULL AND cache_hit=0
+            AND (stage IN ('pair', 'retry') OR stage LIKE 'batch%')
+          ORDER BY id DESC LIMIT ?
+        ) GROUP BY stage
+        """,
+        (model, int(limit)),
+    ).fetchall()
+    out: dict[int, dict[str, float]] = {}
+    for r in rows:
+        stage = str(r["stage"])
+        retry = stage == "retry" or stage.endswith("_retry")
+        base = stage[: -len("_retry")] if stage.endswith("_retry") else stage
+        if base in ("pair", "retry"):
+            n = 2
+        elif base[len("batch") :].isdigit():
+            n = int(base[len("batch") :])
+        else:
+            continue
+        st = out.setdefault(n, {"calls": 0, "tag_failures": 0, "completion_tokens": 0})
+        if retry:
+            st["tag_failures"] += int(r["n"])
+        else:
+            st["calls"] += int(r["n"])
+            st["completion_tokens"] += int(r["completion_tokens"] or 0)
+    return out
+
+
+def flush_ledger(hook: Any, con: Connection) -> None:
+    """Write an OpenAICompatClient.on_call hook's buffered rows inside con's transaction (if it is a CallLedger)."""
+    if isinstance(hook, CallLedger):
+        hook.flush(con)
+
+
+class CallLedger:
+    """OpenAICompatClient.on_call hook that records one llm_calls row per call attempt.
+
+    Rows are buffered and written by flush(): callers flush inside the
+    transaction that saves the step's result (chapter, publish), so the
+    result and its calls land in one commit. The buffer is also flushed on
+    its own once it holds max_pending rows, and by close().
+
+    Ids returned for buffered rows are negative until flushed; mark_parse_error
+    accepts either kind. on_record, if set, also gets every record (e.g. the
+    --events log).
+    """
+
+    def __init__(self, con: Connection, *, max_pending: int = 64) -> None:
+        self._con = con
+        self._lock = threading.Lock()
+        self._pending: dict[int, dict[str, Any]] = {}
+        # Buffered id -> row id, for rejects that arrive after a flush.
+        self._flushed: OrderedDict[int, int] = OrderedDict()
+        self._next_id = -1
+        self.max_pending = max_pending
+        self.on_record: Optional[Callable[[Any], None]] = None
+
+    def __call__(self, rec: Any) -> int:
+        labels = rec.labels or {}
+        row = dict(
+            project_id=labels.get("project_id"),
+            chapter_idx=labels.get("chapter_idx"),
+            stage=rec.stage,
+            model=rec.model,
+            attempt=rec.attempt,
+            http_status=rec.status,
+            latency_ms=rec.latency_s * 1000.0,
+            ttft_ms=rec.ttft_s * 1000.0 if rec.ttft_s is not None else None,
+            prompt_tokens=rec.prompt_tokens,
+            completion_tokens=rec.completion_tokens,
+            cached_tokens=rec.cached_tokens,
+            cache_hit=rec.cache_hit,
+            error=rec.error,
+            created_at_utc=now_utc_iso(),
+            response_format=rec.response_format,
+        )
+        with self._lock:
+            call_id = self._next_id
+            self._next_id -= 1
+            self._pending[call_id] = row
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self.flush()
+        if self.on_record is not None:
+            self.on_record(rec)
+        return call_id
+
+    def mark_parse_error(self, call_id: int, reason: str) -> None:
+        """OpenAICompatClient.on_reject hook."""
+        with self._lock:
+            row = self._pending.get(call_id)
+            if row is not None:
+                row["parse_error"] = reason
+                return
+            row_id = self._flushed.get(call_id, call_id)
+        if row_id > 0:
+            mark_llm_call_parse_error(self._con, call_id=row_id, parse_error=reason)
+
+    def flush(self, con: Optional[Connection] = None) -> None:
+        """Write buffered rows, inside the caller's transaction when `con` is in one."""
+        with transaction(con or self._con) as tx, self._lock:
+            written = {call_id: put_llm_call(tx, **row) for call_id, row in self._pending.items()}
+            self._pending.clear()
+            self._flushed.update(written)
+            while len(self._flushed) > 4096:
+                self._flushed.popitem(last=False)
+
+    def close(self) -> None:
+        self.flush()
+
+
+# Job queue. A job is a CLI subcommand (`kind`) plus its argv; workers lease
+# one at a time and must renew the lease (heartbeat_job) until finish_job.
+# A lease that expires (worker killed or hung) is reclaimed by the next
+# lease_job call, so a job can run more than once: every job kind only
+# writes with INSERT OR REPLACE, which makes a rerun safe.
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+
+def enqueue_job(
+    con: Connection,
+    *,
+    kind: str,
+    argv: list[str],
+    depends_on: Iterable[int] = (),
+    priority: int = 0,
+    max_attempts: int = 3,
+) -> int:
+    """Queue a job; it is not leased before every job in `depends_on` is done."""
+    deps = sorted({int(d) for d in depends_on})
+    with transaction(con):
+        cur = con.execute(
+            "INSERT INTO jobs(kind, argv_json, status, priority, max_attempts, created_at_utc) VALUES(?,?,?,?,?,?)",
+            (kind, json.dumps(argv, ensure_ascii=False), "queued", int(priority), int(max_attempts), now_utc_iso()),
+        )
+        job_id = int(cur.lastrowid)
+        con.executemany("INSERT INTO job_deps(job_id, depends_on) VALUES(?,?)", [(job_id, d) for d in deps])
+    return job_id
+
+
+
+def _job_dict(row: sqlite3.Row) -> dict[str, Any]:
+    d = dict(row)
+    d["argv"] = json.loads(d.pop("argv_json"))
+    d.pop("depends_on", None)  # legacy column; see job_deps
+    return d
+
+
+def _fail_dependents(con: Connection, job_id: int) -> None:
+    # Jobs waiting on a failed job can never run.
+    todo = [job_id]
+    while todo:
+        parent = todo.pop()
+        rows = con.execute(
+            "SELECT j.id FROM job_deps jd JOIN jobs j ON j.id=jd.job_id WHERE jd.depends_on=? AND j.status='queued'", (parent,)
+        ).fetchall()
+        for r in rows:
+            con.execute(
+                "UPDATE jobs SET status='failed', error=?, finished_at_utc=? WHERE id=?",
+                (f"dependency {parent} failed", now_utc_iso(), r["id"]),
+            )
+            todo.append(int(r["id"]))
+
+
+def reclaim_expired_jobs(con: Connection, *, now: Optional[float] = None) -> int:
+    """Requeue running jobs whose lease has expired (failing those out of attempts)."""
+    now = time.time() if now is None else now
+    with transaction(con):
+        rows = con.execute(
+            "SELECT id, attempts, max_attempts, lease_owner FROM jobs WHERE status='running' AND lease_expires_at < ?", (now,)
+        ).fetchall()
+        for r in rows:
+            error = f"lease expired (worker {r['lease_owner']})"
+            if r["attempts"] >= r["max_attempts"]:
+                con.execute(
+                    "UPDATE jobs SET status='failed', lease_owner=NULL, error=?, finished_at_utc=? WHERE id=?",
+                    (error, now_utc_iso(), r["id"]),
+                )
+                _fail_dependents(con, int(r["id"]))
+            else:
+                con.execute("UPDATE jobs SET status='queued', lease_owner=NULL, error=? WHERE id=?", (error, r["id"]))
+    return len(rows)
+
+
+def lease_job(
+    con: Connection, *, worker: str, lease_s: float, kinds: Optional[Iterable[str]] = None
+) -> Optional[dict[str, Any]]:
+    """Take the next runnable job (highest priority, then oldest) for lease_s seconds, or None.
+
+    Runs under BEGIN IMMEDIATE, so concurrent workers never lease the same job.
+    """
+    reclaim_expired_jobs(con)
+    sql = """
+        SELECT * FROM jobs j
+        WHERE status='queued'
+          AND (run_after IS NULL OR run_after <= ?)
+          AND NOT EXISTS (
+            SELECT 1 FROM job_deps jd LEFT JOIN jobs d ON d.id=jd.depends_on
+            WHERE jd.job_id=j.id AND (d.status IS NULL OR d.status!='done')
+          )
+    """
+    params: list[Any] = [time.time()]
+    kinds = list(kinds or ())
+    if kinds:
+        sql += f" AND kind IN ({','.join('?' * len(kinds))})"
+        params.extend(kinds)
+    with transaction(con):
+        row = con.execute(sql + " ORDER BY priority DESC, id ASC LIMIT 1", params).fetchone()
+        if row is None:
+            return None
+        con.execute(
+            """
+            UPDATE jobs SET status='running', lease_owner=?, lease_expires_at=?, attempts=attempts+1,
+              started_at_utc=?, error=NULL
+            WHERE id=?
+            """,
+            (worker, time.time() + lease_s, now_utc_iso(), row["id"]),
+        )
+        job = _job_dict(con.execute("SELECT * FROM jobs WHERE id=?", (row["id"],)).fetchone())
+    return job
+
+
+def heartbeat_job(con: Connection, *, job_id: int, worker: str, lease_s: float) -> bool:
+    """Extend a held lease. False if the lease was lost (expired and reclaimed)."""
+    with transaction(con):
+        cur = con.execute(
+            "UPDATE jobs SET lease_expires_at=? WHERE id=? AND lease_owner=? AND status='running'",
+            (time.time() + lease_s, int(job_id), worker),
+        )
+    return cur.rowcount == 1
+
+
+def finish_job(
+    con: Connection,
+    *,
+    job_id: int,
+    worker: str,
+    result: Optional[str] = None,
+    error: Optional[str] = None,
+    retry_after_s: float = 0.0,
+) -> bool:
+    """Mark a leased job done, or on error requeue it to run after retry_after_s (failed once out of attempts).
+
+    Returns False (and changes nothing) if the worker no longer holds the lease.
+    """
+    with transaction(con):
+        row = con.execute(
+            "SELECT attempts, max_attempts FROM jobs WHERE id=? AND lease_owner=? AND status='running'", (int(job_id), worker)
+        ).fetchone()
+        if row is None:
+            return False
+        if error is None:
+            status = "done"
+        else:
+            status = "failed" if row["attempts"] >= row["max_attempts"] else "queued"
+        con.execute(
+            """
+            UPDATE jobs SET status=?, lease_owner=NULL, lease_expires_at=NULL, run_after=?, result=?, error=?, finished_at_utc=?
+            WHERE id=?
+            """,
+            (
+                status,
+                time.time() + retry_after_s if status == "queued" else None,
+                result,
+                error,
+                now_utc_iso() if status != "queued" else None,
+                int(job_id),
+            ),
+        )
+        if status == "failed":
+            _fail_dependents(con, int(job_id))
+    return True
+
+
+def release_job(con: Connection, *, job_id: int, worker: str) -> None:
+    """Give a leased job back unfinished (worker shutting down); the attempt is not counted."""
+    with transaction(con):
+        con.execute(
+            "UPDATE jobs SET status='queued', lease_owner=NULL, lease_expires_at=NULL, attempts=attempts-1 "
+            "WHERE id=? AND lease_owner=? AND status='running'",
+            (int(job_id), worker),
+        )
+
+
+def pending_jobs(con: sqlite3.Connection) -> int:
+    """Jobs that are queued or running (queued ones may still be waiting on a dependency)."""
+    return int(con.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0])
+
+
+def list_jobs(con: sqlite3.Connection, *, status: Optional[str] = None) -> list[dict[str, Any]]:
+    cur = con.cursor()
+    sql = "SELECT * FROM jobs"
+    params: list[Any] = []
+    if status is not None:
+        sql += " WHERE status=?"
+        params.append(status)
+    rows = cur.execute(sql + " ORDER BY id ASC", params).fetchall()
+    deps: dict[int, list[int]] = {}
+    for r in cur.execute("SELECT job_id, depends_on FROM job_deps ORDER BY job_id, depends_on").fetchall():
+        deps.setdefault(int(r["job_id"]), []).append(int(r["depends_on"]))
+    jobs = [_job_dict(r) for r in rows]
+    for j in jobs:
+        j["depends_on"] = deps.get(int(j["id"]), [])
+    return jobs
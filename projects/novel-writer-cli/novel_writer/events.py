@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional, TextIO
+
+from .utils import ensure_dir, now_utc_iso
+
+
+class _Sink:
+    def __init__(self, stream: Optional[TextIO], *, owns_stream: bool) -> None:
+        self.stream = stream
+        self.owns_stream = owns_stream
+        self.lock = threading.Lock()
+        # chapter -> [prompt_tokens, completion_tokens] of the calls recorded so far.
+        self.tokens: dict[Any, list[int]] = {}
+
+
+class EventLog:
+    """Structured progress events (--events), one JSON object per line.
+
+    Every event has `ts` (UTC), `event` and the fields bound with bind()
+    (project_id, chapter). Lines are flushed as written, so a reader tailing
+    the file sees each step as it happens. Thread-safe; an EventLog without a
+    stream drops everything.
+
+    Events: stage_start / stage_end (seconds, ok, tokens used by the
+    chapter's calls during the stage), call (one per LLM call attempt),
+    retry, expand, bytes_written.
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None, *, owns_stream: bool = False, **fields: Any) -> None:
+        self._sink = _Sink(stream, owns_stream=owns_stream)
+        self.fields = fields
+
+    @property
+    def enabled(self) -> bool:
+        return self._sink.stream is not None
+
+    def bind(self, **fields: Any) -> "EventLog":
+        view = EventLog.__new__(EventLog)
+        view._sink = self._sink
+        view.fields = {**self.fields, **fields}
+        return view
+
+    def emit(self, event: str, **fields: Any) -> None:
+        sink = self._sink
+        if sink.stream is None:
+            return
+        line = json.dumps({"ts": now_utc_iso(), "event": event, **self.fields, **fields}, ensure_ascii=False)
+        with sink.lock:
+            if sink.stream is not None:
+                sink.stream.write(line + "\n")
+                sink.stream.flush()
+
+    def tokens(self) -> tuple[int, int]:
+        """Prompt and completion tokens of the bound chapter's calls recorded so far."""
+        with self._sink.lock:
+            prompt, completion = self._sink.tokens.get(self.fields.get("chapter"), (0, 0))
+            return prompt, completion
+
+    @contextmanager
+    def stage(self, name: str, **fields: Any) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        before = self.tokens()
+        t0 = time.monotonic()
+        self.emit("stage_start", stage=name, **fields)
+
+        def end(**result: Any) -> None:
+            after = self.tokens()
+            self.emit(
+                "stage_end",
+                stage=name,
+                seconds=round(time.monotonic() - t0, 3),
+                prompt_tokens=after[0] - before[0],
+                completion_tokens=after[1] - before[1],
+                **fields,
+                **result,
+            )
+
+        try:
+            yield
+        except BaseException as e:
+            end(ok=False, error=str(e)[:200])
+            raise
+        end(ok=True)
+
+    def on_call(self, rec: Any) -> None:
+        """CallLedger.on_record hook: a `call` event per attempt, `retry` for repeated attempts."""
+        if not self.enabled:
+            return
+        chapter = (rec.labels or {}).get("chapter_idx")
+        if not rec.cache_hit:
+            with self._sink.lock:
+                t = self._sink.tokens.setdefault(chapter, [0, 0])
+                t[0] += int(rec.prompt_tokens or 0)
+                t[1] += int(rec.completion_tokens or 0)
+        log = self.bind(chapter=chapter) if chapter is not None else self
+        if rec.attempt > 1:
+            log.emit("retry", stage=rec.stage, attempt=rec.attempt, reason="transport")
+        log.emit(
+            "call",
+            stage=rec.stage,
+            model=rec.model,
+            attempt=rec.attempt,
+            status=rec.status,
+            latency_ms=round(rec.latency_s * 1000.0, 1),
+            prompt_tokens=rec.prompt_tokens,
+            completion_tokens=rec.completion_tokens,
+            cached_tokens=rec.cached_tokens,
+            cache_hit=rec.cache_hit,
+            error=rec.error,
+        )
+
+    def close(self) -> None:
+        sink = self._sink
+        with sink.lock:
+            if sink.stream is not None and sink.owns_stream:
+                sink.stream.close()
+            sink.stream = None
+
+
+def open_events(target: Optional[str], **fields: Any) -> EventLog:
+    """EventLog for --events: None = off, "-" = stdout, else a JSONL file (appended to)."""
+    if not target:
+        return EventLog(**fields)
+    if target == "-":
+        return EventLog(sys.stdout, **fields)
+    path = Path(target)
+    ensure_dir(path.parent)
+    return EventLog(path.open("a", encoding="utf-8"), owns_stream=True, **fields)
@@ -1,17 +1,491 @@
 from __future__ import annotations
 
+import copy
+import email.utils
+import hashlib
+import http.client
 import json
-import urllib.error
-import urllib.request
-from typing import Any, Optional
+import random
+import socket
+import threading
+import time
+import urllib.parse
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from .cache import DEFAULT_CACHE_STAGES, ResponseCache
+from .ratelimit import ConcurrencyGate, estimate_tokens
+from .utils import PROMPT_CACHE_HINTS
+
+
+@dataclass
+class CallTiming:
+    """Transport timings for one chat_completions call (the response's "x_timing", as a dict)."""
+
+    host: str
+    reused: bool
+    connect_s: float
+    total_s: float
+    # Streaming only: seconds from request start to the first content delta.
+    ttft_s: Optional[float] = None
+
+
+@dataclass
+class CallRecord:
+    """One LLM call attempt, reported to OpenAICompatClient.on_call (e.g. the SQLite ledger)."""
+
+    stage: Optional[str]
+    model: str
+    attempt: int
+    latency_s: float
+    status: Optional[int] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cached_tokens: Optional[int] = None
+    ttft_s: Optional[float] = None
+    cache_hit: bool = False
+    error: Optional[str] = None
+    labels: Optional[dict[str, Any]] = None
+    # response_format type sent with the call ("json_schema", "json_object"), if any.
+    response_format: Optional[str] = None
+
+
+def response_format_type(payload: Optional[dict[str, Any]]) -> Optional[str]:
+    rf = (payload or {}).get("response_format")
+    return str(rf.get("type")) if isinstance(rf, dict) and rf.get("type") else None
+
+
+def usage_tokens(obj: dict[str, Any]) -> tuple[Optional[int], Optional[int], Optional[int]]:
+    """Return (prompt, completion, cached) token counts from a response's usage block."""
+    usage = obj.get("usage") or {}
+    details = usage.get("prompt_tokens_details") or {}
+    cached = details.get("cached_tokens")
+    if cached is None:
+        # Anthropic-style gateways.
+        cached = usage.get("cache_read_input_tokens")
+    return usage.get("prompt_tokens"), usage.get("completion_tokens"), cached
+
+
+@dataclass
+class PoolStats:
+    connects: int = 0
+    reuses: int = 0
+    reconnects: int = 0
+    connect_s_total: float = 0.0
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections, pooled per (scheme, host, port).
+
+    Connections are checked out for one request/response cycle and returned
+    afterwards. Stale sockets (closed by the server while idle) are detected
+    on reuse and transparently re-opened by the caller.
+    """
+
+    def __init__(self, *, timeout_s: float, max_idle_per_host: int = 4) -> None:
+        self._timeout_s = timeout_s
+        self._max_idle = max_idle_per_host
+        self._idle: dict[tuple[str, str, int], list[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+        self.stats = PoolStats()
+
+    def acquire(self, scheme: str, host: str, port: int) -> tuple[http.client.HTTPConnection, bool]:
+        key = (scheme, host, port)
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.stats.reuses += 1
+                return idle.pop(), True
+        if scheme == "https":
+            conn: http.client.HTTPConnection = http.client.HTTPSConnection(host, port, timeout=self._timeout_s)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=self._timeout_s)
+        return conn, False
+
+    def release(self, scheme: str, host: str, port: int, conn: http.client.HTTPConnection) -> None:
+        key = (scheme, host, port)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self._max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def record_connect(self, seconds: float, *, reconnect: bool) -> None:
+        with self._lock:
+            self.stats.connects += 1
+            self.stats.connect_s_total += seconds
+            if reconnect:
+                self.stats.reconnects += 1
+
+    def close(self) -> None:
+        with self._lock:
+            conns = [c for idle in self._idle.values() for c in idle]
+            self._idle.clear()
+        for c in conns:
+            c.close()
+
+
+class LLMError(RuntimeError):
+    """Transport or HTTP failure of an LLM call.
+
+    kind is one of: http (status >= 400), connect (could not open a connection),
+    read (timeout or reset while waiting for the response), circuit_open.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        *,
+        kind: str,
+        status: Optional[int] = None,
+        retry_after_s: Optional[float] = None,
+    ) -> None:
+        super().__init__(message)
+        self.kind = kind
+        self.status = status
+        self.retry_after_s = retry_after_s
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Retry/backoff settings for one call site.
+
+    Connect failures and read timeouts have separate retry budgets: a read
+    timeout has already cost read_timeout_s, so it is retried more sparingly.
+    """
+
+    max_attempts: int = 4
+    base_delay_s: float = 1.0
+    max_delay_s: float = 30.0
+    # Upper bound on how long a server-sent Retry-After is honoured.
+    max_retry_after_s: float = 120.0
+    connect_timeout_s: float = 10.0
+    read_timeout_s: float = 120.0
+    max_connect_retries: int = 3
+    max_read_retries: int = 1
+    retry_statuses: tuple[int, ...] = (408, 409, 425, 429, 500, 502, 503, 504)
+
+    def backoff_s(self, attempt: int, retry_after_s: Optional[float] = None) -> float:
+        # Full jitter: uniform in [0, min(max_delay, base * 2^(attempt-1))].
+        delay = random.uniform(0.0, min(self.max_delay_s, self.base_delay_s * (2 ** (attempt - 1))))
+        if retry_after_s is not None:
+            delay = max(delay, min(retry_after_s, self.max_retry_after_s))
+        return delay
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+
+class CircuitBreaker:
+    """Per-model breaker over a sliding window of recent call outcomes.
+
+    Opens when at least `min_calls` of the last `window` calls were recorded and
+    the failure ratio reaches `failure_ratio`; after `cooldown_s` one probe call
+    is let through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, *, window: int = 20, min_calls: int = 5, failure_ratio: float = 0.5, cooldown_s: float = 60.0) -> None:
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._min_calls = min_calls
+        self._failure_ratio = failure_ratio
+        self._cooldown_s = cooldown_s
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self._cooldown_s or self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            if self._opened_at is not None and self._probe_in_flight:
+                self._probe_in_flight = False
+                if ok:
+                    self._opened_at = None
+                    self._outcomes.clear()
+                else:
+                    self._opened_at = time.monotonic()
+                return
+            self._outcomes.append(ok)
+            n = len(self._outcomes)
+            failures = n - sum(self._outcomes)
+            if n >= self._min_calls and failures / n >= self._failure_ratio:
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """End a call without a verdict (cancelled, aborted): lets the next probe through."""
+        with self._lock:
+            if self._opened_at is not None:
+                self._probe_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None
+
+
+class CancelToken:
+    """Lets another thread abort an in-flight call by shutting down its socket."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._conn: Optional[http.client.HTTPConnection] = None
+        self.cancelled = False
+
+    def attach(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._conn = conn
+            if self.cancelled:
+                raise LLMError("LLM call cancelled", kind="cancelled")
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            conn = self._conn
+        sock = conn.sock if conn is not None else None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+@dataclass(frozen=True)
+class HedgePolicy:
+    """Opt-in request hedging for tail latency.
+
+    If a call has not returned after the `percentile` of recent latencies for its
+    (stage, model), a duplicate is sent (to `secondary_model` and/or the
+    `secondary` client's endpoint, else the same model). The first acceptable
+    response wins and the other call is cancelled. Hedges are capped at
+    `max_hedge_ratio` of hedge-eligible calls so token spend stays bounded.
+    """
+
+    percentile: float = 0.9
+    min_samples: int = 8
+    min_delay_s: float = 5.0
+    max_hedge_ratio: float = 0.1
+    secondary_model: Optional[str] = None
+    secondary: Optional["OpenAICompatClient"] = None
+
+
+class LatencyTracker:
+    """Recent successful-call latencies per (stage, model)."""
+
+    def __init__(self, *, window: int = 200) -> None:
+        self._window = window
+        self._samples: dict[tuple[str, str], deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: Optional[str], model: str, latency_s: float) -> None:
+        with self._lock:
+            q = self._samples.setdefault((stage or "", model), deque(maxlen=self._window))
+            q.append(latency_s)
+
+    def seed(self, stage: Optional[str], model: str, samples: Iterable[float]) -> None:
+        for x in samples:
+            self.add(stage, model, x)
+
+    def percentile(self, stage: Optional[str], model: str, q: float, *, min_samples: int) -> Optional[float]:
+        with self._lock:
+            vals = sorted(self._samples.get((stage or "", model)) or ())
+        if len(vals) < max(1, min_samples):
+            return None
+        k = max(0, min(len(vals) - 1, int(round(q * len(vals) + 0.5)) - 1))
+        return vals[k]
+
+
+class HedgeBudget:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.eligible = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def note_eligible(self) -> None:
+        with self._lock:
+            self.eligible += 1
+
+    def try_spend(self, max_ratio: float) -> bool:
+        # The first hedge is always allowed, so short runs (a write-chapter has
+        # ~6 eligible pair calls) can hedge too; after that max_ratio applies.
+        with self._lock:
+            if self.hedged >= max(1.0, max_ratio * self.eligible):
+                return False
+            self.hedged += 1
+            return True
+
+    def note_win(self) -> None:
+        with self._lock:
+            self.hedge_wins += 1
+
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        dt = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, dt.timestamp() - time.time())
+
+
+class StreamAborted(RuntimeError):
+    """Raised when a stream validator rejects partial output and the stream is cancelled."""
+
+    def __init__(self, reason: str, *, partial_text: str) -> None:
+        super().__init__(f"LLM stream aborted: {reason}")
+        self.reason = reason
+        self.partial_text = partial_text
+
+
+# A validator inspects the text received so far and returns an abort reason,
+# or None to keep streaming. Validators are called after every delta.
+StreamValidator = Callable[[str], Optional[str]]
+
+
+def require_marker_within(marker: str, n_chars: int) -> StreamValidator:
+    """Abort when `marker` has not appeared within the first `n_chars` characters."""
+
+    def check(text: str) -> Optional[str]:
+        if len(text) >= n_chars and marker not in text[: n_chars + len(marker)]:
+            return f"{marker} not found in first {n_chars} chars"
+        return None
+
+    return check
+
+
+def require_json_object_with_key(key: str, n_chars: int) -> StreamValidator:
+    """Abort when output does not look like a JSON object containing `key` early on.
+
+    Leading whitespace and a ```json fence are tolerated.
+    """
+    needle = f'"{key}"'
+
+    def check(text: str) -> Optional[str]:
+        head = text.lstrip()
+        if head.startswith("```"):
+            nl = head.find("\n")
+            if nl == -1:
+                return None
+            head = head[nl + 1 :].lstrip()
+        if head and not head.startswith("{"):
+            return "output does not start with a JSON object"
+        if len(text) >= n_chars and needle not in text:
+            return f"{needle} not found in first {n_chars} chars"
+        return None
+
+    return check
+
+
+# Errors that mean a pooled keep-alive socket was closed by the peer while idle.
+_STALE_CONN_ERRORS = (http.client.RemoteDisconnected, http.client.CannotSendRequest, BrokenPipeError, ConnectionResetError)
 
 
 class OpenAICompatClient:
-    def __init__(self, *, base_url: str, api_key: str, timeout_s: int = 120) -> None:
+    def __init__(
+        self,
+        *,
+        base_url: str,
+        api_key: str,
+        timeout_s: int = 120,
+        cache: Optional[ResponseCache] = None,
+        cache_stages: Iterable[str] = DEFAULT_CACHE_STAGES,
+        gate: Optional[ConcurrencyGate] = None,
+        retry: Optional[RetryPolicy] = None,
+        fallback_models: Optional[dict[str, str]] = None,
+        prompt_cache_hints: Iterable[str] = (),
+    ) -> None:
         self._base_url = base_url.rstrip("/")
         self._api_key = api_key
         self._timeout_s = timeout_s
 
+        parts = urllib.parse.urlsplit(self._base_url)
+        self._scheme = parts.scheme or "http"
+        self._host = parts.hostname or ""
+        self._port = parts.port or (443 if self._scheme == "https" else 80)
+        self._path_prefix = parts.path.rstrip("/")
+
+        self.pool = ConnectionPool(timeout_s=timeout_s)
+        self.cache = cache
+        self.cache_stages = frozenset(cache_stages)
+        # Process-wide max-in-flight and RPM/TPM limits; shared by threads and the async client.
+        self.gate = gate or ConcurrencyGate()
+        self.default_retry = retry or RetryPolicy(read_timeout_s=float(timeout_s))
+        # Model to switch to while a model's circuit breaker is open.
+        self.fallback_models = dict(fallback_models or {})
+        # Provider prompt-cache hints sent with calls that pass cache_prefix (see PROMPT_CACHE_HINTS).
+        unknown = set(prompt_cache_hints) - PROMPT_CACHE_HINTS
+        if unknown:
+            raise ValueError(f"unknown prompt cache hints: {sorted(unknown)}")
+        self.prompt_cache_hints = frozenset(prompt_cache_hints)
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._breakers_lock = threading.Lock()
+        self.latency = LatencyTracker()
+        self.hedge_budget = HedgeBudget()
+        self._hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-hedge")
+        # Called with a CallRecord after every attempt (and every cache hit). May return an id
+        # for the record (e.g. the ledger row), which reject() passes to on_reject.
+        self.on_call: Optional[Callable[[CallRecord], Optional[int]]] = None
+        self.on_reject: Optional[Callable[[int, str], None]] = None
+        # Called by close(), e.g. to flush the buffered ledger.
+        self.on_close: Optional[Callable[[], None]] = None
+        # Set on views of a long-lived client (`serve`): close() then only calls on_close.
+        self.keep_open = False
+        self.labels: dict[str, Any] = {}
+
+    def bind(self, **labels: Any) -> "OpenAICompatClient":
+        """Return a view of this client whose CallRecords carry extra labels.
+
+        The view shares the connection pool, cache, gate, breakers and on_call hook.
+        """
+        view = copy.copy(self)
+        view.labels = {**self.labels, **labels}
+        return view
+
+    def close(self) -> None:
+        if not self.keep_open:
+            self._hedge_executor.shutdown(wait=False)
+            self.pool.close()
+            if self.cache is not None:
+                self.cache.close()
+        if self.on_close is not None:
+            self.on_close()
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        with self._breakers_lock:
+            b = self._breakers.get(model)
+            if b is None:
+                b = self._breakers[model] = CircuitBreaker()
+            return b
+
+    def cache_evict(self, resp: dict[str, Any]) -> None:
+        """Drop a cached response, e.g. when it turned out to be unparseable."""
+        key = (resp.get("x_cache") or {}).get("key")
+        if key and self.cache is not None:
+            self.cache.delete(key)
+
+    def reject(self, resp: dict[str, Any], reason: str) -> None:
+        """Mark a response as unusable (failed to parse/validate): evict it and flag its call record."""
+        self.cache_evict(resp)
+        call_id = (resp.get("x_call") or {}).get("id")
+        if call_id is not None and self.on_reject is not None:
+            self.on_reject(call_id, reason[:200])
+
     def chat_completions(
         self,
         *,
@@ -21,16 +495,317 @@ class OpenAICompatClient:
         temperature: float = 0.3,
         max_tokens: Optional[int] = None,
         extra: Optional[dict[str, Any]] = None,
+        stream: bool = False,
+        on_delta: Optional[Callable[[str], None]] = None,
+        validators: Optional[list[StreamValidator]] = None,
+        stage: Optional[str] = None,
+        retry: Optional[RetryPolicy] = None,
+        hedge: Optional[HedgePolicy] = None,
+        accept: Optional[Callable[[dict[str, Any]], bool]] = None,
+        cache_prefix: Optional[str] = None,
+    ) -> dict[str, Any]:
+        """Call /v1/chat/completions and return the response object.
+
+        With stream=True the response is read as SSE; `on_delta` receives each
+        content delta as it arrives and `validators` may cancel the stream early
+        (raising StreamAborted). The return value has the same shape as a
+        non-streaming response.
+
+        `stage` names the pipeline step (architect/plan/pair/retry/expand/summary);
+        responses of stages in `cache_stages` are served from the response cache.
+
+        Transient failures (retryable HTTP statuses, connect errors, read
+        timeouts) are retried per `retry` (default: the client's policy). When
+        the model's circuit breaker is open the call goes to its fallback model,
+        or fails fast with LLMError(kind="circuit_open").
+
+        `hedge` enables hedged requests (non-streaming calls only); `accept`
+        decides whether a response is valid enough to win the race.
+
+        `cache_prefix` is the leading part of `user` shared with other calls; with
+        prompt_cache_hints enabled it is marked for the provider's prompt cache.
+        """
+        cache_key = None
+        if self.cache is not None and stage in self.cache_stages:
+            cache_key = ResponseCache.make_key(
+                base_url=self._base_url,
+                model=model,
+                system=system,
+                user=user,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                extra=extra,
+            )
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                call_id = self._record(
+                    stage=stage,
+                    model=model,
+                    attempt=0,
+                    latency_s=0.0,
+                    status=None,
+                    obj=cached,
+                    cache_hit=True,
+                    response_format=response_format_type(extra),
+                )
+                cached["x_call"] = {"id": call_id}
+                if on_delta:
+                    on_delta(self.get_text(cached))
+                cached["x_cache"] = {"key": cache_key, "hit": True}
+                return cached
+
+        payload = self._payload(
+            model=model,
+            system=system,
+            user=user,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            extra=extra,
+            cache_prefix=cache_prefix,
+        )
+        call_kwargs: dict[str, Any] = dict(
+            stage=stage,
+            policy=retry or self.default_retry,
+            est_tokens=estimate_tokens(system, user, max_tokens=max_tokens),
+            stream=stream,
+            on_delta=on_delta,
+            validators=validators or [],
+        )
+        if hedge is not None and not stream:
+            obj = self._hedged(payload, hedge=hedge, accept=accept, **call_kwargs)
+        else:
+            obj = self._call_with_retry(payload, **call_kwargs)
+
+        if cache_key is not None and _is_complete(obj):
+            self.cache.put(cache_key, {k: v for k, v in obj.items() if k not in ("x_call", "x_timing")})
+            obj["x_cache"] = {"key": cache_key, "hit": False}
+        return obj
+
+    def _hedged(
+        self,
+        payload: dict[str, Any],
+        *,
+        hedge: HedgePolicy,
+        accept: Optional[Callable[[dict[str, Any]], bool]],
+        **call_kwargs: Any,
     ) -> dict[str, Any]:
-        url = self._base_url + "/v1/chat/completions"
+        stage = call_kwargs["stage"]
+        model = str(payload["model"])
+        threshold = self.latency.percentile(stage, model, hedge.percentile, min_samples=hedge.min_samples)
+        self.hedge_budget.note_eligible()
+
+        primary_cancel = CancelToken()
+        primary = self._hedge_executor.submit(self._call_with_retry, payload, cancel=primary_cancel, **call_kwargs)
+        if threshold is None:
+            return primary.result()
+        done, _ = wait([primary], timeout=max(threshold, hedge.min_delay_s))
+        if done or not self.hedge_budget.try_spend(hedge.max_hedge_ratio):
+            return primary.result()
+
+        target = hedge.secondary or self
+        hedge_payload = dict(payload, model=hedge.secondary_model) if hedge.secondary_model else payload
+        hedge_cancel = CancelToken()
+        hedge_kwargs = dict(call_kwargs, stage=f"{stage}:hedge")
+        secondary = self._hedge_executor.submit(target._call_with_retry, hedge_payload, cancel=hedge_cancel, **hedge_kwargs)
+
+        pending: dict[Future[dict[str, Any]], CancelToken] = {primary: primary_cancel, secondary: hedge_cancel}
+        fallback: Optional[dict[str, Any]] = None
+        last_err: Optional[BaseException] = None
+        while pending:
+            finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for fut in finished:
+                pending.pop(fut)
+                try:
+                    obj = fut.result()
+                except Exception as e:
+                    last_err = e
+                    continue
+                if accept is None or accept(obj):
+                    for token in pending.values():
+                        token.cancel()
+                    if fut is secondary:
+                        self.hedge_budget.note_win()
+                    return obj
+                fallback = fallback or obj
+        if fallback is not None:
+            return fallback
+        assert last_err is not None
+        raise last_err
+
+    def _call_with_retry(
+        self,
+        payload: dict[str, Any],
+        *,
+        stage: Optional[str],
+        policy: RetryPolicy,
+        est_tokens: int,
+        stream: bool,
+        on_delta: Optional[Callable[[str], None]],
+        validators: list[StreamValidator],
+        cancel: Optional[CancelToken] = None,
+    ) -> dict[str, Any]:
+        connect_failures = 0
+        read_failures = 0
+        attempt = 0
+        rf = response_format_type(payload)
+        while True:
+            attempt += 1
+            if cancel is not None and cancel.cancelled:
+                raise LLMError("LLM call cancelled", kind="cancelled")
+            model = str(payload["model"])
+            breaker = self.breaker(model)
+            if not breaker.allow():
+                fallback = self.fallback_models.get(model)
+                if fallback and fallback != model and self.breaker(fallback).allow():
+                    payload = dict(payload, model=fallback)
+                    breaker = self.breaker(fallback)
+                    model = fallback
+                else:
+                    raise LLMError(f"LLM circuit open for model {model}", kind="circuit_open")
+
+            t0 = time.perf_counter()
+            # Breaker verdict for this attempt; None (cancelled, aborted, unexpected error)
+            # only releases a half-open probe so the next call can probe again.
+            verdict: Optional[bool] = None
+            try:
+                with self.gate.slot(est_tokens):
+                    t0 = time.perf_counter()
+                    if stream:
+                        obj = self._stream_to_response(payload, policy, on_delta=on_delta, validators=validators)
+                    else:
+                        body = json.dumps(payload).encode("utf-8")
+                        raw, timing = self._post(self._path_prefix + "/v1/chat/completions", body, policy, cancel)
+                        obj = json.loads(raw)
+                        obj["x_timing"] = asdict(timing)
+                verdict = True
+            except StreamAborted as e:
+                self._record(
+                    stage=stage,
+                    model=model,
+                    attempt=attempt,
+                    latency_s=time.perf_counter() - t0,
+                    status=200,
+                    error=e.reason,
+                    response_format=rf,
+                )
+                raise
+            except LLMError as e:
+                if cancel is not None and cancel.cancelled:
+                    e = LLMError("LLM call cancelled", kind="cancelled")
+                self._record(
+                    stage=stage,
+                    model=model,
+                    attempt=attempt,
+                    latency_s=time.perf_counter() - t0,
+                    status=e.status,
+                    error=e.kind,
+                    response_format=rf,
+                )
+                if e.kind == "cancelled":
+                    raise e
+                retryable = e.kind in ("connect", "read") or e.status in policy.retry_statuses
+                # A non-retryable status (400, 401, ...) means the endpoint is up.
+                verdict = not retryable
+                if e.kind == "connect":
+                    connect_failures += 1
+                    retryable = retryable and connect_failures <= policy.max_connect_retries
+                elif e.kind == "read":
+                    read_failures += 1
+                    retryable = retryable and read_failures <= policy.max_read_retries
+                if not retryable or attempt >= policy.max_attempts:
+                    raise
+                time.sleep(policy.backoff_s(attempt, e.retry_after_s))
+                continue
+            finally:
+                if verdict is None:
+                    breaker.release()
+                else:
+                    breaker.record(verdict)
+
+            latency_s = time.perf_counter() - t0
+            self.latency.add(stage, model, latency_s)
+            call_id = self._record(
+                stage=stage,
+                model=model,
+                attempt=attempt,
+                latency_s=latency_s,
+                status=200,
+                obj=obj,
+                ttft_s=(obj.get("x_timing") or {}).get("ttft_s"),
+                response_format=rf,
+            )
+            obj["x_call"] = {"id": call_id}
+            if self.gate.limiter is not None:
+                self.gate.limiter.settle(est_tokens, (obj.get("usage") or {}).get("total_tokens"))
+            return obj
+
+    def _record(
+        self,
+        *,
+        stage: Optional[str],
+        model: str,
+        attempt: int,
+        latency_s: float,
+        status: Optional[int],
+        obj: Optional[dict[str, Any]] = None,
+        ttft_s: Optional[float] = None,
+        cache_hit: bool = False,
+        error: Optional[str] = None,
+        response_format: Optional[str] = None,
+    ) -> Optional[int]:
+        if self.on_call is None:
+            return None
+        prompt_t, completion_t, cached_t = usage_tokens(obj) if obj else (None, None, None)
+        return self.on_call(
+            CallRecord(
+                stage=stage,
+                model=model,
+                attempt=attempt,
+                latency_s=latency_s,
+                status=status,
+                prompt_tokens=prompt_t,
+                completion_tokens=completion_t,
+                cached_tokens=cached_t,
+                ttft_s=ttft_s,
+                cache_hit=cache_hit,
+                error=error,
+                labels=self.labels,
+                response_format=response_format,
+            )
+        )
+
+    def _payload(
+        self,
+        *,
+        model: str,
+        system: str,
+        user: str,
+        temperature: float,
+        max_tokens: Optional[int],
+        extra: Optional[dict[str, Any]],
+        cache_prefix: Optional[str] = None,
+    ) -> dict[str, Any]:
+        user_content: Any = user
+        if not cache_prefix or not user.startswith(cache_prefix):
+            cache_prefix = None
+        if cache_prefix and "cache_control" in self.prompt_cache_hints:
+            # Anthropic-style breakpoint: system + shared prefix are cached as one block.
+            user_content = [
+                {"type": "text", "text": cache_prefix, "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": user[len(cache_prefix) :]},
+            ]
         payload: dict[str, Any] = {
             "model": model,
             "messages": [
                 {"role": "system", "content": system},
-                {"role": "user", "content": user},
+                {"role": "user", "content": user_content},
             ],
             "temperature": temperature,
         }
+        if cache_prefix and "key" in self.prompt_cache_hints:
+            # OpenAI routes requests with the same key to the same cache shard.
+            digest = hashlib.sha256((system + "\0" + cache_prefix).encode("utf-8")).hexdigest()
+            payload["prompt_cache_key"] = "novel-" + digest[:24]
         # Some gateways reject setting both max_tokens and max_completion_tokens.
         if extra and "max_completion_tokens" in extra:
             if max_tokens is not None:
@@ -43,27 +818,199 @@ class OpenAICompatClient:
 
         if extra:
             payload.update(extra)
+        return payload
 
+    def _stream_to_response(
+        self,
+        payload: dict[str, Any],
+        policy: RetryPolicy,
+        *,
+        on_delta: Optional[Callable[[str], None]],
+        validators: list[StreamValidator],
+    ) -> dict[str, Any]:
+        text = ""
+        finish_reason = None
+        usage = None
+        resp_id = None
+        timing: dict[str, Any] = {}
+        chunks = self._iter_sse(payload, policy, timing=timing)
+        try:
+            for chunk in chunks:
+                resp_id = resp_id or chunk.get("id")
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+                choices = chunk.get("choices") or []
+                if choices and choices[0].get("finish_reason"):
+                    finish_reason = choices[0]["finish_reason"]
+                delta = _chunk_delta(chunk)
+                if not delta:
+                    continue
+                text += delta
+                if on_delta:
+                    on_delta(delta)
+                for v in validators:
+                    reason = v(text)
+                    if reason:
+                        raise StreamAborted(reason, partial_text=text)
+        finally:
+            chunks.close()
+
+        obj: dict[str, Any] = {
+            "id": resp_id,
+            "object": "chat.completion",
+            "model": payload.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": finish_reason}],
+        }
+        if usage:
+            obj["usage"] = usage
+        obj["x_timing"] = timing
+        return obj
+
+    def _iter_sse(
+        self, payload: dict[str, Any], policy: RetryPolicy, *, timing: Optional[dict[str, Any]] = None
+    ) -> Iterator[dict[str, Any]]:
+        """Yield the stream's chunks; `timing` (if given) receives this call's CallTiming fields at the end."""
+        payload = dict(payload, stream=True, stream_options={"include_usage": True})
         body = json.dumps(payload).encode("utf-8")
-        headers = {
+        t0 = time.perf_counter()
+        conn, resp, reused, connect_s = self._send(self._path_prefix + "/v1/chat/completions", body, policy)
+        if resp.status >= 400:
+            self._raise_http_error(conn, resp)
+
+        ttft_s: Optional[float] = None
+        done = False
+        try:
+            while True:
+                try:
+                    line = resp.readline()
+                except (OSError, http.client.HTTPException) as e:
+                    raise LLMError(f"LLM read error: {e}", kind="read")
+                if not line:
+                    break
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                chunk = json.loads(data)
+                if ttft_s is None and _chunk_delta(chunk):
+                    ttft_s = time.perf_counter() - t0
+                yield chunk
+            done = True
+        finally:
+            if done:
+                # Drain the terminating chunk so the socket can be reused.
+                resp.read()
+                self._finish(conn, resp)
+            else:
+                # Cancelled or failed mid-stream: the socket is in an unknown state.
+                conn.close()
+            if timing is not None:
+                timing.update(
+                    asdict(
+                        CallTiming(
+                            host=self._host,
+                            reused=reused,
+                            connect_s=connect_s,
+                            total_s=time.perf_counter() - t0,
+                            ttft_s=ttft_s,
+                        )
+                    )
+                )
+
+    def _headers(self) -> dict[str, str]:
+        return {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self._api_key}",
+            "Connection": "keep-alive",
             # Some deployments/WAFs reject default Python UA.
             "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
         }
 
-        req = urllib.request.Request(url, data=body, headers=headers, method="POST")
+    def _post(
+        self, path: str, body: bytes, policy: RetryPolicy, cancel: Optional[CancelToken] = None
+    ) -> tuple[bytes, CallTiming]:
+        t0 = time.perf_counter()
+        conn, resp, reused, connect_s = self._send(path, body, policy, cancel)
+        if resp.status >= 400:
+            self._raise_http_error(conn, resp)
         try:
-            with urllib.request.urlopen(req, timeout=self._timeout_s) as resp:
-                resp_body = resp.read()
-        except urllib.error.HTTPError as e:
-            msg = e.read().decode("utf-8", errors="replace")
-            raise RuntimeError(f"LLM HTTPError {e.code}: {msg}")
-        except urllib.error.URLError as e:
-            raise RuntimeError(f"LLM URLError: {e}")
-
-        obj = json.loads(resp_body)
-        return obj
+            resp_body = resp.read()
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            raise LLMError(f"LLM read error: {e}", kind="read")
+        self._finish(conn, resp)
+
+        timing = CallTiming(
+            host=self._host,
+            reused=reused,
+            connect_s=connect_s,
+            total_s=time.perf_counter() - t0,
+        )
+        return resp_body, timing
+
+    def _raise_http_error(self, conn: http.client.HTTPConnection, resp: http.client.HTTPResponse) -> None:
+        try:
+            msg = resp.read().decode("utf-8", errors="replace")
+            self._finish(conn, resp)
+        except (OSError, http.client.HTTPException):
+            msg = ""
+            conn.close()
+        raise LLMError(
+            f"LLM HTTPError {resp.status}: {msg}",
+            kind="http",
+            status=resp.status,
+            retry_after_s=_retry_after_seconds(resp.getheader("Retry-After")),
+        )
+
+    def _finish(self, conn: http.client.HTTPConnection, resp: http.client.HTTPResponse) -> None:
+        if resp.will_close:
+            conn.close()
+        else:
+            self.pool.release(self._scheme, self._host, self._port, conn)
+
+    def _send(
+        self, path: str, body: bytes, policy: RetryPolicy, cancel: Optional[CancelToken] = None
+    ) -> tuple[http.client.HTTPConnection, http.client.HTTPResponse, bool, float]:
+        """Send a POST on a pooled connection and return once response headers arrive."""
+        stale_retry = False
+        while True:
+            conn, reused = self.pool.acquire(self._scheme, self._host, self._port)
+            if cancel is not None:
+                try:
+                    cancel.attach(conn)
+                except LLMError:
+                    self.pool.release(self._scheme, self._host, self._port, conn)
+                    raise
+            connect_s = 0.0
+            if not reused:
+                conn.timeout = policy.connect_timeout_s
+                tc = time.perf_counter()
+                try:
+                    conn.connect()
+                except OSError as e:
+                    conn.close()
+                    raise LLMError(f"LLM connect error: {e}", kind="connect")
+                connect_s = time.perf_counter() - tc
+                self.pool.record_connect(connect_s, reconnect=stale_retry)
+            conn.timeout = policy.read_timeout_s
+            if conn.sock is not None:
+                conn.sock.settimeout(policy.read_timeout_s)
+            try:
+                conn.request("POST", path, body=body, headers=self._headers())
+                resp = conn.getresponse()
+            except _STALE_CONN_ERRORS as e:
+                conn.close()
+                if reused and not stale_retry:
+                    # The server closed an idle keep-alive socket; re-open once.
+                    stale_retry = True
+                    continue
+                raise LLMError(f"LLM read error: {e}", kind="read")
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                raise LLMError(f"LLM read error: {e}", kind="read")
+            return conn, resp, reused, connect_s
 
     @staticmethod
     def get_text(obj: dict[str, Any]) -> str:
@@ -71,3 +1018,28 @@ class OpenAICompatClient:
             return str(obj["choices"][0]["message"]["content"])
         except Exception:
             return json.dumps(obj, ensure_ascii=False)
+
+    @staticmethod
+    def get_finish_reason(obj: dict[str, Any]) -> Optional[str]:
+        """"stop", "length" (cut off at max_tokens), ... or None when the response has none."""
+        try:
+            reason = obj["choices"][0].get("finish_reason")
+        except (KeyError, IndexError, TypeError, AttributeError):
+            return None
+        return str(reason) if reason else None
+
+
+def _is_complete(obj: dict[str, Any]) -> bool:
+    # Only cache answers that finished normally; truncated output is retried with more tokens.
+    try:
+        choice = obj["choices"][0]
+        return bool(choice["message"]["content"]) and choice.get("finish_reason") in (None, "stop")
+    except (KeyError, IndexError, TypeError):
+        return False
+
+
+def _chunk_delta(chunk: dict[str, Any]) -> str:
+    try:
+        return str(chunk["choices"][0]["delta"].get("content") or "")
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return ""
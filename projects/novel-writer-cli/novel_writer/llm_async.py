@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+from .llm import OpenAICompatClient
+
+
+class AsyncOpenAICompatClient:
+    """asyncio counterpart of OpenAICompatClient.
+
+    Calls run on a bounded thread pool over the wrapped sync client, so they share
+    its connection pool, response cache and ConcurrencyGate (max-in-flight and
+    RPM/TPM token buckets). Several chapters or projects can therefore run in one
+    process, from coroutines or threads, under a single set of limits.
+
+    The gate is the only concurrency limit: the pool is never smaller than its
+    max-in-flight, and calls beyond it wait in the gate (max_workers only bounds
+    the number of threads).
+    """
+
+    def __init__(self, client: OpenAICompatClient, *, max_workers: Optional[int] = None) -> None:
+        self.client = client
+        workers = max(max_workers or 32, client.gate.max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm")
+
+    async def chat_completions(self, **kwargs: Any) -> dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(self.client.chat_completions, **kwargs))
+
+    async def call(self, fn: Any, *args: Any, **kwargs: Any) -> Any:
+        """Run any blocking helper that talks to the sync client on the LLM executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    get_text = staticmethod(OpenAICompatClient.get_text)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
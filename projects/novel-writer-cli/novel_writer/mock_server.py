@@ -0,0 +1,466 @@
+from __future__ import annotations
+
+import hashlib
+import http.server
+import json
+import math
+import random
+import re
+import socket
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from .prompts import (
+    SYSTEM_ARCHITECT,
+    SYSTEM_SCENE_PLANNER,
+    SYSTEM_SEAM_SMOOTHER,
+    SYSTEM_SCENE_WRITER,
+    SYSTEM_SUMMARIZER,
+    scene_writer_system,
+)
+
+# Local stand-in for an OpenAI-compatible /v1/chat/completions endpoint.
+# Used for benchmarks and load tests: responses are deterministic per request
+# body, latency follows a configurable distribution, and failures can be injected.
+
+_FILLER = [
+    "他把手机扣在桌上，屏幕的光从指缝里漏出来。",
+    "“再跑一遍。”她说，声音压得很低。",
+    "走廊尽头的打印机咔哒一声，吐出一张还带着温度的纸。",
+    "服务器风扇的嗡鸣忽然高了半个调。",
+    "他数到第三个红色告警，终于停下了手。",
+    "窗外的雨把霓虹切成一条一条。",
+    "“你确定这段代码是你写的？”",
+    "键盘上那枚磨亮的空格键，在灯下反出一小块白。",
+    "她把咖啡推过去，杯底在桌面上拖出一道水痕。",
+    "门禁嘀了一声，绿灯亮起又熄灭。",
+]
+
+
+def _stage_of(system: str) -> str:
+    # Match on the first line so prompt edits further down do not break detection.
+    head = system.strip().splitlines()[0] if system.strip() else ""
+    table = {
+        SYSTEM_ARCHITECT.strip().splitlines()[0]: "architect",
+        SYSTEM_SCENE_PLANNER.strip().splitlines()[0]: "plan",
+        scene_writer_system(2).strip().splitlines()[0]: "pair",
+        scene_writer_system(3).strip().splitlines()[0]: "batch",
+        SYSTEM_SCENE_WRITER.strip().splitlines()[0]: "scene",
+        SYSTEM_SUMMARIZER.strip().splitlines()[0]: "summary",
+        SYSTEM_SEAM_SMOOTHER.strip().splitlines()[0]: "seam",
+    }
+    return table.get(head, "unknown")
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Parse a latency spec (milliseconds) into a sampler returning seconds.
+
+    fixed:MS | uniform:LO,HI | lognormal:MEDIAN,SIGMA
+    """
+    kind, _, args = spec.partition(":")
+    vals = [float(x) for x in args.split(",") if x.strip()] if args else []
+    if kind == "fixed":
+        ms = vals[0] if vals else 0.0
+        return lambda rng: ms / 1000.0
+    if kind == "uniform":
+        lo, hi = (vals + [0.0, 0.0])[:2]
+        return lambda rng: rng.uniform(lo, hi) / 1000.0
+    if kind == "lognormal":
+        median, sigma = (vals + [100.0, 0.5])[:2]
+        mu = math.log(max(median, 1e-3))
+        return lambda rng: rng.lognormvariate(mu, sigma) / 1000.0
+    raise ValueError(f"unknown latency spec: {spec}")
+
+
+@dataclass
+class MockConfig:
+    latency: str = "fixed:0"
+    # Failure injection rates in [0, 1].
+    fail_429: float = 0.0
+    fail_malformed_tags: float = 0.0
+    fail_truncated_json: float = 0.0
+    # Prose around the JSON plus a trailing comma. Requests with a json_schema
+    # response_format are exempt, as with providers that enforce the schema.
+    fail_malformed_json: float = 0.0
+    fail_short_scene: float = 0.0
+    seed: int = 0
+    # Emulate automatic prefix caching (usage.prompt_tokens_details.cached_tokens).
+    prefix_cache: bool = True
+
+
+@dataclass
+class MockStats:
+    requests: int = 0
+    by_stage: dict[str, int] = field(default_factory=dict)
+    injected: dict[str, int] = field(default_factory=dict)
+    simulated_latency_s: float = 0.0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    # Most chat requests the server was handling at once.
+    max_in_flight: int = 0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "by_stage": dict(self.by_stage),
+            "injected": dict(self.injected),
+            "simulated_latency_s": round(self.simulated_latency_s, 6),
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "max_in_flight": self.max_in_flight,
+        }
+
+
+# Prefix cache granularity, modelled on OpenAI: prompts of >= 1024 tokens are
+# cached in 128-token blocks. The mock counts 3 UTF-8 bytes as one token.
+_PREFIX_MIN_BYTES = 1024 * 3
+_PREFIX_BLOCK_BYTES = 128 * 3
+_PREFIX_MAX_ENTRIES = 200_000
+
+
+def _scene_text(rng: random.Random, n_chars: int) -> str:
+    paras: list[str] = []
+    cur = ""
+    while sum(len(p) for p in paras) + len(cur) < n_chars:
+        cur += rng.choice(_FILLER)
+        if len(cur) > 160:
+            paras.append(cur)
+            cur = ""
+    if cur:
+        paras.append(cur)
+    return "\n\n".join(paras)
+
+
+def _chapter_of(user: str) -> int:
+    m = re.search(r'"chapter":\s*(\d+)', user)
+    return int(m.group(1)) if m else 1
+
+
+def _architect(rng: random.Random) -> dict[str, Any]:
+    return {
+        "topic": {
+            "title": "模拟小说",
+            "blurb": "用于基准测试的模拟项目。",
+            "genre": "都市",
+            "tone": "紧张",
+            "themes": ["技术", "代价"],
+            "target_length": {"chapters": 8, "per_chapter_chars": 9000},
+        },
+        "style_guide": {"narration": "第三人称", "pov": "有限视角", "tense": "过去时", "taboos": [], "signature_devices": []},
+        "vibe_coding_context": {
+            "definition": "用自然语言驱动编程。",
+            "workflow": ["描述", "生成", "运行"],
+            "why_it_feels_like_magic_in_2015": ["快"],
+            "hidden_costs": ["不可解释"],
+            "security_and_accountability_risks": ["密钥泄露"],
+            "chapter_usage_guidance": ["每章一次反差"],
+        },
+        "contrast_catalog": [
+            {"id": f"c{i}", "modern": f"现代{i}", "year2015": f"2015年{i}", "scene_payoff": f"反差{i}"} for i in range(1, 16)
+        ],
+        "story_bible": {
+            "core_premise": "一名程序员带着未来的工具回到2015年。",
+            "world": {"era": "2015", "locations": ["北京"], "society": "创业潮", "rules": ["工具只能离线运行"], "tech_or_magic": "离线模型"},
+            "main_conflict": "工具的来历与代价。",
+            "mysteries": ["谁送来的工具"],
+            "key_objects": ["旧笔记本"],
+            "timeline": ["2015年3月"],
+        },
+        "characters": [
+            {
+                "id": f"p{i}",
+                "name": f"角色{i}",
+                "role": "主角" if i == 1 else "配角",
+                "public_face": "工程师",
+                "private_drive": "证明自己",
+                "skills": ["写代码"],
+                "weakness": "急躁",
+                "secrets": ["来自未来"],
+                "voice": "短句",
+                "arc": "从逃避到承担",
+            }
+            for i in range(1, 5)
+        ],
+        "relations": {
+            "edges": [{"a": "p1", "b": "p2", "type": "同事", "tension": "信任", "history": "旧识", "future_pressure": "背叛"}],
+            "notes": "",
+        },
+        "outline": [
+            {
+                "chapter": i,
+                "title": f"第{i}章标题",
+                "logline": f"第{i}章梗概",
+                "chapter_goal": "推进主线",
+                "reversal": "意外",
+                "cliffhanger": "悬念",
+                "must_reveal": ["线索"],
+            }
+            for i in range(1, 9)
+        ],
+        "continuity_rules": ["时间线不可倒退"],
+    }
+
+
+def _scene_plan(rng: random.Random, chapter: int) -> dict[str, Any]:
+    return {
+        "chapter": chapter,
+        "title": f"第{chapter}章",
+        "scenes": [
+            {
+                "idx": i,
+                "scene_title": f"场景{i}",
+                "setting": "办公室/夜",
+                "pov": "角色1",
+                "goal": f"目标{i}",
+                "conflict": f"阻力{i}",
+                "turn": f"转折{i}：他按下回车",
+                "contrast_ids": [f"c{(i % 15) + 1}"],
+                "must_include": ["键盘"],
+            }
+            for i in range(1, 13)
+        ],
+    }
+
+
+class MockLLMServer:
+    """Threaded HTTP server emulating /v1/chat/completions (plain JSON and SSE)."""
+
+    def __init__(self, config: Optional[MockConfig] = None, *, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.config = config or MockConfig()
+        self.stats = MockStats()
+        self._lock = threading.Lock()
+        self._latency = parse_latency(self.config.latency)
+        self._rng = random.Random(self.config.seed)
+        self._prefixes: set[bytes] = set()
+        self._in_flight = 0
+
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self) -> None:
+                super().setup()
+                # Headers and body go out in separate writes; avoid Nagle + delayed-ACK stalls.
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def handle(self) -> None:
+                try:
+                    super().handle()
+                except (ConnectionResetError, BrokenPipeError):
+                    # Client dropped the connection (cancelled stream / closed pool).
+                    pass
+
+            def do_GET(self) -> None:  # noqa: N802
+                if self.path.rstrip("/") == "/stats":
+                    with server._lock:
+                        body = json.dumps(server.stats.to_dict()).encode("utf-8")
+                    self._send(200, body, "application/json")
+                else:
+                    self._send(404, b"{}", "application/json")
+
+            def do_POST(self) -> None:  # noqa: N802
+                n = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(n)
+                if not self.path.endswith("/v1/chat/completions"):
+                    self._send(404, b"{}", "application/json")
+                    return
+                with server._lock:
+                    server._in_flight += 1
+                    server.stats.max_in_flight = max(server.stats.max_in_flight, server._in_flight)
+                try:
+                    server._handle(self, raw)
+                finally:
+                    with server._lock:
+                        server._in_flight -= 1
+
+            def _send(self, status: int, body: bytes, ctype: str, headers: Optional[dict[str, str]] = None) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+                return
+
+        self._httpd = http.server.ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _roll(self, rate: float, name: str) -> bool:
+        with self._lock:
+            hit = rate > 0 and self._rng.random() < rate
+            if hit:
+                self.stats.injected[name] = self.stats.injected.get(name, 0) + 1
+        return hit
+
+    def _handle(self, h: Any, raw: bytes) -> None:
+        req = json.loads(raw)
+        msgs = req.get("messages") or []
+        system = next((m.get("content") or "" for m in msgs if m.get("role") == "system"), "")
+        user = "\n".join(_content_text(m.get("content")) for m in msgs if m.get("role") == "user")
+        stage = _stage_of(system if isinstance(system, str) else _content_text(system))
+
+        with self._lock:
+            self.stats.requests += 1
+            self.stats.by_stage[stage] = self.stats.by_stage.get(stage, 0) + 1
+            latency = self._latency(self._rng)
+            self.stats.simulated_latency_s += latency
+
+        if self._roll(self.config.fail_429, "429"):
+            time.sleep(latency * 0.1)
+            h._send(429, b'{"error":{"message":"rate limited (mock)"}}', "application/json", {"Retry-After": "0"})
+            return
+
+        # Deterministic content per request body, independent of injection rolls.
+        rng = random.Random(hashlib.sha256(raw).digest())
+        rf = req.get("response_format")
+        structured = isinstance(rf, dict) and rf.get("type") == "json_schema"
+        text, finish = self._content(stage, user, rng, digest="<<<DIGEST>>>" in str(system), structured=structured)
+
+        prompt = "\n".join(_content_text(m.get("content")) for m in msgs).encode("utf-8")
+        cached = self._cached_prefix_bytes(prompt) // 3 if self.config.prefix_cache else 0
+        usage: dict[str, Any] = {"prompt_tokens": len(prompt) // 3, "completion_tokens": len(text.encode("utf-8")) // 3}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        usage["prompt_tokens_details"] = {"cached_tokens": cached}
+        with self._lock:
+            self.stats.prompt_tokens += usage["prompt_tokens"]
+            self.stats.cached_tokens += cached
+        model = str(req.get("model") or "mock")
+
+        if req.get("stream"):
+            self._stream(h, text, finish, usage, model, latency)
+            return
+
+        time.sleep(latency)
+        body = {
+            "id": "mock-" + hashlib.sha1(raw).hexdigest()[:12],
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": finish}],
+            "usage": usage,
+        }
+        h._send(200, json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json")
+
+    def _cached_prefix_bytes(self, prompt: bytes) -> int:
+        """Length of the longest block-aligned prefix seen before; remembers this prompt's blocks."""
+        if len(prompt) < _PREFIX_MIN_BYTES:
+            return 0
+        hit = 0
+        h = hashlib.sha1()
+        with self._lock:
+            if len(self._prefixes) > _PREFIX_MAX_ENTRIES:
+                self._prefixes.clear()
+            for end in range(_PREFIX_BLOCK_BYTES, len(prompt) + 1, _PREFIX_BLOCK_BYTES):
+                h.update(prompt[end - _PREFIX_BLOCK_BYTES : end])
+                digest = h.copy().digest()
+                # The digest chains every earlier block, so a hit means the whole prefix was seen.
+                if digest in self._prefixes:
+                    hit = end
+                else:
+                    self._prefixes.add(digest)
+        return hit if hit >= _PREFIX_MIN_BYTES else 0
+
+    def _content(
+        self, stage: str, user: str, rng: random.Random, *, digest: bool = False, structured: bool = False
+    ) -> tuple[str, str]:
+        cfg = self.config
+        if stage in ("architect", "plan", "summary"):
+            if stage == "architect":
+                obj: Any = _architect(rng)
+            elif stage == "plan":
+                obj = _scene_plan(rng, _chapter_of(user))
+                m = re.search(r"\[continue_from_scene\]\s*(\d+)", user)
+                if m:
+                    obj = {"scenes": obj["scenes"][int(m.group(1)) - 1 :]}
+            else:
+                obj = {"chapter_summary": "本章摘要：" + _scene_text(rng, 120), "continuity_notes": ["注意时间线"], "next_chapter_hook": "下一章钩子"}
+            text = json.dumps(obj, ensure_ascii=False)
+            if self._roll(cfg.fail_truncated_json, "truncated_json"):
+                return text[: len(text) // 2], "length"
+            if not structured and self._roll(cfg.fail_malformed_json, "malformed_json"):
+                return "好的，结果如下：\n" + text[:-1] + ",}", "stop"
+            return text, "stop"
+
+        if stage == "seam":
+            return _scene_text(rng, 120), "stop"
+        short = self._roll(cfg.fail_short_scene, "short_scene")
+        n = 200 if short else rng.randint(700, 1100)
+        if stage == "pair":
+            a = _scene_text(rng, n)
+            b = _scene_text(rng, rng.randint(700, 1100))
+            if self._roll(cfg.fail_malformed_tags, "malformed_tags"):
+                return a + "\n\n" + b, "stop"
+            text = f"<<<SCENE_A>>>\n{a}\n<<<SCENE_B>>>\n{b}"
+        elif stage == "batch":
+            # One indexed block per [scene_k_card] in the prompt.
+            k = max(1, len(re.findall(r"\[scene_\d+_card\]", user)))
+            texts = [_scene_text(rng, n)] + [_scene_text(rng, rng.randint(700, 1100)) for _ in range(k - 1)]
+            if self._roll(cfg.fail_malformed_tags, "malformed_tags"):
+                return "\n\n".join(texts), "stop"
+            text = "\n".join(f"<<<SCENE_{j}>>>\n{t}" for j, t in enumerate(texts, start=1))
+        if stage in ("pair", "batch"):
+            if digest:
+                text += f"\n<<<DIGEST>>>\n事件：{_scene_text(rng, 40)}\n变化：{_scene_text(rng, 30)}\n钩子：{_scene_text(rng, 20)}"
+            return text, "stop"
+        return _scene_text(rng, n), "stop"
+
+    def _stream(self, h: Any, text: str, finish: str, usage: dict[str, Any], model: str, latency: float) -> None:
+        h.send_response(200)
+        h.send_header("Content-Type", "text/event-stream")
+        h.send_header("Transfer-Encoding", "chunked")
+        h.end_headers()
+
+        def emit(obj: Any) -> None:
+            data = b"data: " + (obj if isinstance(obj, bytes) else json.dumps(obj, ensure_ascii=False).encode("utf-8")) + b"\n\n"
+            h.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            h.wfile.flush()
+
+        pieces = [text[i : i + 24] for i in range(0, len(text), 24)] or [""]
+        # 20% of the latency before the first token, the rest spread over the chunks.
+        time.sleep(latency * 0.2)
+        per_chunk = latency * 0.8 / len(pieces)
+        try:
+            for p in pieces:
+                emit({"id": "mock", "model": model, "choices": [{"index": 0, "delta": {"content": p}, "finish_reason": None}]})
+                if per_chunk:
+                    time.sleep(per_chunk)
+            emit({"id": "mock", "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": finish}]})
+            emit({"id": "mock", "model": model, "choices": [], "usage": usage})
+            emit(b"[DONE]")
+            h.wfile.write(b"0\r\n\r\n")
+            h.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client cancelled the stream (early abort).
+            h.close_connection = True
+
+
+def _content_text(content: Any) -> str:
+    # Content may be a plain string or a list of {"type": "text", "text": ...} parts.
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(str(p.get("text") or "") for p in content if isinstance(p, dict))
+    return ""
@@ -1,24 +1,118 @@
 from __future__ import annotations
 
 import json
+import re
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 
-from .db import get_chapter, get_project
-from .llm import OpenAICompatClient
+from .checkpoint import StepManifest, inputs_hash
+from .db import get_chapter_summary, get_chapter_text, get_project
+from .events import EventLog
+from .llm import (
+    HedgePolicy,
+    OpenAICompatClient,
+    RetryPolicy,
+    StreamAborted,
+    require_json_object_with_key,
+    require_marker_within,
+)
 from .prompts import (
+    DIGEST_TAG,
     SYSTEM_ARCHITECT,
     SYSTEM_SCENE_PLANNER,
+    SYSTEM_SEAM_SMOOTHER,
     SYSTEM_SCENE_WRITER,
-    SYSTEM_SCENE_WRITER_PAIR,
     SYSTEM_SUMMARIZER,
+    ChapterPromptContext,
+    response_format_for,
+    scene_tags,
+    scene_writer_system,
     user_prompt_for_architect,
-    user_prompt_for_scene_plan,
-    user_prompt_for_scene_write,
-    user_prompt_for_scene_write_pair,
+    user_prompt_for_digest_summary,
+    user_prompt_for_seam,
     user_prompt_for_summary,
 )
-from .utils import Env, extract_first_json_object, now_utc_iso, write_json, write_text
+from .utils import (
+    Env,
+    JsonArrayStream,
+    close_truncated_json,
+    ensure_dir,
+    extract_first_json_object,
+    join_scene_texts,
+    now_utc_iso,
+    write_json,
+    write_text,
+)
+
+# Streaming mode: cancel a writer call when its first scene tag has not shown up within this many chars,
+# and a scene plan call when it does not look like {"chapter":..,"title":..,"scenes":[..]}.
+SCENE_TAG_WINDOW = 300
+PLAN_KEY_WINDOW = 800
+
+SCENES_PER_CHAPTER = 12
+
+# --digests: writer calls also return a <<<DIGEST>>> block; the chapter summary is
+# built from the digests with one small call ("call") or no call at all ("local").
+DIGEST_MODES = ("call", "local")
+
+# Scenes per writer call (divisors of SCENES_PER_CHAPTER). choose_batch_size()
+# picks the largest that fits the writer's output limit with headroom, dropping
+# sizes whose tag-format retry rate is too high. CHARS_PER_TOKEN is a conservative
+# estimate for Chinese prose when the ledger has no completion counts yet.
+BATCH_SIZES = (2, 3, 4, 6)
+BATCH_HEADROOM = 1.25
+BATCH_MIN_SAMPLES = 5
+BATCH_MAX_TAG_FAILURE = 0.2
+CHARS_PER_TOKEN = 1.0
+
+Cards = tuple[dict[str, Any], ...]
+
+# Scenes shorter than SCENE_MIN_CHARS are rewritten at SCENE_TARGET_CHARS+ by a
+# single-scene call. Per project these follow topic.target_length (scene_length_targets).
+SCENE_MIN_CHARS = 500
+SCENE_TARGET_CHARS = 700
+
+# Scene plan can still be long. A plan cut off at max_tokens is completed with up to
+# PLAN_CONTINUE_ROUNDS "continue from scene k" calls; a malformed one (or a failed
+# continuation) is retried in full with a larger budget.
+PLAN_ATTEMPTS = [
+    {"temperature": 0.2, "max_tokens": 3500},
+    {"temperature": 0.2, "max_tokens": 4200},
+]
+PLAN_CONTINUE_ROUNDS = 2
+
+# Transport retry policy per call site (stage). Writer calls are long, so they get a
+# larger read timeout; the summary has its own model fallback and retries less.
+DEFAULT_RETRY_POLICIES: dict[str, RetryPolicy] = {
+    "architect": RetryPolicy(max_attempts=3, read_timeout_s=300.0),
+    "plan": RetryPolicy(max_attempts=4, read_timeout_s=180.0),
+    "pair": RetryPolicy(max_attempts=4, read_timeout_s=240.0),
+    "retry": RetryPolicy(max_attempts=3, read_timeout_s=240.0),
+    "expand": RetryPolicy(max_attempts=3, read_timeout_s=240.0),
+    "summary": RetryPolicy(max_attempts=2, read_timeout_s=120.0),
+    "seam": RetryPolicy(max_attempts=2, read_timeout_s=120.0),
+}
+
+# NOVEL_STRUCTURED_OUTPUT: response_format per JSON stage, derived from the schemas in the
+# system prompts. Continuations only return the missing scenes.
+RESPONSE_FORMATS: dict[str, dict[str, Any]] = {
+    "architect": response_format_for(SYSTEM_ARCHITECT, name="project_plan"),
+    "plan": response_format_for(SYSTEM_SCENE_PLANNER, name="scene_plan"),
+    "plan_continue": response_format_for(SYSTEM_SCENE_PLANNER, name="scene_plan_rest", keys=("scenes",)),
+    "summary": response_format_for(SYSTEM_SUMMARIZER, name="chapter_summary"),
+}
+JSON_STAGES = tuple(RESPONSE_FORMATS)
+
+
+def json_extra(env: Env, stage: str, *, max_tokens: Optional[int] = None) -> Optional[dict[str, Any]]:
+    """`extra` for a JSON stage call: max_completion_tokens, plus response_format when structured output is on."""
+    extra: dict[str, Any] = {}
+    if max_tokens is not None:
+        extra["max_completion_tokens"] = int(max_tokens)
+    if env.structured_output:
+        extra["response_format"] = RESPONSE_FORMATS[stage]
+    return extra or None
 
 
 def generate_project_plan(
@@ -30,21 +124,594 @@ def generate_project_plan(
     blurb: str,
 ) -> dict[str, Any]:
     user = user_prompt_for_architect(title=title, blurb=blurb)
-    resp = client.chat_completions(model=env.novel_outline_model, system=SYSTEM_ARCHITECT, user=user, temperature=0.2)
+    resp = client.chat_completions(
+        model=env.novel_outline_model,
+        system=SYSTEM_ARCHITECT,
+        user=user,
+        temperature=0.2,
+        extra=json_extra(env, "architect"),
+        stage="architect",
+        retry=DEFAULT_RETRY_POLICIES["architect"],
+    )
     text = client.get_text(resp)
-    obj = extract_first_json_object(text)
+    try:
+        obj = extract_first_json_object(text)
 
-    # Basic sanity checks.
-    if not isinstance(obj, dict):
-        raise RuntimeError("Architect output is not a JSON object")
-    if "outline" not in obj or not isinstance(obj.get("outline"), list) or len(obj.get("outline")) != 8:
-        raise RuntimeError("Architect output must contain outline with exactly 8 chapters")
+        # Basic sanity checks.
+        if not isinstance(obj, dict):
+            raise RuntimeError("Architect output is not a JSON object")
+        if "outline" not in obj or not isinstance(obj.get("outline"), list) or len(obj.get("outline")) != 8:
+            raise RuntimeError("Architect output must contain outline with exactly 8 chapters")
+    except Exception as e:
+        # Do not replay a bad plan from the cache on the next run.
+        client.reject(resp, str(e))
+        raise
 
     out_dir = env.outputs_dir / project_id
     write_json(out_dir / "project_plan.json", obj)
     return obj
 
 
+class ChapterJob:
+    """The steps of writing one chapter, callable one at a time.
+
+    generate_chapter() drives them for a single chapter; the write-book
+    scheduler (novel_writer.book) runs them as nodes of a whole-book DAG.
+    Steps write their artifacts under outputs/<project>/chapters/<NNN>/ and
+    record them in its manifest.json (novel_writer.checkpoint); with
+    resume=True a step whose inputs are unchanged reuses its artifact.
+    """
+
+    def __init__(
+        self,
+        *,
+        env: Env,
+        client: OpenAICompatClient,
+        project_id: str,
+        project_obj: dict[str, Any],
+        chapter_idx: int,
+        retry_policies: Optional[dict[str, RetryPolicy]] = None,
+        hedge: Optional[HedgePolicy] = None,
+        resume: bool = False,
+        digests: str = "",
+        scenes_per_call: int = 2,
+        events: Optional[EventLog] = None,
+    ) -> None:
+        if digests and digests not in DIGEST_MODES:
+            raise ValueError(f"digests must be one of {DIGEST_MODES}, got {digests!r}")
+        if scenes_per_call not in BATCH_SIZES:
+            raise ValueError(f"scenes_per_call must be one of {BATCH_SIZES}, got {scenes_per_call!r}")
+        self.env = env
+        self.client = client
+        self.chapter_idx = int(chapter_idx)
+        self.hedge = hedge
+        # Progress events (--events); a no-op log unless one is given.
+        self.events = (events or EventLog()).bind(chapter=self.chapter_idx)
+        # Per-stage overrides on top of DEFAULT_RETRY_POLICIES.
+        self.retry = {**DEFAULT_RETRY_POLICIES, **(retry_policies or {})}
+
+        outline = project_obj.get("outline") or []
+        chapter_meta = None
+        for ch in outline:
+            if int(ch.get("chapter")) == int(chapter_idx):
+                chapter_meta = ch
+                break
+        if not chapter_meta:
+            raise RuntimeError(f"Chapter {chapter_idx} not found in outline")
+        self.chapter_meta: dict[str, Any] = chapter_meta
+
+        outline_short = [
+            {"chapter": o.get("chapter"), "title": o.get("title"), "logline": o.get("logline")} for o in outline
+        ]
+
+        self.out_dir = env.outputs_dir / project_id / "chapters" / f"{int(chapter_idx):03d}"
+        self.manifest = StepManifest(self.out_dir, reuse=resume)
+
+        # Planner/writer prompts start with shared blocks built once per chapter
+        # (prompt_ctx.plan_prefix / prompt_ctx.prefix); these are passed as cache_prefix
+        # so provider prompt caches can reuse them.
+        self.prompt_ctx = ChapterPromptContext(project=project_obj, chapter=chapter_meta, outline_short=outline_short)
+        self.scene_min_chars, self.scene_target_chars = scene_length_targets(project_obj)
+
+        self.plan_obj: Optional[dict[str, Any]] = None
+        self.scenes: list[dict[str, Any]] = []
+        # Final scene texts, set by assemble().
+        self.scene_texts: list[str] = []
+
+        # Scenes per writer call; 2 keeps the <<<SCENE_A>>>/<<<SCENE_B>>> pair prompt.
+        self.batch_size = scenes_per_call
+        self.digest_mode = digests
+        self.batch_system = scene_writer_system(scenes_per_call, digest=bool(digests))
+        # Batch start index -> digest text (digest mode only).
+        self.digests: dict[int, str] = {}
+
+    # -- 1) scene plan --------------------------------------------------------
+
+    def plan_call(
+        self, a: dict[str, Any], *, prev_chapter_summary: str, on_delta: Optional[Callable[[str], None]] = None
+    ) -> tuple[dict[str, Any], str]:
+        """One planner call; returns (response, text). on_delta forces streaming."""
+        client = self.client
+        plan_kwargs: dict[str, Any] = {}
+        if self.env.stream or on_delta is not None:
+            plan_kwargs = {"stream": True, "validators": [require_json_object_with_key("scenes", PLAN_KEY_WINDOW)]}
+        try:
+            plan_resp = client.chat_completions(
+                model=self.env.novel_outline_model,
+                system=SYSTEM_SCENE_PLANNER,
+                user=self.prompt_ctx.scene_plan(prev_chapter_summary=prev_chapter_summary),
+                temperature=float(a["temperature"]),
+                max_tokens=int(a["max_tokens"]),
+                extra=json_extra(self.env, "plan", max_tokens=int(a["max_tokens"])),
+                stage="plan",
+                retry=self.retry["plan"],
+                cache_prefix=self.prompt_ctx.plan_prefix,
+                on_delta=on_delta,
+                **plan_kwargs,
+            )
+            return plan_resp, client.get_text(plan_resp)
+        except StreamAborted as e:
+            return {}, e.partial_text
+
+    def plan(
+        self,
+        *,
+        prev_chapter_summary: str,
+        first_attempt: Optional[Callable[[dict[str, Any]], tuple[dict[str, Any], str]]] = None,
+    ) -> dict[str, Any]:
+        """Run the planner (with retries) and return the scene plan.
+
+        `first_attempt` replaces the first planner call (used by the pipelined mode).
+        """
+        key = inputs_hash(
+            self.env.novel_outline_model,
+            SYSTEM_SCENE_PLANNER,
+            self.prompt_ctx.scene_plan(prev_chapter_summary=prev_chapter_summary),
+            PLAN_ATTEMPTS,
+        )
+        reused = self.manifest.load("plan", key)
+        if reused is not None and _parses(check_scene_plan, reused):
+            self.plan_obj = reused
+            self.scenes = reused["scenes"]
+            return reused
+
+        last_plan_err: Exception | None = None
+        for attempt_i, a in enumerate(PLAN_ATTEMPTS, start=1):
+            if first_attempt is not None and attempt_i == 1:
+                plan_resp, plan_text = first_attempt(a)
+            else:
+                plan_resp, plan_text = self.plan_call(a, prev_chapter_summary=prev_chapter_summary)
+            try:
+                parsed = parse_scene_plan(plan_text)
+            except Exception as e:
+                self.client.reject(plan_resp, str(e))
+                write_text(self.out_dir / f"scene_plan_attempt_{attempt_i}_raw.txt", plan_text)
+                # Cut off at max_tokens (not malformed): keep the complete scenes and ask for the rest.
+                salvaged = None
+                truncated = self.client.get_finish_reason(plan_resp) == "length"
+                self.events.emit(
+                    "retry", stage="plan", attempt=attempt_i, reason="truncated, continuing" if truncated else str(e)[:200]
+                )
+                if truncated:
+                    salvaged = self.continue_plan(a, plan_text, prev_chapter_summary=prev_chapter_summary)
+                if salvaged is None:
+                    last_plan_err = e
+                    continue
+                parsed = salvaged
+            self.plan_obj = parsed
+            self.scenes = parsed["scenes"]
+            self.manifest.record("plan", key, "scene_plan.json", parsed)
+            break
+
+        if self.plan_obj is None:
+            raise RuntimeError(f"Scene plan parse failed after retries: {last_plan_err}")
+        if len(self.scenes) % self.batch_size != 0:
+            raise RuntimeError(f"Scene plan must contain a multiple of {self.batch_size} scenes")
+        return self.plan_obj
+
+    def continue_plan(self, a: dict[str, Any], plan_text: str, *, prev_chapter_summary: str) -> Optional[dict[str, Any]]:
+        """Complete a truncated plan with "continue from scene k" calls; None if that fails.
+
+        Each follow-up only writes the missing scene cards, so it is far
+        smaller than re-running the whole plan with a larger budget.
+        """
+        scenes = _continued_cards([], JsonArrayStream("scenes").feed(plan_text))
+        try:
+            head = close_truncated_json(plan_text)
+        except ValueError:
+            head = {}
+        client = self.client
+        for _ in range(PLAN_CONTINUE_ROUNDS):
+            if not scenes or len(scenes) >= SCENES_PER_CHAPTER:
+                break
+            resp = client.chat_completions(
+                model=self.env.novel_outline_model,
+                system=SYSTEM_SCENE_PLANNER,
+                user=self.prompt_ctx.scene_plan_continue(prev_chapter_summary=prev_chapter_summary, scenes_so_far=scenes),
+                temperature=float(a["temperature"]),
+                max_tokens=int(a["max_tokens"]),
+                extra=json_extra(self.env, "plan_continue", max_tokens=int(a["max_tokens"])),
+                stage="plan_continue",
+                retry=self.retry["plan"],
+                cache_prefix=self.prompt_ctx.plan_prefix,
+            )
+            text = client.get_text(resp)
+            more = _continued_cards(scenes, JsonArrayStream("scenes").feed(text))
+            if not more:
+                client.reject(resp, f"continuation does not continue at scene {len(scenes) + 1}")
+                break
+            scenes += more
+        merged = {**(head if isinstance(head, dict) else {}), "scenes": scenes}
+        try:
+            return check_scene_plan(merged)
+        except ValueError:
+            return None
+
+    def batch_starts(self) -> list[int]:
+        return list(range(1, len(self.scenes) + 1, self.batch_size))
+
+    def batch_cards(self, i: int) -> Cards:
+        return tuple(self.scenes[i - 1 : i - 1 + self.batch_size])
+
+    # -- 2) scene batches (2 scenes per call = a pair) ------------------------
+
+    def batch_stage(self, *, retry: bool) -> str:
+        # Ledger stage names; db.writer_batch_stats() reads them back per N.
+        if self.batch_size == 2:
+            return "retry" if retry else "pair"
+        return f"batch{self.batch_size}" + ("_retry" if retry else "")
+
+    def batch_user(self, cards: Cards, prev_tail: str) -> str:
+        if self.batch_size == 2:
+            return self.prompt_ctx.scene_write_pair(scene_a=cards[0], scene_b=cards[1], prev_tail=prev_tail)
+        return self.prompt_ctx.scene_write_batch(scenes=list(cards), prev_tail=prev_tail)
+
+    def parse_batch(self, text: str) -> tuple[str, ...]:
+        return parse_scene_batch(text, self.batch_size)
+
+    def write_batch_call(self, user: str, *, temperature: float, raw_path: Path, retry: bool) -> str:
+        client = self.client
+        # Pairs keep their original budget; larger batches get the model's whole output limit.
+        max_tokens = 5000 if self.batch_size == 2 else self.env.writer_max_output_tokens
+        kwargs: dict[str, Any] = dict(
+            model=self.env.novel_writer_model,
+            system=self.batch_system,
+            user=user,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            extra={"max_completion_tokens": max_tokens},
+            stage=self.batch_stage(retry=retry),
+            retry=self.retry["retry" if retry else "pair"],
+            cache_prefix=self.prompt_ctx.prefix,
+        )
+        if not self.env.stream:
+            # Hedged duplicates only win when they parse as a tagged batch. Hedge
+            # latencies are seeded from pair calls, so larger batches are not hedged.
+            resp = client.chat_completions(
+                **kwargs,
+                hedge=self.hedge if self.batch_size == 2 else None,
+                accept=lambda o: _parses(self.parse_batch, client.get_text(o)),
+            )
+            text = client.get_text(resp).strip()
+        else:
+            # Write deltas to the raw file as they arrive so a slow call can be watched.
+            ensure_dir(raw_path.parent)
+            try:
+                with raw_path.open("w", encoding="utf-8") as f:
+
+                    def on_delta(delta: str) -> None:
+                        f.write(delta)
+                        f.flush()
+
+                    resp = client.chat_completions(
+                        **kwargs,
+                        stream=True,
+                        on_delta=on_delta,
+                        validators=[require_marker_within(scene_tags(self.batch_size)[0], SCENE_TAG_WINDOW)],
+                    )
+                text = client.get_text(resp).strip()
+            except StreamAborted as e:
+                text = e.partial_text.strip()
+        write_text(raw_path, text + "\n")
+        return text
+
+    def _batch_key(self, i: int, prev_tail: str, cards: Optional[Cards]) -> str:
+        # prev_tail is part of the prompt, so a rewritten batch invalidates every later one.
+        return inputs_hash(
+            self.env.novel_writer_model, self.batch_system, self.batch_user(cards or self.batch_cards(i), prev_tail)
+        )
+
+    def _batch_files(self, i: int) -> str:
+        label = "pair" if self.batch_size == 2 else "batch"
+        return f"{label}_{i:02d}_{i + self.batch_size - 1:02d}"
+
+    def reused_batch(self, i: int, prev_tail: str, *, cards: Optional[Cards] = None) -> Optional[tuple[str, ...]]:
+        """The drafts of the batch starting at scene i from an earlier run with the same inputs (resume), else None."""
+        obj = self.manifest.load(f"batch{i:02d}", self._batch_key(i, prev_tail, cards))
+        texts = obj.get("scenes") if isinstance(obj, dict) else None
+        if not isinstance(texts, list) or len(texts) != self.batch_size or not all(texts):
+            return None
+        if self.digest_mode:
+            self.digests[i] = str(obj.get("digest") or "")
+        # A seam pass may have rewritten scene_XX.txt; restore the batch's own text.
+        for n, text in enumerate(texts, start=i):
+            write_text(self.out_dir / f"scene_{n:02d}.txt", str(text) + "\n")
+            self._wrote(f"scene_{n:02d}.txt", reused=True)
+        return tuple(str(t) for t in texts)
+
+    def draft_batch(self, i: int, prev_tail: str, *, cards: Optional[Cards] = None) -> tuple[str, ...]:
+        """Write scenes i..i+N-1 (1-based) with one call, retrying once on missing tags."""
+        out_dir = self.out_dir
+        user = self.batch_user(cards or self.batch_cards(i), prev_tail)
+        files = self._batch_files(i)
+
+        text = self.write_batch_call(user, temperature=0.6, raw_path=out_dir / f"scene_{files}_raw.txt", retry=False)
+
+        try:
+            texts = self.parse_batch(text)
+        except Exception as e:
+            self.events.emit("retry", stage=self.batch_stage(retry=False), scene=i, reason=str(e)[:200])
+            tags = " 与 ".join(scene_tags(self.batch_size))
+            retry_user = user + f"\n\n重要：必须严格按 {tags} 标签输出。除此之外不要输出任何文字。"
+            text = self.write_batch_call(
+                retry_user, temperature=0.4, raw_path=out_dir / f"scene_{files}_retry_raw.txt", retry=True
+            )
+            texts = self.parse_batch(text)
+        if self.digest_mode:
+            self.digests[i] = parse_digest(text)
+        return texts
+
+    def save_batch(self, i: int, prev_tail: str, texts: tuple[str, ...], *, cards: Optional[Cards] = None) -> tuple[str, ...]:
+        for n, text in enumerate(texts, start=i):
+            write_text(self.out_dir / f"scene_{n:02d}.txt", text + "\n")
+            self._wrote(f"scene_{n:02d}.txt")
+        batch_obj: dict[str, Any] = {"scenes": list(texts)}
+        if self.digest_mode:
+            batch_obj["digest"] = self.digests.get(i, "")
+        self.manifest.record(f"batch{i:02d}", self._batch_key(i, prev_tail, cards), f"{self._batch_files(i)}.json", batch_obj)
+        return texts
+
+    def write_batch(self, i: int, prev_tail: str, *, cards: Optional[Cards] = None) -> tuple[str, ...]:
+        """Draft the batch starting at scene i (or reuse it on resume) and save the scene files."""
+        reused = self.reused_batch(i, prev_tail, cards=cards)
+        if reused is not None:
+            return reused
+        return self.save_batch(i, prev_tail, self.draft_batch(i, prev_tail, cards=cards), cards=cards)
+
+    def batch_anchor(self, i: int, prev_last_paragraph: str) -> str:
+        """Continuity text for a batch written without the previous one: the previous card's turn."""
+        return prev_last_paragraph if i <= 1 else _turn_anchor(self.scenes[i - 2])
+
+    # -- 3) short-scene expansion ---------------------------------------------
+
+    def expand_scene(self, n: int, scene_text: str, prev_tail: str) -> str:
+        """Rewrite scene n (1-based) at full length with a single-scene call; saves the scene file."""
+        scene_user = self.prompt_ctx.scene_write(scene=self.scenes[n - 1], prev_tail=prev_tail)
+        expand_user = (
+            scene_user
+            + "\n\n"
+            + f"补充要求：这个场景太短了。请扩写到 >= {self.scene_target_chars} 个中文字符，增加动作与对话细节，但不要复述上一段。"
+        )
+        key = inputs_hash(self.env.novel_writer_model, SYSTEM_SCENE_WRITER, expand_user, scene_text)
+        reused = self.manifest.load(f"expand{n:02d}", key)
+        self.events.emit("expand", scene=n, chars=len(scene_text), min_chars=self.scene_min_chars, reused=reused is not None)
+        if isinstance(reused, dict) and isinstance(reused.get("text"), str):
+            text = reused["text"]
+        else:
+            resp = self.client.chat_completions(
+                model=self.env.novel_writer_model,
+                system=SYSTEM_SCENE_WRITER,
+                user=expand_user,
+                temperature=0.6,
+                max_tokens=5000,
+                extra={"max_completion_tokens": 5000},
+                stage="expand",
+                retry=self.retry["expand"],
+                cache_prefix=self.prompt_ctx.prefix,
+            )
+            text = self.client.get_text(resp).strip()
+            self.manifest.record(f"expand{n:02d}", key, f"expand_{n:02d}.json", {"text": text})
+        write_text(self.out_dir / f"scene_{n:02d}.txt", text + "\n")
+        self._wrote(f"scene_{n:02d}.txt")
+        return text
+
+    def expand_short(self, batches: list[tuple[str, ...]], *, first_tail: str) -> list[tuple[str, ...]]:
+        """Expand every scene shorter than scene_min_chars, all at once.
+
+        Runs after all batches are drafted, so a short scene no longer holds up
+        the next batch. Scene n's continuity tail is the draft of scene n-1
+        (first_tail for scene 1); prompts are only built for short scenes.
+        """
+        drafts = [t for batch in batches for t in batch]
+        short = [n for n, t in enumerate(drafts, start=1) if len(t) < self.scene_min_chars]
+        if not short:
+            return batches
+
+        def expand(n: int) -> str:
+            return self.expand_scene(n, drafts[n - 1], first_tail if n == 1 else scene_tail(drafts[n - 2]))
+
+        texts = list(drafts)
+        with ThreadPoolExecutor(max_workers=min(len(short), max(1, self.env.max_in_flight)), thread_name_prefix="expand") as pool:
+            for n, text in zip(short, pool.map(expand, short)):
+                texts[n - 1] = text
+        out: list[tuple[str, ...]] = []
+        for batch in batches:
+            out.append(tuple(texts[: len(batch)]))
+            texts = texts[len(batch) :]
+        return out
+
+    def smooth_seam(self, i: int, prev_text: str, next_text: str) -> str:
+        """Rewrite the opening paragraph of scene i so it follows on from prev_text; saves the scene file."""
+        m = re.match(r"(.*?)(\n+)(.*)", next_text, re.S)
+        opening, sep, rest = (m.group(1), m.group(2), m.group(3)) if m else (next_text, "", "")
+        seam_user = user_prompt_for_seam(prev_tail=scene_tail(prev_text), next_opening=opening)
+        key = inputs_hash(self.env.novel_writer_model, SYSTEM_SEAM_SMOOTHER, seam_user, next_text)
+        reused = self.manifest.load(f"seam{i:02d}", key)
+        if isinstance(reused, dict) and isinstance(reused.get("text"), str):
+            write_text(self.out_dir / f"scene_{i:02d}.txt", reused["text"] + "\n")
+            return reused["text"]
+        try:
+            resp = self.client.chat_completions(
+                model=self.env.novel_writer_model,
+                system=SYSTEM_SEAM_SMOOTHER,
+                user=seam_user,
+                temperature=0.3,
+                max_tokens=800,
+                extra={"max_completion_tokens": 800},
+                stage="seam",
+                retry=self.retry["seam"],
+            )
+            new_opening = self.client.get_text(resp).strip()
+        except Exception as e:
+            # Seams are cosmetic; keep the original text.
+            write_text(self.out_dir / f"seam_{i:02d}_error.txt", f"{e}\n")
+            return next_text
+        write_text(self.out_dir / f"seam_{i:02d}_raw.txt", new_opening + "\n")
+        if not new_opening or len(new_opening) > 3 * len(opening) + 200:
+            smoothed = next_text
+        else:
+            smoothed = new_opening + sep + rest
+        write_text(self.out_dir / f"scene_{i:02d}.txt", smoothed + "\n")
+        self._wrote(f"scene_{i:02d}.txt")
+        self.manifest.record(f"seam{i:02d}", key, f"seam_{i:02d}.json", {"text": smoothed})
+        return smoothed
+
+    # -- 4) summary -----------------------------------------------------------
+
+    def assemble(self, batches: list[tuple[str, ...]]) -> str:
+        scene_texts: list[str] = []
+        for batch in batches:
+            scene_texts += batch
+        self.scene_texts = scene_texts
+        chapter_text = join_scene_texts(scene_texts)
+        # Persist chapter text even if summarization fails.
+        write_text(self.out_dir / "chapter.md", chapter_text)
+        self._wrote("chapter.md")
+        return chapter_text
+
+    def summarize_digests(self, chapter_text: str) -> Optional[dict[str, Any]]:
+        """Summary built from the batch digests; None when one is missing or the call fails to parse.
+
+        Digests describe the batch drafts; a short scene that was expanded
+        afterwards follows the same scene card, so its digest still holds.
+        """
+        digests = [self.digests.get(i, "") for i in self.batch_starts()]
+        if not digests or not all(digests):
+            return None
+        if self.digest_mode == "local":
+            return digest_summary(digests)
+
+        client = self.client
+        sum_user = user_prompt_for_digest_summary(digests=digests, ending=last_paragraph(chapter_text))
+        key = inputs_hash(self.env.novel_outline_model, SYSTEM_SUMMARIZER, sum_user)
+        reused = self.manifest.load("summary", key)
+        if isinstance(reused, dict):
+            return reused
+        resp = client.chat_completions(
+            model=self.env.novel_outline_model,
+            system=SYSTEM_SUMMARIZER,
+            user=sum_user,
+            temperature=0.2,
+            max_tokens=900,
+            extra=json_extra(self.env, "summary", max_tokens=900),
+            stage="summary",
+            retry=self.retry["summary"],
+        )
+        text = client.get_text(resp)
+        try:
+            parsed = parse_summary(text, truncated=client.get_finish_reason(resp) == "length")
+        except Exception as e:
+            client.reject(resp, str(e))
+            write_text(self.out_dir / "summary_digests_raw.txt", text)
+            self.events.emit("retry", stage="summary", reason=f"digest summary: {str(e)[:200]}")
+            return None
+        self.manifest.record("summary", key, "summary.json", parsed)
+        return parsed
+
+    def summarize(self, chapter_text: str) -> dict[str, Any]:
+        """Summarize (structured JSON). Retry and fall back to writer model if needed.
+
+        In digest mode the batch digests are tried first; the full chapter text
+        is only sent when that does not produce a summary.
+        """
+        if self.digest_mode:
+            digest_obj = self.summarize_digests(chapter_text)
+            if digest_obj is not None:
+                return digest_obj
+
+        client = self.client
+        sum_user = user_prompt_for_summary(chapter_text=chapter_text)
+        key = inputs_hash(self.env.novel_outline_model, self.env.novel_writer_model, SYSTEM_SUMMARIZER, sum_user)
+        reused = self.manifest.load("summary", key)
+        if isinstance(reused, dict):
+            return reused
+
+        def summarize_with(model: str) -> dict[str, Any] | None:
+            attempts = [
+                {"temperature": 0.2, "max_tokens": 900},
+                {"temperature": 0.2, "max_tokens": 1200},
+            ]
+            last_err: Exception | None = None
+            for attempt_i, a in enumerate(attempts, start=1):
+                resp = client.chat_completions(
+                    model=model,
+                    system=SYSTEM_SUMMARIZER,
+                    user=sum_user,
+                    temperature=float(a["temperature"]),
+                    max_tokens=int(a["max_tokens"]),
+                    extra=json_extra(self.env, "summary", max_tokens=int(a["max_tokens"])),
+                    stage="summary",
+                    retry=self.retry["summary"],
+                )
+                text = client.get_text(resp)
+                try:
+                    return parse_summary(text, truncated=client.get_finish_reason(resp) == "length")
+                except Exception as e:
+                    last_err = e
+                    client.reject(resp, str(e))
+                    write_text(self.out_dir / f"summary_{model}_attempt_{attempt_i}_raw.txt", text)
+                    self.events.emit("retry", stage="summary", model=model, attempt=attempt_i, reason=str(e)[:200])
+                    continue
+            return None
+
+        sum_obj = summarize_with(self.env.novel_outline_model)
+        if sum_obj is None:
+            sum_obj = summarize_with(self.env.novel_writer_model)
+        if sum_obj is not None:
+            self.manifest.record("summary", key, "summary.json", sum_obj)
+
+        if sum_obj is None:
+            # Final fallback: keep the pipeline moving.
+            sum_obj = {
+                "chapter_summary": "",
+                "continuity_notes": [],
+                "next_chapter_hook": "",
+            }
+        return sum_obj
+
+    def _wrote(self, name: str, **fields: Any) -> None:
+        if self.events.enabled:
+            self.events.emit("bytes_written", file=name, bytes=(self.out_dir / name).stat().st_size, **fields)
+
+    def result(self, chapter_text: str, sum_obj: dict[str, Any]) -> dict[str, Any]:
+        plan_obj = self.plan_obj or {}
+        chapter_idx = self.chapter_idx
+        result: dict[str, Any] = {
+            "chapter": int(chapter_idx),
+            "title": str(plan_obj.get("title") or self.chapter_meta.get("title") or f"第{chapter_idx}章"),
+            "scene_plan": plan_obj,
+            "chapter_text": chapter_text,
+            "chapter_summary": str(sum_obj.get("chapter_summary") or ""),
+            "continuity_notes": sum_obj.get("continuity_notes") or [],
+            "next_chapter_hook": str(sum_obj.get("next_chapter_hook") or ""),
+        }
+
+        write_json(self.out_dir / "chapter.json", result)
+        self._wrote("chapter.json")
+        # Per-scene texts go to the DB's scenes table (db.put_chapter), not chapter.json.
+        return {**result, "scene_texts": list(self.scene_texts)}
+
+
 def generate_chapter(
     *,
     env: Env,
@@ -54,243 +721,346 @@ def generate_chapter(
     chapter_idx: int,
     prev_chapter_summary: str,
     prev_last_paragraph: str,
+    retry_policies: Optional[dict[str, RetryPolicy]] = None,
+    hedge: Optional[HedgePolicy] = None,
+    parallel_scenes: int = 0,
+    smooth_seams: bool = False,
+    pipeline: bool = False,
+    resume: bool = False,
+    digests: str = "",
+    scenes_per_call: int = 2,
+    events: Optional[EventLog] = None,
 ) -> dict[str, Any]:
-    outline = project_obj.get("outline") or []
-    chapter_meta = None
-    for ch in outline:
-        if int(ch.get("chapter")) == int(chapter_idx):
-            chapter_meta = ch
-            break
-    if not chapter_meta:
-        raise RuntimeError(f"Chapter {chapter_idx} not found in outline")
+    """Plan, write and summarize one chapter.
 
-    outline_short = [
-        {"chapter": o.get("chapter"), "title": o.get("title"), "logline": o.get("logline")} for o in outline
-    ]
+    scenes_per_call (2, 3, 4 or 6) scenes are written per writer call; see
+    choose_batch_size() for picking it from the ledger.
 
-    out_dir = env.outputs_dir / project_id / "chapters" / f"{int(chapter_idx):03d}"
+    parallel_scenes > 0 writes all scene batches concurrently with that many
+    workers (each batch anchored on the previous scene card's `turn`);
+    smooth_seams then rewrites the opening paragraph at each batch boundary.
 
-    # 1) Plan scenes (structured JSON) using the outline model.
-    plan_user = user_prompt_for_scene_plan(
-        project=project_obj,
-        chapter=chapter_meta,
-        outline_short=outline_short,
-        prev_chapter_summary=prev_chapter_summary,
+    pipeline streams the scene plan and starts each batch call as soon as its
+    scene cards have arrived, so planning and writing overlap.
+
+    resume reuses the plan, scene batches, seams and summary of an earlier run
+    wherever the inputs that produced them are unchanged (see ChapterJob).
+
+    digests ("call" | "local") has each batch call also write a short digest and
+    builds the chapter summary from those instead of the full chapter text.
+
+    events receives stage_start/stage_end for plan, write, expand, seams and
+    summary, plus the steps' retry/expand/bytes_written events.
+    """
+    job = ChapterJob(
+        env=env,
+        client=client,
+        project_id=project_id,
+        project_obj=project_obj,
+        chapter_idx=chapter_idx,
+        retry_policies=retry_policies,
+        hedge=hedge,
+        resume=resume,
+        digests=digests,
+        scenes_per_call=scenes_per_call,
+        events=events,
     )
-    # Scene plan can still be long; retry on truncation.
-    plan_obj: dict[str, Any] | None = None
-    plan_attempts = [
-        {"temperature": 0.2, "max_tokens": 3500},
-        {"temperature": 0.2, "max_tokens": 4200},
-    ]
-    last_plan_err: Exception | None = None
-    for attempt_i, a in enumerate(plan_attempts, start=1):
-        plan_resp = client.chat_completions(
-            model=env.novel_outline_model,
-            system=SYSTEM_SCENE_PLANNER,
-            user=plan_user,
-            temperature=float(a["temperature"]),
-            max_tokens=int(a["max_tokens"]),
-            extra={"max_completion_tokens": int(a["max_tokens"])},
-        )
-        plan_text = client.get_text(plan_resp)
+    size = job.batch_size
+    stage = job.events.stage
+
+    def pipelined_batch(
+        i: int, cards: Cards, prev_card: Optional[dict[str, Any]], prev_batch: Optional[Future]
+    ) -> tuple[str, ...]:
+        if parallel_scenes > 0:
+            anchor = prev_last_paragraph if prev_card is None else _turn_anchor(prev_card)
+        else:
+            # One batch worker runs batches in order, so prev_batch is already done.
+            anchor = prev_last_paragraph if prev_batch is None else scene_tail(prev_batch.result()[-1])
+        return job.write_batch(i, anchor, cards=cards)
+
+    def plan_pipelined(a: dict[str, Any]) -> tuple[dict[str, Any], str]:
+        """Stream the plan and submit each batch as soon as its scene cards are complete."""
+        cards_stream = JsonArrayStream("scenes")
+
+        def on_delta(delta: str) -> None:
+            for card in cards_stream.feed(delta):
+                cards.append(card)
+                n = len(cards)
+                if n % size == 0 and n <= SCENES_PER_CHAPTER:
+                    prev_card = cards[n - size - 1] if n > size else None
+                    prev_batch = pipelined[-1] if pipelined else None
+                    pipelined.append(batch_pool.submit(pipelined_batch, n - size + 1, tuple(cards[n - size :]), prev_card, prev_batch))
+
+        plan_resp, plan_text = job.plan_call(a, prev_chapter_summary=prev_chapter_summary, on_delta=on_delta)
         try:
-            parsed = extract_first_json_object(plan_text)
-            if not isinstance(parsed, dict):
-                raise ValueError("Scene plan output is not a JSON object")
-            sc = parsed.get("scenes")
-            if not isinstance(sc, list) or len(sc) != 12:
-                raise ValueError("Scene plan must contain scenes with length == 12")
-            plan_obj = parsed
-            last_plan_err = None
+            if parse_scene_plan(plan_text)["scenes"] == cards:
+                return plan_resp, plan_text
+        except Exception:
+            pass
+        # Failed (the retry plans in full before writing) or, unexpectedly, the
+        # streamed cards differ from the final plan: drop the early batch calls
+        # and let the running ones finish before the batches are written again.
+        _abandon(pipelined)
+        pipelined.clear()
+        return plan_resp, plan_text
+
+    # 1) Plan scenes (structured JSON) using the outline model.
+    # Pipelined mode: one worker (batches in order) or parallel_scenes workers.
+    cards: list[dict[str, Any]] = []
+    pipelined: list[Future] = []
+    batch_pool = ThreadPoolExecutor(max_workers=max(1, parallel_scenes), thread_name_prefix="batch") if pipeline else None
+    try:
+        # Pipelined: batches already started during the plan stage finish in the write stage.
+        with stage("plan", pipeline=pipeline):
+            job.plan(prev_chapter_summary=prev_chapter_summary, first_attempt=plan_pipelined if pipeline else None)
+
+        # 2) Write several scenes per writer call to speed up plot progression.
+        starts = job.batch_starts()
+        with stage("write", scenes_per_call=size, parallel_scenes=parallel_scenes):
+            if pipelined:
+                batches = [f.result() for f in pipelined]
+            elif parallel_scenes > 0:
+                # All batches at once: batch k is anchored on the previous card's `turn`
+                # instead of the previous batch's text (batch 1 still gets the last chapter's tail).
+                with ThreadPoolExecutor(max_workers=parallel_scenes, thread_name_prefix="batch") as pool:
+                    batches = list(pool.map(lambda i: job.write_batch(i, job.batch_anchor(i, prev_last_paragraph)), starts))
+            else:
+                batches = []
+                prev_tail = prev_last_paragraph
+                for i in starts:
+                    texts = job.write_batch(i, prev_tail)
+                    prev_tail = scene_tail(texts[-1])
+                    batches.append(texts)
+    finally:
+        if batch_pool is not None:
+            _abandon(pipelined)
+            batch_pool.shutdown(wait=True)
+
+    # 3) Expand short scenes (concurrently, after all batches are drafted).
+    with stage("expand"):
+        batches = job.expand_short(batches, first_tail=prev_last_paragraph)
+
+    if parallel_scenes > 0 and smooth_seams:
+        with stage("seams"), ThreadPoolExecutor(max_workers=parallel_scenes, thread_name_prefix="seam") as pool:
+            heads = list(pool.map(job.smooth_seam, starts[1:], [b[-1] for b in batches[:-1]], [b[0] for b in batches[1:]]))
+        for k, head in enumerate(heads, start=1):
+            batches[k] = (head, *batches[k][1:])
+
+    chapter_text = job.assemble(batches)
+
+    # 4) Summarize.
+    with stage("summary", digests=digests or None):
+        sum_obj = job.summarize(chapter_text)
+    return job.result(chapter_text, sum_obj)
+
+
+def scene_length_targets(project_obj: dict[str, Any]) -> tuple[int, int]:
+    """(expand below, expand to) in chars per scene.
+
+    Derived from topic.target_length.per_chapter_chars over the chapter's
+    scenes; SCENE_MIN_CHARS/SCENE_TARGET_CHARS when the project does not set it.
+    """
+    topic = project_obj.get("topic") if isinstance(project_obj.get("topic"), dict) else {}
+    target_length = topic.get("target_length") if isinstance(topic.get("target_length"), dict) else {}
+    try:
+        per_chapter = int(target_length.get("per_chapter_chars") or 0)
+    except (TypeError, ValueError):
+        per_chapter = 0
+    if per_chapter <= 0:
+        return SCENE_MIN_CHARS, SCENE_TARGET_CHARS
+    target = max(200, per_chapter // SCENES_PER_CHAPTER)
+    return target * SCENE_MIN_CHARS // SCENE_TARGET_CHARS, target
+
+
+def _continued_cards(scenes: list[dict[str, Any]], more: list[Any]) -> list[dict[str, Any]]:
+    """The leading cards of `more` that continue `scenes` (idx len+1, len+2, ...).
+
+    Stops at the first card out of sequence (duplicate, gap, missing idx) or
+    past SCENES_PER_CHAPTER; the next continuation round asks from there.
+    """
+    out: list[dict[str, Any]] = []
+    for card in more:
+        idx = card.get("idx") if isinstance(card, dict) else None
+        expected = len(scenes) + len(out) + 1
+        if expected > SCENES_PER_CHAPTER or isinstance(idx, bool) or idx != expected:
             break
-        except Exception as e:
-            last_plan_err = e
-            write_text(out_dir / f"scene_plan_attempt_{attempt_i}_raw.txt", plan_text)
-            continue
+        out.append(card)
+    return out
 
-    if plan_obj is None:
-        raise RuntimeError(f"Scene plan parse failed after retries: {last_plan_err}")
-
-    scenes = plan_obj.get("scenes") or []
-    write_json(out_dir / "scene_plan.json", plan_obj)
-
-    def parse_scene_pair(text: str) -> tuple[str, str]:
-        a_tag = "<<<SCENE_A>>>"
-        b_tag = "<<<SCENE_B>>>"
-        ia = text.find(a_tag)
-        ib = text.find(b_tag)
-        if ia == -1 or ib == -1 or ib <= ia:
-            raise ValueError("Missing scene pair tags")
-        a = text[ia + len(a_tag) : ib].strip()
-        b = text[ib + len(b_tag) :].strip()
-        if not a or not b:
-            raise ValueError("Empty scene text in pair")
-        return a, b
-
-    def expand_if_too_short(scene_text: str, *, scene_user: str, tag: str) -> str:
-        if len(scene_text) >= 500:
-            return scene_text
-        expand_user = (
-            scene_user
-            + "\n\n"
-            + f"补充要求：{tag} 太短了。请扩写到 >= 700 个中文字符，增加动作与对话细节，但不要复述上一段。"
-        )
-        resp2 = client.chat_completions(
-            model=env.novel_writer_model,
-            system=SYSTEM_SCENE_WRITER,
-            user=expand_user,
-            temperature=0.6,
-            max_tokens=5000,
-            extra={"max_completion_tokens": 5000},
-        )
-        return client.get_text(resp2).strip()
 
-    # 2) Write two scenes per writer call to speed up plot progression.
-    scene_texts: list[str] = []
-    prev_tail = prev_last_paragraph
+def parse_summary(text: str, *, truncated: bool = False) -> dict[str, Any]:
+    """Parse summarizer output. A truncated response keeps its complete fields
+    when chapter_summary is among them (hook/notes may then be missing)."""
+    try:
+        parsed = extract_first_json_object(text)
+    except ValueError:
+        if not truncated:
+            raise
+        parsed = close_truncated_json(text)
+        if not isinstance(parsed, dict) or not parsed.get("chapter_summary"):
+            raise ValueError("Truncated summary has no complete chapter_summary")
+    if not isinstance(parsed, dict):
+        raise ValueError("Summary output is not a JSON object")
+    return parsed
 
-    if len(scenes) % 2 != 0:
-        raise RuntimeError("Scene plan must contain an even number of scenes")
 
-    for i in range(1, len(scenes) + 1, 2):
-        scene_a = scenes[i - 1]
-        scene_b = scenes[i]
+def parse_scene_plan(text: str) -> dict[str, Any]:
+    return check_scene_plan(extract_first_json_object(text))
 
-        pair_user = user_prompt_for_scene_write_pair(
-            project=project_obj,
-            chapter=chapter_meta,
-            scene_a=scene_a,
-            scene_b=scene_b,
-            prev_tail=prev_tail,
-        )
 
-        resp = client.chat_completions(
-            model=env.novel_writer_model,
-            system=SYSTEM_SCENE_WRITER_PAIR,
-            user=pair_user,
-            temperature=0.6,
-            max_tokens=5000,
-            extra={"max_completion_tokens": 5000},
-        )
-        pair_text = client.get_text(resp).strip()
-        write_text(out_dir / f"scene_pair_{i:02d}_{i+1:02d}_raw.txt", pair_text + "\n")
+def check_scene_plan(parsed: Any) -> dict[str, Any]:
+    if not isinstance(parsed, dict):
+        raise ValueError("Scene plan output is not a JSON object")
+    sc = parsed.get("scenes")
+    if not isinstance(sc, list) or len(sc) != SCENES_PER_CHAPTER:
+        raise ValueError(f"Scene plan must contain scenes with length == {SCENES_PER_CHAPTER}")
+    return parsed
 
-        try:
-            text_a, text_b = parse_scene_pair(pair_text)
-        except Exception:
-            retry_user = pair_user + "\n\n重要：必须严格按 <<<SCENE_A>>> 与 <<<SCENE_B>>> 标签输出。除此之外不要输出任何文字。"
-            resp_r = client.chat_completions(
-                model=env.novel_writer_model,
-                system=SYSTEM_SCENE_WRITER_PAIR,
-                user=retry_user,
-                temperature=0.4,
-                max_tokens=5000,
-                extra={"max_completion_tokens": 5000},
-            )
-            pair_text_r = client.get_text(resp_r).strip()
-            write_text(out_dir / f"scene_pair_{i:02d}_{i+1:02d}_retry_raw.txt", pair_text_r + "\n")
-            text_a, text_b = parse_scene_pair(pair_text_r)
-
-        # Richness guard per scene (fallback to single-scene expansion only if needed).
-        scene_a_user = user_prompt_for_scene_write(
-            project=project_obj,
-            chapter=chapter_meta,
-            scene=scene_a,
-            prev_tail=prev_tail,
-        )
-        text_a = expand_if_too_short(text_a, scene_user=scene_a_user, tag="scene_a")
-
-        tail_a = text_a[-220:] if len(text_a) > 220 else text_a
-        scene_b_user = user_prompt_for_scene_write(
-            project=project_obj,
-            chapter=chapter_meta,
-            scene=scene_b,
-            prev_tail=tail_a,
-        )
-        text_b = expand_if_too_short(text_b, scene_user=scene_b_user, tag="scene_b")
 
-        write_text(out_dir / f"scene_{i:02d}.txt", text_a + "\n")
-        write_text(out_dir / f"scene_{i+1:02d}.txt", text_b + "\n")
+def parse_scene_batch(text: str, n: int) -> tuple[str, ...]:
+    """Split a writer response into its n tagged scenes (the pair format for n == 2)."""
+    if n == 2:
+        return parse_scene_pair(text)
+    tags = scene_tags(n)
+    starts = []
+    pos = 0
+    for tag in tags:
+        idx = text.find(tag, pos)
+        if idx == -1:
+            raise ValueError(f"Missing scene tag {tag}")
+        starts.append(idx)
+        pos = idx + len(tag)
+    end = text.find(DIGEST_TAG, pos)
+    bounds = starts[1:] + [end if end != -1 else len(text)]
+    out = tuple(text[s + len(tag) : e].strip() for tag, s, e in zip(tags, starts, bounds))
+    if not all(out):
+        raise ValueError("Empty scene text in batch")
+    return out
 
-        prev_tail = text_b[-220:] if len(text_b) > 220 else text_b
-        scene_texts.append(text_a)
-        scene_texts.append(text_b)
 
-    chapter_text = "\n\n".join([t for t in scene_texts if t]).strip() + "\n"
+def choose_batch_size(
+    *,
+    scene_chars: int,
+    max_output_tokens: int,
+    stats: dict[int, dict[str, float]],
+) -> int:
+    """Largest scenes-per-call N whose output fits the model and whose tags hold up.
 
-    # Persist chapter text even if summarization fails.
-    write_text(out_dir / "chapter.md", chapter_text)
+    Tokens per scene come from the ledger (completion tokens / scenes of recent
+    writer calls) once it has BATCH_MIN_SAMPLES calls with token counts, else
+    from scene_chars. N must fit
+    max_output_tokens with BATCH_HEADROOM to spare, and is skipped once its
+    tag-format retry rate exceeds BATCH_MAX_TAG_FAILURE over BATCH_MIN_SAMPLES
+    calls. 2 (the pair prompt) is the floor.
+    """
+    calls = sum(st["calls"] for st in stats.values())
+    scenes = sum(st["calls"] * n for n, st in stats.items())
+    observed = sum(st["completion_tokens"] for st in stats.values()) / scenes if scenes else 0.0
+    per_scene = observed if calls >= BATCH_MIN_SAMPLES and observed > 0 else scene_chars / CHARS_PER_TOKEN
+    for n in sorted(BATCH_SIZES, reverse=True):
+        if n * per_scene * BATCH_HEADROOM > max_output_tokens:
+            continue
+        st = stats.get(n) or {}
+        tries = st.get("calls", 0) + st.get("tag_failures", 0)
+        if tries >= BATCH_MIN_SAMPLES and st.get("tag_failures", 0) / tries > BATCH_MAX_TAG_FAILURE:
+            continue
+        return n
+    return 2
 
-    # 3) Summarize (structured JSON). Retry and fall back to writer model if needed.
-    sum_user = user_prompt_for_summary(chapter_text=chapter_text)
 
-    def summarize_with(model: str) -> dict[str, Any] | None:
-        attempts = [
-            {"temperature": 0.2, "max_tokens": 900},
-            {"temperature": 0.2, "max_tokens": 1200},
-        ]
-        last_err: Exception | None = None
-        for attempt_i, a in enumerate(attempts, start=1):
-            resp = client.chat_completions(
-                model=model,
-                system=SYSTEM_SUMMARIZER,
-                user=sum_user,
-                temperature=float(a["temperature"]),
-                max_tokens=int(a["max_tokens"]),
-                extra={"max_completion_tokens": int(a["max_tokens"])},
-            )
-            text = client.get_text(resp)
-            try:
-                parsed = extract_first_json_object(text)
-                if not isinstance(parsed, dict):
-                    raise ValueError("Summary output is not a JSON object")
-                return parsed
-            except Exception as e:
-                last_err = e
-                write_text(out_dir / f"summary_{model}_attempt_{attempt_i}_raw.txt", text)
-                continue
-        return None
-
-    sum_obj = summarize_with(env.novel_outline_model)
-    if sum_obj is None:
-        sum_obj = summarize_with(env.novel_writer_model)
-
-    if sum_obj is None:
-        # Final fallback: keep the pipeline moving.
-        sum_obj = {
-            "chapter_summary": "",
-            "continuity_notes": [],
-            "next_chapter_hook": "",
-        }
+def parse_scene_pair(text: str) -> tuple[str, str]:
+    a_tag = "<<<SCENE_A>>>"
+    b_tag = "<<<SCENE_B>>>"
+    ia = text.find(a_tag)
+    ib = text.find(b_tag)
+    if ia == -1 or ib == -1 or ib <= ia:
+        raise ValueError("Missing scene pair tags")
+    a = text[ia + len(a_tag) : ib].strip()
+    end = text.find(DIGEST_TAG, ib)
+    b = text[ib + len(b_tag) : end if end != -1 else len(text)].strip()
+    if not a or not b:
+        raise ValueError("Empty scene text in pair")
+    return a, b
+
+
+def parse_digest(text: str) -> str:
+    """The <<<DIGEST>>> block after a batch's scenes ("" when absent)."""
+    i = text.find(DIGEST_TAG)
+    return text[i + len(DIGEST_TAG) :].strip() if i != -1 else ""
+
 
-    result: dict[str, Any] = {
-        "chapter": int(chapter_idx),
-        "title": str(plan_obj.get("title") or chapter_meta.get("title") or f"第{chapter_idx}章"),
-        "scene_plan": plan_obj,
-        "chapter_text": chapter_text,
-        "chapter_summary": str(sum_obj.get("chapter_summary") or ""),
-        "continuity_notes": sum_obj.get("continuity_notes") or [],
-        "next_chapter_hook": str(sum_obj.get("next_chapter_hook") or ""),
+def digest_summary(digests: list[str]) -> dict[str, Any]:
+    """Chapter summary assembled from the batch digests without a model call."""
+    fields = [_digest_fields(d) for d in digests]
+    return {
+        "chapter_summary": "".join(f.get("事件") or d.replace("\n", " ") for f, d in zip(fields, digests)),
+        "continuity_notes": [f["变化"] for f in fields if f.get("变化")],
+        "next_chapter_hook": fields[-1].get("钩子", "") if fields else "",
     }
 
-    write_json(out_dir / "chapter.json", result)
 
-    return result
+def _digest_fields(digest: str) -> dict[str, str]:
+    # "事件：..." / "变化：..." / "钩子：..." lines; tolerate ASCII colons and extra lines.
+    out: dict[str, str] = {}
+    for line in digest.splitlines():
+        m = re.match(r"\s*(事件|变化|钩子)\s*[：:]\s*(.+)", line)
+        if m:
+            out[m.group(1)] = m.group(2).strip()
+    return out
+
+
+def _turn_anchor(card: dict[str, Any]) -> str:
+    return f"（上一场景结尾：{card.get('turn') or ''}）"
+
+
+def _abandon(futures: list[Future]) -> None:
+    # Queued batch calls never start; running ones are waited for (results
+    # discarded), so none of their scene files or manifest entries land after
+    # the replanned batches write theirs.
+    for f in futures:
+        f.cancel()
+    wait(futures)
+
+
+def scene_tail(text: str, n: int = 220) -> str:
+    """Continuity tail handed to the next scene's prompt."""
+    return text[-n:] if len(text) > n else text
+
+
+def _parses(parse: Any, text: str) -> bool:
+    try:
+        parse(text)
+    except Exception:
+        return False
+    return True
 
 
 def get_prev_context_from_db(con, *, project_id: str, chapter_idx: int) -> tuple[str, str]:
     if chapter_idx <= 1:
         return "", ""
-    prev = get_chapter(con, project_id=project_id, chapter_idx=chapter_idx - 1)
-    if not prev:
+    # Column reads: the summary and the text, without parsing the stored chapter JSON.
+    summary = get_chapter_summary(con, project_id=project_id, chapter_idx=chapter_idx - 1)
+    if summary is None:
         return "", ""
+    text = get_chapter_text(con, project_id=project_id, chapter_idx=chapter_idx - 1, last_scene=True) or ""
+    return summary.strip(), last_paragraph(text)
 
-    summary = (prev.get("chapter_summary") or "").strip()
-    text = (prev.get("chapter_text") or "").strip()
 
+def last_paragraph(text: str) -> str:
     # last paragraph: take tail chunk, then split by blank lines.
+    text = text.strip()
     tail = text[-1500:] if len(text) > 1500 else text
     parts = [p.strip() for p in tail.split("\n\n") if p.strip()]
-    last_para = parts[-1] if parts else tail
-    return summary, last_para
+    return parts[-1] if parts else tail
+
+
+def provisional_summary(plan_obj: dict[str, Any]) -> str:
+    """Stand-in for the previous chapter's summary, built from its scene plan.
+
+    write-book plans chapter N+1 while chapter N is still being written and
+    summarized; the scene cards (title + turn) are what the prose follows.
+    """
+    lines = [f"（依据上一章分镜）{plan_obj.get('title') or ''}"]
+    for sc in plan_obj.get("scenes") or []:
+        lines.append(f"- {sc.get('scene_title') or ''}：{sc.get('turn') or ''}")
+    return "\n".join(lines)
@@ -1,5 +1,9 @@
 from __future__ import annotations
 
+import json
+import re
+from typing import Any, Optional
+
 # All prompts are Chinese by user request.
 # Keep prompts in code for reproducibility.
 
@@ -98,29 +102,74 @@ SYSTEM_SCENE_WRITER = """你是一名职业小说作者，擅长把单个场景
 """
 
 
-SYSTEM_SCENE_WRITER_PAIR = """你是一名职业小说作者。
+DIGEST_TAG = "<<<DIGEST>>>"
 
-硬性规则：
+
+def scene_tags(n: int) -> list[str]:
+    if n == 2:
+        return ["<<<SCENE_A>>>", "<<<SCENE_B>>>"]
+    return [f"<<<SCENE_{k}>>>" for k in range(1, n + 1)]
+
+
+# Writing rules shared by every multi-scene writer prompt (scene_writer_system).
+_SCENE_WRITER_RULES = """硬性规则：
 - 写作语言：中文。
-- 只输出正文内容本身：不要 JSON、不要 markdown、不要标题、不要解释。
+- {only}：不要 JSON、不要 markdown、不要标题、不要解释。
 - 不要出现“作为AI/模型/助手”等自我指代。
 - 禁止复述/回顾上一段或上一场景发生了什么。
+"""
 
-本次要一次写 2 个场景（scene_a 和 scene_b），两个场景都必须各自完整走完小情节，并且 scene_b 必须自然承接 scene_a 的结尾（不许回顾）。
-
-严格输出格式（只允许这两段块）：
-<<<SCENE_A>>>
-(这里是 scene_a 正文)
-<<<SCENE_B>>>
-(这里是 scene_b 正文)
-
-每个场景要求：
+_SCENE_WRITER_REQUIREMENTS = """每个场景要求：
 - 2-5 个自然段。
 - 至少包含：动作 + 对话 + 一个具体细节。
 - 推进链条：目标 -> 阻力 -> 动作 -> 结果 -> 钩子。
 """
 
 
+def scene_writer_system(n: int, *, digest: bool = False) -> str:
+    """System prompt for a writer call of n scenes.
+
+    n == 2 is the scene_a/scene_b pair with <<<SCENE_A>>>/<<<SCENE_B>>> tags,
+    larger n (--scenes-per-call) use <<<SCENE_1>>>..<<<SCENE_n>>>. digest
+    (--digests) adds a short <<<DIGEST>>> block for the chapter summary.
+    """
+    tags = scene_tags(n)
+    if n == 2:
+        head = "你是一名职业小说作者。"
+        task = "本次要一次写 2 个场景（scene_a 和 scene_b），两个场景都必须各自完整走完小情节，并且 scene_b 必须自然承接 scene_a 的结尾（不许回顾）。"
+        bodies = ["(这里是 scene_a 正文)", "(这里是 scene_b 正文)"]
+        these, last, numbered = "这两个场景", "scene_b", ""
+    else:
+        head = "你是一名职业小说作者，一次连续写多个场景。"
+        task = f"本次要按顺序写 {n} 个场景（与 user 给出的场景卡一一对应），每个场景都必须各自完整走完小情节，并且每个场景都必须自然承接上一个场景的结尾（不许回顾）。"
+        bodies = [f"(这里是第 {k} 个场景正文)" for k in range(1, n + 1)]
+        these, last, numbered = "这几个场景", "最后一个场景", "，编号与场景卡一致"
+    blocks = [line for tag, body in zip(tags, bodies) for line in (tag, body)]
+    if digest:
+        task += f"\n写完后再给{these}写一份简短摘要（DIGEST），供编辑汇总章节摘要用，不会出现在正文里。"
+        blocks += [
+            DIGEST_TAG,
+            f"事件：(一句话：{these}里发生了什么)",
+            "变化：(一句话：人物关系/处境/线索的变化，后续章节要保持一致)",
+            f"钩子：(一句话：{last}结尾留下的悬念)",
+        ]
+    rules = _SCENE_WRITER_RULES.format(only="正文只写正文内容本身" if digest else "只输出正文内容本身")
+    return "\n".join(
+        [head, "", rules, task, "", f"严格输出格式（只允许这 {len(tags) + digest} 段块{numbered}）：", *blocks, "", _SCENE_WRITER_REQUIREMENTS]
+    )
+
+
+SYSTEM_SEAM_SMOOTHER = """你是一名连载小说的衔接编辑，负责把两个分别写成的场景之间的接缝改顺。
+
+硬性规则：
+- 写作语言：中文。
+- 只输出改写后的那一段正文：不要解释、不要标题、不要 markdown。
+- 只改写给出的“下一场景开头段”，让它自然承接上一场景结尾；保留原段落的信息、人物与动作。
+- 禁止复述/回顾上一场景发生了什么。
+- 长度与原段落接近。
+"""
+
+
 SYSTEM_SUMMARIZER = """你是一名连载小说编辑，负责给章节写简洁但信息密度高的摘要与下一章钩子。
 
 硬性规则：
@@ -218,14 +267,76 @@ def _project_min(project: dict) -> dict:
     }
 
 
+class ChapterPromptContext:
+    """Prompt builder for one chapter.
+
+    The compact project/chapter/outline serializations are built once per
+    chapter. Prompts put these shared blocks first and the stage-specific
+    cards and instructions last, so each stage sends a byte-stable prefix
+    (system prompt + `prefix`, or `plan_prefix` for the planner) that provider
+    prompt caches can reuse.
+    """
+
+    def __init__(self, *, project: dict, chapter: dict, outline_short: list[dict] | None = None) -> None:
+        self.project_json = json_dumps_compact(_project_min(project))
+        self.chapter_json = json_dumps_compact(chapter)
+        self.outline_json = json_dumps_compact(outline_short) if outline_short is not None else ""
+        project_seg = "[project]" + "\n" + self.project_json + "\n\n"
+        # Writer calls: identical for every call of this chapter.
+        self.prefix = project_seg + "[chapter_requirements]" + "\n" + self.chapter_json + "\n\n"
+        # Planner calls: identical for every chapter of the project.
+        self.plan_prefix = project_seg + "[outline_short]" + "\n" + self.outline_json + "\n\n"
+
+    def scene_plan(self, *, prev_chapter_summary: str) -> str:
+        return (
+            self.plan_prefix
+            + "[chapter_requirements]" + "\n" + self.chapter_json + "\n\n"
+            + "[prev_chapter_summary]" + "\n" + (prev_chapter_summary or "(无)") + "\n\n"
+            + "请为本章生成分镜场景清单（scenes==12）。只输出 JSON。"
+        )
+
+    def scene_plan_continue(self, *, prev_chapter_summary: str, scenes_so_far: list[dict]) -> str:
+        # Same prompt as the cut-off plan call (shared cache prefix), then the scenes that survived.
+        k = len(scenes_so_far) + 1
+        return (
+            self.scene_plan(prev_chapter_summary=prev_chapter_summary)
+            + "\n\n"
+            + "[scenes_so_far]" + "\n" + json_dumps_compact(scenes_so_far) + "\n\n"
+            + "[continue_from_scene]" + "\n" + str(k) + "\n\n"
+            + f"上一次输出在第 {k} 个场景处被截断。只输出剩余的场景（idx {k}..12），格式：{{\"scenes\": [...]}}。不要重复已有场景。"
+        )
+
+    def scene_write(self, *, scene: dict, prev_tail: str) -> str:
+        return (
+            self.prefix
+            + "[scene_card]" + "\n" + json_dumps_compact(scene) + "\n\n"
+            + "[continuity_tail_for_reference_only]" + "\n" + (prev_tail or "(无)") + "\n\n"
+            + "请写这个场景的正文内容。只输出正文，不要标题/JSON/markdown。\n"
+            + "要求：不要复述 continuity_tail；直接从动作/对话开始；紧凑快节奏；末尾留钩子。"
+        )
+
+    def scene_write_pair(self, *, scene_a: dict, scene_b: dict, prev_tail: str) -> str:
+        return (
+            self.prefix
+            + "[scene_a_card]" + "\n" + json_dumps_compact(scene_a) + "\n\n"
+            + "[scene_b_card]" + "\n" + json_dumps_compact(scene_b) + "\n\n"
+            + "[continuity_tail_for_reference_only]" + "\n" + (prev_tail or "(无)") + "\n\n"
+            + "请一次写 2 个场景（scene_a + scene_b）。严格按格式输出。"
+        )
+
+    def scene_write_batch(self, *, scenes: list[dict], prev_tail: str) -> str:
+        cards = "".join(f"[scene_{k}_card]\n{json_dumps_compact(sc)}\n\n" for k, sc in enumerate(scenes, start=1))
+        return (
+            self.prefix
+            + cards
+            + "[continuity_tail_for_reference_only]" + "\n" + (prev_tail or "(无)") + "\n\n"
+            + f"请一次写 {len(scenes)} 个场景（<<<SCENE_1>>> 到 <<<SCENE_{len(scenes)}>>>）。严格按格式输出。"
+        )
+
+
 def user_prompt_for_scene_plan(*, project: dict, chapter: dict, outline_short: list[dict], prev_chapter_summary: str) -> str:
-    return (
-        "请为本章生成分镜场景清单（scenes==12）。只输出 JSON。\n\n"
-        "[project]" + "\n" + json_dumps_compact(_project_min(project)) + "\n\n"
-        "[outline_short]" + "\n" + json_dumps_compact(outline_short) + "\n\n"
-        "[chapter_requirements]" + "\n" + json_dumps_compact(chapter) + "\n\n"
-        "[prev_chapter_summary]" + "\n" + (prev_chapter_summary or "(无)")
-    )
+    ctx = ChapterPromptContext(project=project, chapter=chapter, outline_short=outline_short)
+    return ctx.scene_plan(prev_chapter_summary=prev_chapter_summary)
 
 
 def user_prompt_for_scene_write(
@@ -235,14 +346,7 @@ def user_prompt_for_scene_write(
     scene: dict,
     prev_tail: str,
 ) -> str:
-    return (
-        "请写这个场景的正文内容。只输出正文，不要标题/JSON/markdown。\n\n"
-        "[project]" + "\n" + json_dumps_compact(_project_min(project)) + "\n\n"
-        "[chapter_requirements]" + "\n" + json_dumps_compact(chapter) + "\n\n"
-        "[scene_card]" + "\n" + json_dumps_compact(scene) + "\n\n"
-        "[continuity_tail_for_reference_only]" + "\n" + (prev_tail or "(无)") + "\n\n"
-        "要求：不要复述 continuity_tail；直接从动作/对话开始；紧凑快节奏；末尾留钩子。"
-    )
+    return ChapterPromptContext(project=project, chapter=chapter).scene_write(scene=scene, prev_tail=prev_tail)
 
 
 def user_prompt_for_scene_write_pair(
@@ -253,13 +357,15 @@ def user_prompt_for_scene_write_pair(
     scene_b: dict,
     prev_tail: str,
 ) -> str:
+    ctx = ChapterPromptContext(project=project, chapter=chapter)
+    return ctx.scene_write_pair(scene_a=scene_a, scene_b=scene_b, prev_tail=prev_tail)
+
+
+def user_prompt_for_seam(*, prev_tail: str, next_opening: str) -> str:
     return (
-        "请一次写 2 个场景（scene_a + scene_b）。严格按格式输出。\n\n"
-        "[project]" + "\n" + json_dumps_compact(_project_min(project)) + "\n\n"
-        "[chapter_requirements]" + "\n" + json_dumps_compact(chapter) + "\n\n"
-        "[scene_a_card]" + "\n" + json_dumps_compact(scene_a) + "\n\n"
-        "[scene_b_card]" + "\n" + json_dumps_compact(scene_b) + "\n\n"
-        "[continuity_tail_for_reference_only]" + "\n" + (prev_tail or "(无)")
+        "[prev_scene_tail]" + "\n" + (prev_tail or "(无)") + "\n\n"
+        + "[next_scene_opening]" + "\n" + next_opening + "\n\n"
+        + "请改写 next_scene_opening，使其自然接上 prev_scene_tail。只输出改写后的段落。"
     )
 
 
@@ -270,7 +376,61 @@ def user_prompt_for_summary(*, chapter_text: str) -> str:
     )
 
 
-def json_dumps_compact(obj) -> str:
-    import json
+def user_prompt_for_digest_summary(*, digests: list[str], ending: str) -> str:
+    # Digests are a few lines per scene pair: a much smaller prompt than the chapter text.
+    blocks = [f"[part_{k}]\n{d.strip()}" for k, d in enumerate(digests, start=1)]
+    return (
+        "请基于以下各组场景的摘要（按顺序）写本章摘要与下一章钩子。只输出 JSON。\n\n"
+        + "\n\n".join(blocks)
+        + "\n\n[chapter_ending]\n"
+        + ending
+    )
+
 
+def json_dumps_compact(obj) -> str:
     return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+# Structured output (NOVEL_STRUCTURED_OUTPUT): the JSON schemas sent as response_format are
+# derived from the example schemas in the system prompts above, so the two cannot drift apart.
+_SCHEMA_TYPE_RE = re.compile(r'(?<!")\b(string|int)\b(?!")')
+
+
+def _json_schema(example: Any) -> dict[str, Any]:
+    if isinstance(example, dict):
+        return {
+            "type": "object",
+            "properties": {k: _json_schema(v) for k, v in example.items()},
+            "required": list(example),
+            "additionalProperties": False,
+        }
+    if isinstance(example, list):
+        return {"type": "array", "items": _json_schema(example[0] if example else "<string>")}
+    if example == "<string>":
+        return {"type": "string"}
+    # "<int>" or a literal such as "chapters": 8.
+    return {"type": "integer"}
+
+
+def schema_from_prompt(system: str) -> dict[str, Any]:
+    """JSON schema of the example object that follows "schema" in a system prompt."""
+    start = system.find("{", system.find("schema"))
+    if start == -1:
+        raise ValueError("system prompt has no JSON schema example")
+    example, _ = json.JSONDecoder().raw_decode(_SCHEMA_TYPE_RE.sub(r'"<\1>"', system[start:]))
+    return _json_schema(example)
+
+
+def response_format_for(system: str, *, name: str, keys: Optional[tuple[str, ...]] = None) -> dict[str, Any]:
+    """OpenAI-style response_format (strict json_schema) for a planner/summarizer prompt.
+
+    `keys` keeps only those top-level fields (e.g. "scenes" for plan continuations).
+    """
+    schema = schema_from_prompt(system)
+    if keys is not None:
+        schema = {
+            **schema,
+            "properties": {k: schema["properties"][k] for k in keys},
+            "required": list(keys),
+        }
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+class TokenBucket:
+    """Thread-safe token bucket.
+
+    reserve() deducts immediately (the balance may go negative) and returns how
+    long the caller must wait before its reservation is covered. This works the
+    same for threads (time.sleep) and coroutines (asyncio.sleep).
+    """
+
+    def __init__(self, *, rate_per_s: float, capacity: float) -> None:
+        self._rate = float(rate_per_s)
+        self._capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill_locked(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._last) * self._rate)
+        self._last = now
+
+    def reserve(self, n: float) -> float:
+        # A single request larger than the bucket would otherwise wait forever.
+        n = min(float(n), self._capacity)
+        with self._lock:
+            self._refill_locked()
+            self._tokens -= n
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self._rate
+
+    def refund(self, n: float) -> None:
+        if n <= 0:
+            return
+        with self._lock:
+            self._refill_locked()
+            self._tokens = min(self._capacity, self._tokens + n)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits (0 disables a limit)."""
+
+    def __init__(self, *, rpm: int = 0, tpm: int = 0) -> None:
+        self._requests = TokenBucket(rate_per_s=rpm / 60.0, capacity=rpm) if rpm > 0 else None
+        self._tokens = TokenBucket(rate_per_s=tpm / 60.0, capacity=tpm) if tpm > 0 else None
+
+    def reserve(self, est_tokens: int) -> float:
+        wait = 0.0
+        if self._requests is not None:
+            wait = max(wait, self._requests.reserve(1))
+        if self._tokens is not None:
+            wait = max(wait, self._tokens.reserve(est_tokens))
+        return wait
+
+    def settle(self, est_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Give back the part of a token reservation the call did not use."""
+        if self._tokens is not None and actual_tokens is not None:
+            self._tokens.refund(est_tokens - actual_tokens)
+
+
+class ConcurrencyGate:
+    """Max-in-flight semaphore plus an optional RateLimiter, shared by every caller of a client."""
+
+    def __init__(self, *, max_in_flight: int = 0, limiter: Optional[RateLimiter] = None) -> None:
+        self.max_in_flight = max_in_flight
+        self._sem = threading.BoundedSemaphore(max_in_flight) if max_in_flight > 0 else None
+        self.limiter = limiter
+
+    @contextmanager
+    def slot(self, est_tokens: int) -> Iterator[None]:
+        if self._sem is not None:
+            self._sem.acquire()
+        try:
+            if self.limiter is not None:
+                wait = self.limiter.reserve(est_tokens)
+                if wait > 0:
+                    time.sleep(wait)
+            yield
+        finally:
+            if self._sem is not None:
+                self._sem.release()
+
+
+def estimate_tokens(*texts: str, max_tokens: Optional[int] = None) -> int:
+    """Rough token estimate for rate limiting.
+
+    ~1 token per CJK char (3 UTF-8 bytes) and ~1 per 3-4 ASCII chars; the
+    completion budget counts in full, as most gateways do for TPM.
+    """
+    n = sum(len(t.encode("utf-8")) for t in texts) // 3
+    return n + int(max_tokens or 0)
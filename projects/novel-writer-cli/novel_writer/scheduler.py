@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+
+@dataclass
+class Node:
+    name: str
+    # Called with the results of all finished nodes (read-only), returns this node's result.
+    fn: Callable[[dict[str, Any]], Any]
+    deps: tuple[str, ...] = ()
+    # Free-form grouping for progress output (e.g. the chapter number).
+    group: Any = None
+
+
+@dataclass
+class NodeEvent:
+    """Progress event passed to DagScheduler(on_event=...)."""
+
+    kind: str  # start | done | failed | skipped
+    node: str
+    group: Any
+    done: int
+    total: int
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+class DagFailed(RuntimeError):
+    def __init__(self, node: str, error: BaseException, *, skipped: list[str]) -> None:
+        super().__init__(f"{node} failed: {error}")
+        self.node = node
+        self.error = error
+        self.skipped = skipped
+
+
+@dataclass
+class _State:
+    results: dict[str, Any] = field(default_factory=dict)
+    running: dict[Future, str] = field(default_factory=dict)
+    started_at: dict[str, float] = field(default_factory=dict)
+
+
+class DagScheduler:
+    """Run a dependency graph of blocking steps on a thread pool.
+
+    A node starts once all its deps have finished. On the first failure no
+    new nodes start, running ones are allowed to finish (their results are
+    kept), and run() raises DagFailed. LLM concurrency is still bounded by the
+    client's ConcurrencyGate; `max_workers` only bounds scheduler threads.
+    """
+
+    def __init__(self, *, max_workers: int = 8, on_event: Optional[Callable[[NodeEvent], None]] = None) -> None:
+        self.max_workers = max_workers
+        self.on_event = on_event
+        self._nodes: dict[str, Node] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, fn: Callable[[dict[str, Any]], Any], *, deps: tuple[str, ...] = (), group: Any = None) -> None:
+        if name in self._nodes:
+            raise ValueError(f"duplicate node: {name}")
+        self._nodes[name] = Node(name=name, fn=fn, deps=tuple(deps), group=group)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._nodes
+
+    def run(self) -> dict[str, Any]:
+        nodes = self._nodes
+        for n in nodes.values():
+            missing = [d for d in n.deps if d not in nodes]
+            if missing:
+                raise ValueError(f"{n.name}: unknown deps {missing}")
+
+        st = _State()
+        pending = dict(nodes)
+        total = len(nodes)
+        failure: Optional[tuple[str, BaseException]] = None
+
+        def emit(kind: str, name: str, **kw: Any) -> None:
+            if self.on_event is not None:
+                self.on_event(NodeEvent(kind=kind, node=name, group=nodes[name].group, done=len(st.results), total=total, **kw))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="dag") as pool:
+            while True:
+                if failure is None:
+                    # Insertion order = priority: earlier nodes (earlier chapters) start first.
+                    ready = [n for n in pending.values() if all(d in st.results for d in n.deps)]
+                    for n in ready:
+                        del pending[n.name]
+                        st.started_at[n.name] = time.monotonic()
+                        emit("start", n.name)
+                        # Snapshot: a node only needs the results of nodes that finished before it started.
+                        st.running[pool.submit(n.fn, dict(st.results))] = n.name
+                if not st.running:
+                    break
+                finished, _ = wait(list(st.running), return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    name = st.running.pop(fut)
+                    seconds = time.monotonic() - st.started_at[name]
+                    err = fut.exception()
+                    if err is None:
+                        st.results[name] = fut.result()
+                        emit("done", name, seconds=seconds)
+                    else:
+                        emit("failed", name, seconds=seconds, error=str(err))
+                        if failure is None:
+                            failure = (name, err)
+                if not st.running and failure is None and pending and not any(
+                    all(d in st.results for d in n.deps) for n in pending.values()
+                ):
+                    raise ValueError(f"dependency cycle among: {sorted(pending)}")
+
+        if failure is not None:
+            for name in pending:
+                emit("skipped", name)
+            raise DagFailed(failure[0], failure[1], skipped=sorted(pending)) from failure[1]
+        return st.results
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import http.server
+import io
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import traceback
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+from .utils import now_utc_iso
+
+
+class _ThreadStream:
+    """sys.stdout/sys.stderr stand-in: writes go to the calling thread's capture buffer, if it has one."""
+
+    def __init__(self, real: Any) -> None:
+        self._real = real
+        self._local = threading.local()
+
+    def _target(self) -> Any:
+        return getattr(self._local, "buf", None) or self._real
+
+    def write(self, s: str) -> int:
+        return self._target().write(s)
+
+    def flush(self) -> None:
+        self._target().flush()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._real, name)
+
+
+_streams_lock = threading.Lock()
+
+
+@contextmanager
+def capture() -> Iterator[tuple[io.StringIO, io.StringIO]]:
+    """Collect what this thread prints to stdout/stderr; other threads are unaffected.
+
+    Output of threads a command starts itself (LLM workers) still goes to the
+    real streams.
+    """
+    with _streams_lock:
+        if not isinstance(sys.stdout, _ThreadStream):
+            sys.stdout = _ThreadStream(sys.stdout)
+        if not isinstance(sys.stderr, _ThreadStream):
+            sys.stderr = _ThreadStream(sys.stderr)
+    out, err = io.StringIO(), io.StringIO()
+    sys.stdout._local.buf, sys.stderr._local.buf = out, err  # type: ignore[union-attr]
+    try:
+        yield out, err
+    finally:
+        sys.stdout._local.buf = sys.stderr._local.buf = None  # type: ignore[union-attr]
+
+
+def capturing() -> bool:
+    """Whether this thread's output is being collected for a served request (returned only when it ends)."""
+    out = sys.stdout
+    return isinstance(out, _ThreadStream) and getattr(out._local, "buf", None) is not None
+
+
+def run_captured(run_argv: Callable[[list[str]], int], argv: list[str]) -> dict[str, Any]:
+    """Run one CLI command in this thread: {"rc", "stdout", "stderr", "seconds"}, like a subprocess would report."""
+    t0 = time.perf_counter()
+    with capture() as (out, err):
+        try:
+            rc = run_argv(argv)
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                rc = int(e.code or 0)
+            else:
+                print(e.code, file=sys.stderr)
+                rc = 1
+        except Exception:
+            traceback.print_exc()
+            rc = 1
+    return {"rc": rc, "stdout": out.getvalue(), "stderr": err.getvalue(), "seconds": round(time.perf_counter() - t0, 3)}
+
+
+def options_to_argv(options: dict[str, Any]) -> list[str]:
+    """{"project": "p", "chapter": 3, "resume": true} -> ["--project", "p", "--chapter", "3", "--resume"]."""
+    argv: list[str] = []
+    for key, value in options.items():
+        flag = "--" + key.replace("_", "-")
+        if value is None or value is False:
+            continue
+        if value is True:
+            argv.append(flag)
+        elif isinstance(value, list):
+            for v in value:
+                argv += [flag, str(v)]
+        else:
+            argv += [flag, str(value)]
+    return argv
+
+
+class CommandServer:
+    """Threaded HTTP server running CLI subcommands in-process (the `serve` command).
+
+    GET  /health         liveness and counters
+    GET  /v1/commands    subcommands and their options
+    POST /v1/<command>   body {"argv": [...]} or an options object; returns rc/stdout/stderr
+
+    Commands run concurrently, one request thread each, in the same process, so
+    they share its DB connection and LLM clients.
+    """
+
+    def __init__(
+        self,
+        run_argv: Callable[[list[str]], int],
+        *,
+        commands: dict[str, dict[str, Any]],
+        info: Optional[dict[str, Any]] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self._run_argv = run_argv
+        self.commands = commands
+        self.info = dict(info or {})
+        self._lock = threading.Lock()
+        self.started_at_utc = now_utc_iso()
+        self.requests = 0
+        self.running = 0
+
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self) -> None:
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_GET(self) -> None:  # noqa: N802
+                path = self.path.rstrip("/")
+                if path == "/health":
+                    self._send(200, server.health())
+                elif path == "/v1/commands":
+                    self._send(200, server.commands)
+                else:
+                    self._send(404, {"error": "not found"})
+
+            def do_POST(self) -> None:  # noqa: N802
+                n = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(n)
+                cmd = self.path.rstrip("/").rpartition("/v1/")[2]
+                if not self.path.startswith("/v1/") or cmd not in server.commands:
+                    self._send(404, {"error": f"unknown command: {cmd}"})
+                    return
+                try:
+                    body = json.loads(raw or b"{}")
+                    if not isinstance(body, dict):
+                        raise ValueError("body must be a JSON object")
+                    argv = [str(a) for a in body["argv"]] if "argv" in body else options_to_argv(body)
+                except (ValueError, TypeError) as e:
+                    self._send(400, {"error": str(e)})
+                    return
+                self._send(200, server.run([cmd, *argv]))
+
+            def _send(self, status: int, obj: Any) -> None:
+                body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+                return
+
+        self._httpd = http.server.ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def health(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "ok": True,
+                "pid": os.getpid(),
+                "started_at_utc": self.started_at_utc,
+                "requests": self.requests,
+                "running": self.running,
+                **self.info,
+            }
+
+    def run(self, argv: list[str]) -> dict[str, Any]:
+        with self._lock:
+            self.requests += 1
+            self.running += 1
+        try:
+            return run_captured(self._run_argv, argv)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def probe(url: str, *, timeout_s: float = 0.5) -> Optional[dict[str, Any]]:
+    """The server's /health, or None if nothing answers at url."""
+    try:
+        with urllib.request.urlopen(url.rstrip("/") + "/health", timeout=timeout_s) as resp:
+            return json.loads(resp.read())
+    except (OSError, ValueError):
+        return None
+
+
+def forward(url: str, argv: list[str]) -> dict[str, Any]:
+    """Run argv (command first) on the server at url; waits for the command to finish."""
+    req = urllib.request.Request(
+        url.rstrip("/") + "/v1/" + argv[0],
+        data=json.dumps({"argv": argv[1:]}, ensure_ascii=False).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(req) as resp:
+            return json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        detail = e.read().decode("utf-8", errors="replace")
+        raise SystemExit(f"server error {e.code}: {detail}") from None
@@ -9,6 +9,14 @@ from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Optional
 
+from .cache import DEFAULT_CACHE_STAGES
+
+# Values for OpenAICompatClient(prompt_cache_hints=...):
+#   key           - send `prompt_cache_key` derived from system prompt + shared prefix (OpenAI)
+#   cache_control - split the user message and mark the shared prefix
+#                   {"cache_control": {"type": "ephemeral"}} (Anthropic via OpenAI-compatible gateways)
+PROMPT_CACHE_HINTS = frozenset({"key", "cache_control"})
+
 
 def now_utc_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
@@ -36,6 +44,11 @@ def load_json(path: Path) -> Any:
     return json.loads(path.read_text(encoding="utf-8"))
 
 
+def join_scene_texts(texts: list[str]) -> str:
+    """Chapter text from its scene texts (chapter.md and the DB's scenes table)."""
+    return "\n\n".join([t for t in texts if t]).strip() + "\n"
+
+
 def slugify(s: str) -> str:
     s = s.strip().lower()
     # keep ascii letters/digits; turn other runs into '-'
@@ -49,52 +62,201 @@ def project_id_from_title(title: str) -> str:
     return f"{slugify(title)[:40]}-{ts}"
 
 
+_JSON_DECODER = json.JSONDecoder()
+_FENCE_RE = re.compile(r"```(?:json)?\s*(?=\{)")
+
+
+def _brace_span_end(text: str, start: int) -> int:
+    """Index just past the '}' closing the '{' at start, or -1 if it is never closed."""
+    depth = 0
+    in_str = False
+    esc = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return -1
+
+
 def extract_first_json_object(text: str) -> Any:
     """Extract the first top-level JSON object from an LLM response.
 
-    Avoid O(n^2) backtracking on large JSON by using a single-pass brace matcher.
+    Tries json's C decoder (raw_decode) at a ```json fence first, then at each
+    top-level '{' left to right, so leading prose, a BOM and trailing text are
+    skipped. A candidate that fails is skipped as a whole (its brace span), so
+    a malformed object raises instead of yielding one of its nested objects;
+    one that is never closed is truncated, and nothing after it can be top-level.
     """
-    # Common patterns: ```json ... ```
-    fenced = re.search(r"```(?:json)?\s*(\{[\s\S]*?\})\s*```", text)
-    if fenced:
-        return json.loads(fenced.group(1))
+    text = text.lstrip("\ufeff")
+    fence = _FENCE_RE.search(text)
+    if fence:
+        try:
+            return _JSON_DECODER.raw_decode(text, fence.end())[0]
+        except json.JSONDecodeError:
+            pass  # scan the whole text
+
+    pos = text.find("{")
+    if pos == -1:
+        raise ValueError("No '{' found in response")
 
+    last_err: Optional[json.JSONDecodeError] = None
+    while pos != -1:
+        try:
+            return _JSON_DECODER.raw_decode(text, pos)[0]
+        except json.JSONDecodeError as e:
+            last_err = e
+        end = _brace_span_end(text, pos)
+        if end == -1:
+            break
+        pos = text.find("{", end)
+
+    raise ValueError(f"Failed to find a complete JSON object in response: {last_err}")
+
+
+def close_truncated_json(text: str) -> Any:
+    """Parse the first JSON object of a response that was cut off (finish_reason == "length").
+
+    Keeps every member/element that was complete (a string value counts once
+    its closing quote arrived), drops the one that was cut (a container cut
+    right after its '{' or '[' is dropped, not closed empty) and closes the
+    open containers in one pass over the text. Raises ValueError when there
+    is no object.
+    """
     start = text.find("{")
     if start == -1:
         raise ValueError("No '{' found in response")
 
-    depth = 0
+    closers: list[str] = []
     in_str = False
     esc = False
+    # A string after ':' or as an array element is a value; one before ':' is a key.
+    str_is_value = False
+    prev = ""
+    # Last position the text can be cut at, and the containers open there.
+    cut = start
+    cut_closers: list[str] = []
 
     for i in range(start, len(text)):
         ch = text[i]
-
         if in_str:
             if esc:
                 esc = False
-                continue
-            if ch == "\\":
+            elif ch == "\\":
                 esc = True
-                continue
-            if ch == '"':
+            elif ch == '"':
                 in_str = False
+                prev = ch
+                if str_is_value:
+                    cut, cut_closers = i + 1, list(closers)
+            continue
+        if ch.isspace():
             continue
-
         if ch == '"':
             in_str = True
-            continue
-        if ch == "{":
-            depth += 1
-            continue
-        if ch == "}":
-            depth -= 1
-            if depth == 0:
-                chunk = text[start : i + 1]
-                return json.loads(chunk)
-            continue
+            str_is_value = prev == ":" or (closers[-1:] == ["]"] and prev in ("[", ","))
+        elif ch in "{[":
+            closers.append("}" if ch == "{" else "]")
+            if len(closers) == 1:
+                cut, cut_closers = i + 1, list(closers)
+        elif ch in "}]":
+            if not closers:
+                break
+            closers.pop()
+            if not closers:
+                # Not truncated after all.
+                return json.loads(text[start : i + 1])
+            cut, cut_closers = i + 1, list(closers)
+        elif ch == ",":
+            cut, cut_closers = i, list(closers)
+        prev = ch
+
+    if not cut_closers:
+        raise ValueError("No JSON object to salvage")
+    return json.loads(text[start:cut] + "".join(reversed(cut_closers)))
+
+
+class JsonArrayStream:
+    """Incrementally release the items of one array of a streamed JSON object.
+
+    feed() takes text deltas and returns the objects of the top-level `key`
+    array that became complete, e.g. scene cards while the plan is still
+    streaming. A single-pass brace matcher; text before the first '{' is
+    ignored. After an item that is not valid JSON the stream is `broken` and
+    releases nothing more; the caller's full parse of the text decides what
+    happens next.
+    """
 
-    raise ValueError("Failed to find a complete JSON object in response")
+    def __init__(self, key: str) -> None:
+        self._key = key
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._str_start = 0
+        self._last_str = ""
+        # Depth inside the target array (0 = not in it) and start of the current item.
+        self._array_depth = 0
+        self._item_start = -1
+        self.done = False
+        self.broken = False
+
+    def feed(self, delta: str) -> list[Any]:
+        if self.broken:
+            return []
+        self._text += delta
+        text = self._text
+        items: list[Any] = []
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+                    self._last_str = text[self._str_start : i]
+                continue
+            if self._depth == 0 and ch != "{":
+                continue
+            if ch == '"':
+                self._in_str = True
+                self._str_start = i + 1
+            elif ch in "{[":
+                if ch == "[" and self._depth == 1 and self._last_str == self._key and not self.done:
+                    self._array_depth = self._depth + 1
+                elif ch == "{" and self._array_depth and self._depth == self._array_depth:
+                    self._item_start = i
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if ch == "}" and self._array_depth and self._depth == self._array_depth and self._item_start >= 0:
+                    try:
+                        items.append(json.loads(text[self._item_start : i + 1]))
+                    except json.JSONDecodeError:
+                        self.broken = True
+                        self._text = ""
+                        return items
+                    self._item_start = -1
+                elif ch == "]" and self._array_depth and self._depth < self._array_depth:
+                    self._array_depth = 0
+                    self.done = True
+        self._pos = len(text)
+        return items
 
 
 @dataclass(frozen=True)
@@ -106,6 +268,65 @@ class Env:
     telegraph_access_token: str
     db_path: Path
     outputs_dir: Path
+    # Stream writer/planner calls (SSE) and abort early on malformed output.
+    stream: bool = False
+    # LLM response cache (llm_cache.db next to the DB).
+    cache: bool = True
+    cache_stages: tuple[str, ...] = tuple(sorted(DEFAULT_CACHE_STAGES))
+    cache_max_mb: int = 256
+    # Client-wide limits shared by all concurrent calls (0 = unlimited).
+    max_in_flight: int = 4
+    rpm: int = 0
+    tpm: int = 0
+    # Model -> fallback model used while the model's circuit breaker is open.
+    fallback_models: tuple[tuple[str, str], ...] = ()
+    # Opt-in hedged writer calls (see llm.HedgePolicy).
+    hedge: bool = False
+    hedge_percentile: float = 0.9
+    hedge_max_ratio: float = 0.1
+    hedge_model: str = ""
+    hedge_base_url: str = ""
+    # Provider prompt-cache hints: "key" (prompt_cache_key) and/or "cache_control".
+    prompt_cache_hints: tuple[str, ...] = ()
+    # Output token limit of the writer model; bounds --scenes-per-call auto.
+    writer_max_output_tokens: int = 8192
+    # Send response_format json_schema with architect/planner/summarizer calls.
+    structured_output: bool = False
+    # zlib-compress chapter/scene text stored in the DB.
+    db_compress: bool = False
+
+    @property
+    def cache_path(self) -> Path:
+        return self.db_path.parent / "llm_cache.db"
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    raw = (os.environ.get(name) or "").strip().lower()
+    if not raw:
+        return default
+    return raw in ("1", "true", "yes", "on")
+
+
+def env_list(name: str) -> Optional[tuple[str, ...]]:
+    raw = os.environ.get(name)
+    if raw is None:
+        return None
+    return tuple(x.strip() for x in raw.split(",") if x.strip())
+
+
+def env_pairs(name: str) -> tuple[tuple[str, str], ...]:
+    """Parse NAME="a=b,c=d" into (("a", "b"), ("c", "d"))."""
+    out: list[tuple[str, str]] = []
+    for item in env_list(name) or ():
+        if "=" in item:
+            k, v = item.split("=", 1)
+            if k.strip() and v.strip():
+                out.append((k.strip(), v.strip()))
+    return tuple(out)
+
+
+def db_path_from_env() -> Path:
+    return Path(os.environ.get("NOVEL_DB_PATH") or "./data/novels.db")
 
 
 def load_env() -> Env:
@@ -115,7 +336,15 @@ def load_env() -> Env:
     writer_model = (os.environ.get("NOVEL_WRITER_MODEL") or "gemini-3-flash-preview").strip()
     tg_token = (os.environ.get("TELEGRAPH_ACCESS_TOKEN") or "").strip()
 
-    db_path = Path(os.environ.get("NOVEL_DB_PATH") or "./data/novels.db")
+    db_path = db_path_from_env()
+    # Set but empty (NOVEL_CACHE_STAGES=) caches no stage.
+    cache_stages = env_list("NOVEL_CACHE_STAGES")
+    prompt_cache_hints = env_list("NOVEL_PROMPT_CACHE_HINTS") or ()
+    unknown = sorted(set(prompt_cache_hints) - PROMPT_CACHE_HINTS)
+    if unknown:
+        raise SystemExit(
+            f"NOVEL_PROMPT_CACHE_HINTS: unknown value(s) {', '.join(unknown)} (allowed: {', '.join(sorted(PROMPT_CACHE_HINTS))})"
+        )
     outputs_dir = Path(os.environ.get("NOVEL_OUTPUTS_DIR") or "./outputs")
 
     if not base_url:
@@ -131,6 +360,23 @@ def load_env() -> Env:
         telegraph_access_token=tg_token,
         db_path=db_path,
         outputs_dir=outputs_dir,
+        stream=env_flag("NOVEL_STREAM"),
+        cache=env_flag("NOVEL_CACHE", default=True),
+        cache_stages=Env.cache_stages if cache_stages is None else cache_stages,
+        cache_max_mb=int(os.environ.get("NOVEL_CACHE_MAX_MB") or 256),
+        max_in_flight=int(os.environ.get("NOVEL_MAX_IN_FLIGHT") or 4),
+        rpm=int(os.environ.get("NOVEL_RPM") or 0),
+        tpm=int(os.environ.get("NOVEL_TPM") or 0),
+        fallback_models=env_pairs("NOVEL_FALLBACK_MODELS"),
+        hedge=env_flag("NOVEL_HEDGE"),
+        hedge_percentile=float(os.environ.get("NOVEL_HEDGE_PERCENTILE") or 0.9),
+        hedge_max_ratio=float(os.environ.get("NOVEL_HEDGE_MAX_RATIO") or 0.1),
+        hedge_model=(os.environ.get("NOVEL_HEDGE_MODEL") or "").strip(),
+        hedge_base_url=(os.environ.get("NOVEL_HEDGE_BASE_URL") or "").strip().rstrip("/"),
+        prompt_cache_hints=prompt_cache_hints,
+        writer_max_output_tokens=int(os.environ.get("NOVEL_WRITER_MAX_OUTPUT_TOKENS") or 8192),
+        structured_output=env_flag("NOVEL_STRUCTURED_OUTPUT"),
+        db_compress=env_flag("NOVEL_DB_COMPRESS"),
     )
 
 
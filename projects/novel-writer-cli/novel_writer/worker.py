@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import os
+import socket
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Optional
+
+from .db import Connection, finish_job, heartbeat_job, lease_job, pending_jobs, release_job
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+@dataclass
+class WorkerStats:
+    done: int = 0
+    failed: int = 0
+    lost_leases: int = 0
+
+
+class _Heartbeat:
+    """Renews a job's lease every lease_s / 3 on a daemon thread while the job runs."""
+
+    def __init__(self, con: Connection, *, job_id: int, worker: str, lease_s: float) -> None:
+        self._con = con
+        self._job_id = job_id
+        self._worker = worker
+        self._lease_s = lease_s
+        self._stop = threading.Event()
+        self.lost = False
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{job_id}", daemon=True)
+
+    def __enter__(self) -> "_Heartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._lease_s / 3):
+            if not heartbeat_job(self._con, job_id=self._job_id, worker=self._worker, lease_s=self._lease_s):
+                # Reclaimed by another worker; this run finishes but its result is not recorded.
+                self.lost = True
+                return
+
+
+def run_worker(
+    con: Connection,
+    run_job: Callable[[dict[str, Any]], str],
+    *,
+    worker: Optional[str] = None,
+    kinds: Optional[Iterable[str]] = None,
+    lease_s: float = 300.0,
+    poll_s: float = 2.0,
+    retry_s: float = 30.0,
+    max_jobs: int = 0,
+    exit_when_empty: bool = False,
+    on_job: Optional[Callable[[dict[str, Any], Optional[str], float], None]] = None,
+) -> WorkerStats:
+    """Lease and run jobs one at a time until max_jobs ran, or with exit_when_empty
+    until no job is queued or running.
+
+    run_job returns the job's result text or raises. A failed job is retried
+    (by any worker) after retry_s times its attempt count. on_job(job, error,
+    seconds) is called after each one. Ctrl-C hands the current job back to the queue.
+    """
+    worker = worker or worker_id()
+    kinds = list(kinds or ())
+    stats = WorkerStats()
+    while not max_jobs or stats.done + stats.failed + stats.lost_leases < max_jobs:
+        job = lease_job(con, worker=worker, lease_s=lease_s, kinds=kinds)
+        if job is None:
+            # Jobs still running elsewhere may unblock queued ones that depend on them.
+            if exit_when_empty and not pending_jobs(con):
+                break
+            time.sleep(poll_s)
+            continue
+
+        t0 = time.monotonic()
+        result: Optional[str] = None
+        error: Optional[str] = None
+        try:
+            with _Heartbeat(con, job_id=job["id"], worker=worker, lease_s=lease_s) as hb:
+                try:
+                    result = run_job(job)
+                except (Exception, SystemExit) as e:
+                    # cmd_* report bad input / missing state with SystemExit.
+                    error = f"{type(e).__name__}: {e}"
+        except KeyboardInterrupt:
+            release_job(con, job_id=job["id"], worker=worker)
+            raise
+
+        finished = not hb.lost and finish_job(
+            con, job_id=job["id"], worker=worker, result=result, error=error, retry_after_s=retry_s * job["attempts"]
+        )
+        if not finished:
+            stats.lost_leases += 1
+            print(f"job {job['id']}: lease lost, result dropped", file=sys.stderr)
+        elif error is None:
+            stats.done += 1
+        else:
+            stats.failed += 1
+        if on_job is not None:
+            on_job(job, error, time.monotonic() - t0)
+    return stats
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import unittest
+
+from novel_writer.__main__ import build_parser
+
+
+class ParallelScenesTest(unittest.TestCase):
+    def parse(self, *argv: str):
+        return build_parser().parse_args(list(argv))
+
+    def test_values(self) -> None:
+        for cmd in (["write-chapter", "--chapter", "1"], ["write-book"]):
+            with self.subTest(cmd=cmd[0]):
+                self.assertEqual(self.parse(*cmd).parallel_scenes, 0)
+                self.assertEqual(self.parse(*cmd, "--parallel-scenes").parallel_scenes, 6)
+                self.assertEqual(self.parse(*cmd, "--parallel-scenes", "3").parallel_scenes, 3)
+
+    def test_rejects_below_one(self) -> None:
+        for cmd in (["write-chapter", "--chapter", "1"], ["write-book"]):
+            for value in ("0", "-1", "x"):
+                with self.subTest(cmd=cmd[0], value=value), contextlib.redirect_stderr(io.StringIO()) as err:
+                    with self.assertRaises(SystemExit):
+                        self.parse(*cmd, "--parallel-scenes", value)
+                    self.assertIn("--parallel-scenes", err.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from novel_writer.__main__ import main
+from novel_writer.db import MIGRATIONS, connect, enqueue_job, finish_job, init_db, lease_job, list_jobs, open_db
+
+
+class EnqueueGraphTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db_path = Path(tmp.name) / "novel.sqlite3"
+        env = {
+            "NOVEL_DB_PATH": str(self.db_path),
+            "NOVEL_OUTPUTS_DIR": str(Path(tmp.name) / "outputs"),
+            "NOVEL_SERVER": "0",
+            "OPENAI_BASE_URL": "http://127.0.0.1:9/v1",
+            "OPENAI_API_KEY": "x",
+            "TELEGRAPH_ACCESS_TOKEN": "t",
+        }
+        patcher = mock.patch.dict(os.environ, env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_publish_index_waits_for_every_chapter(self) -> None:
+        argv = ["enqueue", "--chapters", "3", "--publish", "init", "--", "--title", "T", "--blurb", "b", "--project-id", "p"]
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(main(argv), 0)
+        jobs = list_jobs(open_db(self.db_path))
+        graph = {(j["kind"], j["argv"][-1] if j["kind"] in ("write-chapter", "publish-chapter") else ""): j for j in jobs}
+        init = graph[("init", "")]["id"]
+        writes = [graph[("write-chapter", str(n))]["id"] for n in (1, 2, 3)]
+        pubs = [graph[("publish-chapter", str(n))] for n in (1, 2, 3)]
+        self.assertEqual(len(jobs), 8)
+        self.assertEqual(graph[("write-chapter", "1")]["depends_on"], [init])
+        self.assertEqual(graph[("write-chapter", "2")]["depends_on"], [writes[0]])
+        self.assertEqual(graph[("write-chapter", "3")]["depends_on"], [writes[1]])
+        self.assertEqual([p["depends_on"] for p in pubs], [[w] for w in writes])
+        self.assertEqual(graph[("publish-index", "")]["depends_on"], sorted(p["id"] for p in pubs))
+
+    def test_lease_waits_for_all_dependencies(self) -> None:
+        con = open_db(self.db_path)
+        a = enqueue_job(con, kind="publish-chapter", argv=["1"])
+        b = enqueue_job(con, kind="publish-chapter", argv=["2"])
+        c = enqueue_job(con, kind="publish-index", argv=[], depends_on=[a, b])
+        self.assertEqual(lease_job(con, worker="w", lease_s=60)["id"], a)
+        finish_job(con, job_id=a, worker="w")
+        self.assertEqual(lease_job(con, worker="w", lease_s=60)["id"], b)
+        # b is still running: c must not be leased yet.
+        self.assertIsNone(lease_job(con, worker="w", lease_s=60))
+        finish_job(con, job_id=b, worker="w")
+        self.assertEqual(lease_job(con, worker="w", lease_s=60)["id"], c)
+
+    def test_failed_dependency_fails_dependents(self) -> None:
+        con = open_db(self.db_path)
+        a = enqueue_job(con, kind="publish-chapter", argv=["1"], max_attempts=1)
+        b = enqueue_job(con, kind="publish-chapter", argv=["2"])
+        c = enqueue_job(con, kind="publish-index", argv=[], depends_on=[a, b])
+        lease_job(con, worker="w", lease_s=60)
+        finish_job(con, job_id=a, worker="w", error="boom")
+        status = {j["id"]: j["status"] for j in list_jobs(con)}
+        self.assertEqual((status[a], status[b], status[c]), ("failed", "queued", "failed"))
+
+    def test_migration_moves_single_dependency(self) -> None:
+        con = connect(self.db_path)
+        for migrate in MIGRATIONS[:4]:
+            migrate(con)
+        con.execute("PRAGMA user_version=4")
+        for job_id, dep in ((1, None), (2, 1)):
+            con.execute(
+                "INSERT INTO jobs(id, kind, argv_json, status, depends_on, created_at_utc) VALUES(?,?,?,?,?,?)",
+                (job_id, "write-chapter", "[]", "queued", dep, "t"),
+            )
+        con.commit()
+        init_db(con)
+        self.assertEqual([j["depends_on"] for j in list_jobs(con)], [[], [1]])
+
+
+if __name__ == "__main__":
+    unittest.main()
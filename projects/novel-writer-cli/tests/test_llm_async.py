@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+from novel_writer import ratelimit, utils
+from novel_writer.__main__ import _new_client
+from novel_writer.llm_async import AsyncOpenAICompatClient
+from novel_writer.mock_server import MockConfig, MockLLMServer
+
+
+class FakeClock:
+    """Stands in for the time module in ratelimit: sleep() moves the clock instead of blocking.
+
+    A sleep ends s seconds after the sleeping thread last read the clock, so
+    concurrent sleeps overlap as they would in real time.
+    """
+
+    def __init__(self) -> None:
+        self.now = 0.0
+        self._lock = threading.Lock()
+        self._seen = threading.local()
+
+    def monotonic(self) -> float:
+        with self._lock:
+            self._seen.now = self.now
+            return self.now
+
+    def sleep(self, s: float) -> None:
+        with self._lock:
+            self.now = max(self.now, getattr(self._seen, "now", self.now) + s)
+
+
+class AsyncClientLimitsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = MockLLMServer(MockConfig(latency="fixed:100")).start()
+        self.addCleanup(self.server.stop)
+
+    def run_calls(self, n: int, **env: str) -> float:
+        with mock.patch.dict(os.environ, {"OPENAI_BASE_URL": self.server.base_url + "/v1", "OPENAI_API_KEY": "x", **env}):
+            client = _new_client(utils.load_env(), use_cache=False)
+        aclient = AsyncOpenAICompatClient(client)
+        self.addCleanup(client.close)
+        self.addCleanup(aclient.close)
+
+        async def main() -> None:
+            await asyncio.gather(
+                *(aclient.chat_completions(model="m", system="s", user=f"u{i}", stage="plan") for i in range(n))
+            )
+
+        t0 = time.monotonic()
+        asyncio.run(main())
+        return time.monotonic() - t0
+
+    def test_max_in_flight(self) -> None:
+        wall = self.run_calls(8, NOVEL_MAX_IN_FLIGHT="2")
+        self.assertEqual(self.server.stats.requests, 8)
+        self.assertEqual(self.server.stats.max_in_flight, 2)
+        # 8 calls of 100ms, 2 at a time.
+        self.assertGreaterEqual(wall, 0.4)
+
+    def test_executor_adds_no_limit_of_its_own(self) -> None:
+        # 0 = no max-in-flight limit.
+        self.run_calls(12, NOVEL_MAX_IN_FLIGHT="0")
+        self.assertEqual(self.server.stats.max_in_flight, 12)
+
+    def test_rpm(self) -> None:
+        clock = FakeClock()
+        with mock.patch.object(ratelimit, "time", clock):
+            self.run_calls(6, NOVEL_MAX_IN_FLIGHT="6", NOVEL_RPM="2")
+        self.assertEqual(self.server.stats.requests, 6)
+        # A burst of 2, then one request every 30s: the 6th is not sent before t=120s.
+        self.assertAlmostEqual(clock.now, 120.0, places=3)
+
+
+if __name__ == "__main__":
+    unittest.main()
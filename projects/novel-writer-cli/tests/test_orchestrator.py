@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from novel_writer.orchestrator import _abandon, choose_batch_size
+
+
+class AbandonTest(unittest.TestCase):
+    def test_waits_for_running_and_cancels_queued(self) -> None:
+        started = threading.Event()
+        release = threading.Event()
+        wrote: list[str] = []
+
+        def batch(name: str) -> str:
+            started.set()
+            release.wait(5)
+            wrote.append(name)
+            return name
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            running = pool.submit(batch, "running")
+            queued = pool.submit(batch, "queued")
+            started.wait(5)
+            threading.Timer(0.1, release.set).start()
+            _abandon([running, queued])
+            # The running batch has finished writing before _abandon returns.
+            self.assertEqual(wrote, ["running"])
+            self.assertTrue(queued.cancelled())
+
+
+def _stats(n: int, calls: int, tokens_per_scene: float, tag_failures: int = 0) -> dict[int, dict[str, float]]:
+    return {n: {"calls": calls, "tag_failures": tag_failures, "completion_tokens": calls * n * tokens_per_scene}}
+
+
+class ChooseBatchSizeTest(unittest.TestCase):
+    def test_cases(self) -> None:
+        # (scene_chars, max_output_tokens, stats, expected); CHARS_PER_TOKEN = 1, headroom 1.25.
+        cases = [
+            ("no history, 6 fit", 700, 8000, {}, 6),
+            ("no history, 6 too big", 1500, 8000, {}, 4),
+            ("history below scene_chars", 1500, 8000, _stats(2, 5, 600), 6),
+            ("history above scene_chars", 700, 8000, _stats(2, 5, 1400), 4),
+            ("too few samples: scene_chars", 1500, 8000, _stats(2, 4, 600), 4),
+            ("no token counts: scene_chars", 1500, 8000, _stats(2, 5, 0), 4),
+            ("tag failures over the cutoff", 700, 8000, _stats(6, 4, 700, tag_failures=2), 4),
+            ("tag failures at the cutoff", 700, 8000, _stats(6, 4, 700, tag_failures=1), 6),
+            ("tag failures, too few tries", 700, 8000, _stats(6, 2, 700, tag_failures=2), 6),
+            ("floor", 700, 1000, {}, 2),
+        ]
+        for name, scene_chars, max_output_tokens, stats, expected in cases:
+            with self.subTest(name):
+                got = choose_batch_size(scene_chars=scene_chars, max_output_tokens=max_output_tokens, stats=stats)
+                self.assertEqual(got, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import os
+import unittest
+from unittest import mock
+
+from novel_writer import utils
+from novel_writer.cache import DEFAULT_CACHE_STAGES
+
+
+class LoadEnvTest(unittest.TestCase):
+    def load(self, **env: str) -> utils.Env:
+        base = {"OPENAI_BASE_URL": "http://127.0.0.1:9/v1", "OPENAI_API_KEY": "x"}
+        with mock.patch.dict(os.environ, {**base, **env}):
+            for k in ("NOVEL_CACHE_STAGES", "NOVEL_PROMPT_CACHE_HINTS"):
+                if k not in env:
+                    os.environ.pop(k, None)
+            return utils.load_env()
+
+    def test_cache_stages(self) -> None:
+        self.assertEqual(set(self.load().cache_stages), DEFAULT_CACHE_STAGES)
+        self.assertEqual(self.load(NOVEL_CACHE_STAGES="").cache_stages, ())
+        self.assertEqual(self.load(NOVEL_CACHE_STAGES="pair, plan").cache_stages, ("pair", "plan"))
+
+    def test_prompt_cache_hints(self) -> None:
+        self.assertEqual(self.load(NOVEL_PROMPT_CACHE_HINTS="key").prompt_cache_hints, ("key",))
+        with self.assertRaises(SystemExit):
+            self.load(NOVEL_PROMPT_CACHE_HINTS="key,bogus")
+
+
+class CloseTruncatedJsonTest(unittest.TestCase):
+    def test_salvage(self) -> None:
+        cases = [
+            ("closed string value kept", '{"a":1,"b":"xy"', {"a": 1, "b": "xy"}),
+            ("unclosed string dropped", '{"a":1,"b":"xy', {"a": 1}),
+            ("key without value dropped", '{"a":1,"b"', {"a": 1}),
+            ("key and colon dropped", '{"a":1,"b": ', {"a": 1}),
+            ("partial number dropped", '{"a":"x","b":12', {"a": "x"}),
+            ("partial literal dropped", '{"a":"x","b":tr', {"a": "x"}),
+            ("escaped quote stays open", '{"a":1,"b":"x\\"', {"a": 1}),
+            ("string with comma and colon", '{"a":"x, y: z"', {"a": "x, y: z"}),
+            ("array string elements", '{"tags":["a", "b"', {"tags": ["a", "b"]}),
+            ("nested string value", '{"s":[{"idx":1,"t":"x"', {"s": [{"idx": 1, "t": "x"}]}),
+            ("container cut after opening", '{"title":"x","scenes":[{"idx":1},{', {"title": "x", "scenes": [{"idx": 1}]}),
+            ("empty root", '{', {}),
+            ("not truncated", 'prose {"a":[1,2]} more', {"a": [1, 2]}),
+        ]
+        for name, text, expected in cases:
+            with self.subTest(name):
+                self.assertEqual(utils.close_truncated_json(text), expected)
+
+    def test_no_object(self) -> None:
+        for text in ("", "no json here", "[1, 2"):
+            with self.subTest(text=text), self.assertRaises(ValueError):
+                utils.close_truncated_json(text)
+
+
+if __name__ == "__main__":
+    unittest.main()